@@ -0,0 +1,196 @@
+"""
+Change Log Service - Buffered audit trail of design changes
+"""
+import atexit
+import itertools
+import json
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, Hashable, Iterator, Optional
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+from app.designs.models import Design
+from app.collaboration.models import DesignChangeLog
+
+logger = logging.getLogger(__name__)
+
+
+def change_log_config() -> Dict[str, float]:
+    config = getattr(settings, 'COLLABORATION', {}) or {}
+    return {
+        'interval': float(config.get('CHANGE_LOG_FLUSH_INTERVAL', 1.0)),
+        'batch_size': int(config.get('CHANGE_LOG_BATCH_SIZE', 500)),
+        'retention_days': int(config.get('CHANGE_LOG_RETENTION_DAYS', 90)),
+    }
+
+
+class ChangeLogWriter:
+    """
+    Change log entries queued in memory and written with bulk_create.
+    
+    Entries are queued once the surrounding transaction commits, so rolled
+    back changes are never logged, and a background thread writes them
+    every CHANGE_LOG_FLUSH_INTERVAL seconds, or as soon as
+    CHANGE_LOG_BATCH_SIZE are queued. Repeated updates of the same object by
+    the same user within one flush (a drag sends dozens of patches) are
+    written once, with the time of the latest; every other change is kept.
+    With an interval of 0 entries are written at once.
+    """
+    
+    COALESCED_TYPES = {'object_updated'}
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        # (design, user, change_type, object) -> entry for coalesced
+        # updates, a sequence number for everything else
+        self.pending: Dict[Hashable, DesignChangeLog] = {}
+        self.sequence = itertools.count()
+        self.wakeup = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+    
+    def record(
+        self,
+        design_id: Any,
+        change_type: str,
+        object_id: Any = None,
+        user_id: Optional[str] = None,
+        description: Optional[str] = None
+    ) -> None:
+        """Log a change to a design once the current transaction commits"""
+        entry = DesignChangeLog(
+            design_id=design_id,
+            user_id=str(user_id or 'default-user')[:255],
+            change_type=change_type,
+            object_id=object_id,
+            description=description,
+            created_at=timezone.now()
+        )
+        transaction.on_commit(lambda: self.enqueue(entry))
+    
+    def key(self, entry: DesignChangeLog) -> Hashable:
+        if entry.change_type in self.COALESCED_TYPES and entry.object_id:
+            return (str(entry.design_id), entry.user_id, entry.change_type, str(entry.object_id))
+        return next(self.sequence)
+    
+    def enqueue(self, entry: DesignChangeLog) -> None:
+        config = change_log_config()
+        with self.lock:
+            key = self.key(entry)
+            self.pending.pop(key, None)
+            self.pending[key] = entry
+            full = len(self.pending) >= config['batch_size']
+        if config['interval'] <= 0:
+            self.flush()
+            return
+        self.ensure_thread()
+        if full:
+            self.wakeup.set()
+    
+    def ensure_thread(self) -> None:
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, name='change-log-writer', daemon=True)
+                self.thread.start()
+    
+    def run(self) -> None:
+        while True:
+            self.wakeup.wait(change_log_config()['interval'])
+            self.wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Change log flush failed')
+    
+    def flush(self) -> int:
+        """Write every queued entry; returns the number written"""
+        with self.lock:
+            entries, self.pending = list(self.pending.values()), {}
+        if not entries:
+            return 0
+        try:
+            DesignChangeLog.objects.bulk_create(entries, batch_size=change_log_config()['batch_size'])
+        except Exception:
+            # Most likely a design deleted since; keep the entries that still have one
+            existing = {
+                str(design_id) for design_id in Design.objects.filter(
+                    id__in={entry.design_id for entry in entries}
+                ).values_list('id', flat=True)
+            }
+            entries = [entry for entry in entries if str(entry.design_id) in existing]
+            DesignChangeLog.objects.bulk_create(entries, batch_size=change_log_config()['batch_size'])
+        return len(entries)
+    
+    def flush_at_exit(self) -> None:
+        try:
+            self.flush()
+        except Exception:
+            logger.exception('Change log flush at exit failed')
+
+
+class ChangeLogService:
+    """Read and prune the change log"""
+    
+    CHUNK_SIZE = 1000
+    
+    def between(
+        self,
+        design_id: str,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """A design's changes in [since, until), oldest first, read in chunks"""
+        changes = DesignChangeLog.objects.filter(design_id=design_id)
+        if since is not None:
+            changes = changes.filter(created_at__gte=since)
+        if until is not None:
+            changes = changes.filter(created_at__lt=until)
+        rows = changes.order_by('created_at', 'id').values(
+            'id', 'user_id', 'change_type', 'object_id', 'description', 'created_at'
+        )
+        for row in rows.iterator(chunk_size=self.CHUNK_SIZE):
+            row['design_id'] = design_id
+            yield row
+    
+    def stream_json(self, changes: Iterator[Dict[str, Any]]) -> Iterator[str]:
+        """Encode changes as {"success": true, "changes": [...]}, one row at a time"""
+        yield '{"success": true, "changes": ['
+        separator = ''
+        for row in changes:
+            yield separator + json.dumps(row, cls=DjangoJSONEncoder)
+            separator = ','
+        yield ']}'
+    
+    def prune(self, older_than_days: Optional[int] = None) -> int:
+        """
+        Delete entries older than the retention period in primary key chunks.
+        
+        Ids grow with time, so everything up to the newest expired id goes
+        in short range deletes on the primary key rather than one long
+        DELETE holding locks on the whole table.
+        """
+        days = older_than_days if older_than_days is not None else change_log_config()['retention_days']
+        cutoff = timezone.now() - timedelta(days=days)
+        last_id = DesignChangeLog.objects.filter(
+            created_at__lt=cutoff
+        ).order_by('-created_at').values_list('id', flat=True).first()
+        if last_id is None:
+            return 0
+        
+        deleted = 0
+        start = DesignChangeLog.objects.order_by('id').values_list('id', flat=True).first()
+        while start is not None and start <= last_id:
+            end = min(start + self.CHUNK_SIZE * 10, last_id + 1)
+            count, _ = DesignChangeLog.objects.filter(
+                id__gte=start, id__lt=end, created_at__lt=cutoff
+            ).delete()
+            deleted += count
+            start = end
+        return deleted
+
+
+change_log = ChangeLogWriter()
+atexit.register(change_log.flush_at_exit)
+change_log_service = ChangeLogService()
@@ -0,0 +1,152 @@
+"""
+Comment Thread Service - Paginated comment threads assembled on the server
+"""
+import base64
+import uuid
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from typing import Any, Dict, List, Optional, Tuple
+from django.db.models import F, Q, QuerySet
+from app.designs.models import DesignObject
+from app.collaboration.models import DesignComment
+from app.collaboration.serializers import CommentSerializer
+from app.collaboration.write_behind import write_behind_buffer
+
+
+# (min_x, min_y, max_x, max_y) in design units
+BBox = Tuple[Decimal, Decimal, Decimal, Decimal]
+
+
+class CommentThreadError(ValueError):
+    """Invalid thread query parameters"""
+
+
+def parse_bbox(value: str) -> BBox:
+    """Parse ?bbox=minX,minY,maxX,maxY"""
+    try:
+        min_x, min_y, max_x, max_y = (Decimal(part) for part in value.split(','))
+    except (ValueError, InvalidOperation) as e:
+        raise CommentThreadError(f'Invalid bbox: {value}; expected minX,minY,maxX,maxY') from e
+    if not all(part.is_finite() for part in (min_x, min_y, max_x, max_y)) or min_x > max_x or min_y > max_y:
+        raise CommentThreadError(f'Invalid bbox: {value}; expected minX,minY,maxX,maxY')
+    return min_x, min_y, max_x, max_y
+
+
+def in_viewport(design_id: str, bbox: BBox) -> Q:
+    """
+    Comments pinned inside the box, or anchored to an object that overlaps it.
+    
+    Pinned points are matched on the (design, x, y) index. Objects match on
+    their bounding box; a rotated object is tested with a box of its width
+    plus height around its origin, which contains it whatever it was
+    rotated about, so nothing on screen is missed.
+    """
+    # Match objects where buffered real-time edits have moved them
+    write_behind_buffer.settle(design_id)
+    min_x, min_y, max_x, max_y = bbox
+    reach = F('width') + F('height')
+    objects = DesignObject.objects.filter(design_id=design_id).filter(
+        Q(
+            rotation=0,
+            x__lte=max_x, y__lte=max_y,
+            x__gte=min_x - F('width'), y__gte=min_y - F('height'),
+        ) | (~Q(rotation=0) & Q(
+            x__lte=max_x + reach, y__lte=max_y + reach,
+            x__gte=min_x - reach, y__gte=min_y - reach,
+        ))
+    )
+    return Q(x__gte=min_x, x__lte=max_x, y__gte=min_y, y__lte=max_y) | Q(object_id__in=objects.values('id'))
+
+
+def comments_in_viewport(design_id: str, bbox: BBox) -> QuerySet:
+    """Threads whose top-level comment is in view, replies included"""
+    roots = DesignComment.objects.filter(
+        design_id=design_id, parent__isnull=True
+    ).filter(in_viewport(design_id, bbox)).values('id')
+    return DesignComment.objects.filter(design_id=design_id).filter(
+        Q(id__in=roots) | Q(thread_id__in=roots)
+    )
+
+
+class CommentThreadService:
+    """
+    Pages of top-level comments with their whole reply trees.
+    
+    Threads are ordered newest first and paged by keyset on
+    (created_at, id), so a page costs the same however deep it is. All
+    replies of a page are fetched with one thread_id IN (...) query and
+    attached to their parents in a single pass.
+    """
+    
+    DEFAULT_LIMIT = 20
+    MAX_LIMIT = 100
+    
+    def page(
+        self,
+        design_id: str,
+        cursor: Optional[str] = None,
+        limit: Optional[int] = None,
+        resolved: Optional[bool] = None,
+        object_id: Optional[str] = None,
+        bbox: Optional[BBox] = None
+    ) -> Dict[str, Any]:
+        limit = max(1, min(limit or self.DEFAULT_LIMIT, self.MAX_LIMIT))
+        roots = DesignComment.objects.filter(design_id=design_id, parent__isnull=True)
+        if resolved is not None:
+            roots = roots.filter(resolved=resolved)
+        if object_id is not None:
+            roots = roots.filter(object_id=self.parse_uuid(object_id, 'object_id'))
+        if bbox is not None:
+            roots = roots.filter(in_viewport(design_id, bbox))
+        if cursor:
+            created_at, comment_id = self.decode_cursor(cursor)
+            roots = roots.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=comment_id)
+            )
+        roots = list(roots.order_by('-created_at', '-id')[:limit + 1])
+        has_more = len(roots) > limit
+        roots = roots[:limit]
+        
+        replies = DesignComment.objects.filter(
+            thread_id__in=[root.id for root in roots]
+        ).order_by('created_at', 'id') if roots else []
+        
+        # Each node's replies list is created by whichever of the node and
+        # its first reply is seen first, so row order does not matter
+        children: Dict[uuid.UUID, List[Dict[str, Any]]] = {}
+        threads = []
+        for comment in roots:
+            threads.append(self.node(comment, children))
+        for comment in replies:
+            children.setdefault(comment.parent_id, []).append(self.node(comment, children))
+        
+        return {
+            'threads': threads,
+            'nextCursor': self.encode_cursor(roots[-1]) if has_more else None,
+        }
+    
+    def node(self, comment: DesignComment, children: Dict[uuid.UUID, List[Dict[str, Any]]]) -> Dict[str, Any]:
+        data = dict(CommentSerializer(comment).data)
+        data['replies'] = children.setdefault(comment.id, [])
+        return data
+    
+    def encode_cursor(self, comment: DesignComment) -> str:
+        raw = f'{comment.created_at.isoformat()}|{comment.id}'
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+    
+    def decode_cursor(self, cursor: str) -> Tuple[datetime, uuid.UUID]:
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+            created_at, comment_id = raw.split('|')
+            return datetime.fromisoformat(created_at), uuid.UUID(comment_id)
+        except ValueError as e:
+            raise CommentThreadError(f'Invalid cursor: {cursor}') from e
+    
+    def parse_uuid(self, value: str, field: str) -> uuid.UUID:
+        try:
+            return uuid.UUID(str(value))
+        except ValueError as e:
+            raise CommentThreadError(f'Invalid {field}: {value}') from e
+
+
+comment_thread_service = CommentThreadService()
@@ -2,17 +2,47 @@
 WebSocket consumers for real-time collaboration features.
 Replaces Socket.IO functionality with Django Channels.
 """
-import json
+import asyncio
+import weakref
 from channels.generic.websocket import AsyncWebsocketConsumer
+from asgiref.sync import sync_to_async
 from channels.db import database_sync_to_async
 from app.designs.models import Design
 from app.collaboration.models import DesignComment
+from app.collaboration.cursors import cursor_coalescers
+from app.collaboration.leases import edit_leases
+from app.collaboration.presence import get_presence_registry
+from app.collaboration.protocol import ProtocolError, negotiate
+from app.collaboration.operations import OperationError, operation_service
+from app.collaboration.roles import authorize_operations, role_service
+from app.collaboration.send_queue import PRIORITY_DROPPABLE, SendQueue, priority_of
+from app.collaboration.services import get_actual_design_id
+from app.collaboration.write_behind import write_behind_buffer, write_behind_config
+
+
+# Close code for clients dropped for reading too slowly; they should
+# reconnect and resume from their last seq
+LAGGING_CLOSE_CODE = 4008
+
+# One lock per room and event loop, so operations applied by this process
+# are broadcast in the order their sequence numbers were handed out
+_room_locks = weakref.WeakValueDictionary()
+
+
+def room_lock(room_group_name):
+    key = (id(asyncio.get_running_loop()), room_group_name)
+    lock = _room_locks.get(key)
+    if lock is None:
+        lock = asyncio.Lock()
+        _room_locks[key] = lock
+    return lock
 
 
 class DesignConsumer(AsyncWebsocketConsumer):
     """
     WebSocket consumer for design collaboration.
     Handles real-time updates for comments, presence, and cursor movements.
+    Outgoing frames go through a per-connection priority queue; see send_queue.py.
     """
     
     async def connect(self):
@@ -21,6 +51,16 @@ class DesignConsumer(AsyncWebsocketConsumer):
         """
         self.design_id = self.scope['url_route']['kwargs']['design_id']
         self.room_group_name = f'design_{self.design_id}'
+        self.cursor_user_id = None
+        self.presence_user_id = None
+        self.actual_design_id = None
+        # Cursors received but not yet written to this socket, by user
+        self.pending_cursors = {}
+        # Seq of the last operation written to this socket
+        self.last_seq = None
+        # Edit leases taken through this socket: object id -> user id
+        self.leases = {}
+        self.send_queue = SendQueue(self.write_message, self.disconnect_lagging)
         
         # Join room group
         await self.channel_layer.group_add(
@@ -28,57 +68,132 @@ class DesignConsumer(AsyncWebsocketConsumer):
             self.channel_name
         )
         
-        await self.accept()
+        # Binary MessagePack when the client offers it, JSON text otherwise
+        self.codec, subprotocol = negotiate(self.scope.get('subprotocols', []))
+        await self.accept(subprotocol=subprotocol)
         
         # Send confirmation
-        await self.send(text_data=json.dumps({
+        await self.send_message({
             'type': 'connection',
             'message': 'Connected to design room'
-        }))
+        })
     
     async def disconnect(self, close_code):
         """
         Called when WebSocket connection is closed.
         """
+        self.send_queue.close()
+        if self.cursor_user_id is not None:
+            cursor_coalescers.discard(self.room_group_name, self.cursor_user_id)
+        
+        for object_id, user_id in list(self.leases.items()):
+            await self.release_lease(object_id, user_id)
+        
+        if self.presence_user_id is not None:
+            entry = await get_presence_registry().leave(self.room_group_name, self.channel_name)
+            if entry:
+                await self.broadcast_user_left([entry])
+        
+        # Persist this room's buffered edits now rather than on the next tick
+        if self.actual_design_id is not None and write_behind_buffer.pending(self.actual_design_id):
+            await database_sync_to_async(write_behind_buffer.flush)(self.actual_design_id)
+        
         # Leave room group
         await self.channel_layer.group_discard(
             self.room_group_name,
             self.channel_name
         )
     
+    async def send_message(self, message):
+        """
+        Queue a message for this socket with its type's priority.
+        """
+        self.send_queue.put(message, priority_of(message.get('type')))
+    
+    async def write_message(self, message):
+        """
+        Encode a message with the negotiated codec and send it.
+        """
+        text_data, bytes_data = self.codec.encode(message)
+        await self.send(text_data=text_data, bytes_data=bytes_data)
+        if message.get('seq') is not None:
+            self.last_seq = message['seq']
+    
+    async def disconnect_lagging(self):
+        """
+        Close a connection whose send queue overflowed.
+        The client is told where it got to, so it can reconnect and send
+        that as lastSeq instead of reloading the design.
+        """
+        try:
+            await asyncio.wait_for(self.write_message({
+                'type': 'sync:resync',
+                'lastSeq': self.last_seq
+            }), timeout=1)
+        except asyncio.TimeoutError:
+            pass
+        await self.close(code=LAGGING_CLOSE_CODE)
+    
     # Receive message from WebSocket
-    async def receive(self, text_data):
+    async def receive(self, text_data=None, bytes_data=None):
         """
         Handle messages from WebSocket client.
         """
         try:
-            data = json.loads(text_data)
-            message_type = data.get('type')
-            
-            if message_type == 'design:join':
-                await self.handle_design_join(data)
-            elif message_type == 'cursor:move':
-                await self.handle_cursor_move(data)
-            else:
-                # Forward other messages to room group
-                await self.channel_layer.group_send(
-                    self.room_group_name,
-                    {
-                        'type': 'forward_message',
-                        'data': data
-                    }
-                )
-        except json.JSONDecodeError:
-            await self.send(text_data=json.dumps({
+            data = self.codec.decode(text_data, bytes_data)
+            if not isinstance(data, dict):
+                raise ProtocolError('Messages must be objects')
+        except ProtocolError as e:
+            await self.send_message({
                 'type': 'error',
-                'message': 'Invalid JSON'
-            }))
+                'message': str(e)
+            })
+            return
+        
+        message_type = data.get('type')
+        
+        if message_type == 'design:join':
+            await self.handle_design_join(data)
+        elif message_type == 'cursor:move':
+            await self.handle_cursor_move(data)
+        elif message_type == 'presence:heartbeat':
+            await self.handle_presence_heartbeat(data)
+        elif message_type == 'object:op':
+            await self.handle_object_op(data)
+        elif message_type in ('lease:acquire', 'lease:release'):
+            await self.handle_lease(data)
+        else:
+            # Forward other messages to room group
+            await self.channel_layer.group_send(
+                self.room_group_name,
+                {
+                    'type': 'forward_message',
+                    'data': data
+                }
+            )
     
     async def handle_design_join(self, data):
         """
         Handle user joining a design room.
+        The joiner gets a snapshot of everyone present; the room only
+        hears about the joiner (and about connections that timed out).
+        A reconnecting client sends the last seq it saw as lastSeq.
         """
         user_id = data.get('userId')
+        registry = get_presence_registry()
+        
+        await registry.join(self.room_group_name, self.channel_name, user_id)
+        self.presence_user_id = user_id
+        users, expired = await registry.snapshot(self.room_group_name)
+        
+        await self.send_message({
+            'type': 'presence:snapshot',
+            'users': users,
+            'ttl': registry.ttl
+        })
+        await self.broadcast_user_left(expired)
+        if data.get('lastSeq') is not None:
+            await self.send_missed_events(data['lastSeq'])
         
         # Broadcast user joined
         await self.channel_layer.group_send(
@@ -90,135 +205,328 @@ class DesignConsumer(AsyncWebsocketConsumer):
             }
         )
     
-    async def handle_cursor_move(self, data):
+    async def send_missed_events(self, last_seq):
         """
-        Handle cursor movement.
+        Send a reconnecting client the events after its lastSeq from the
+        replay buffer, or tell it to reload if they are no longer all there.
+        """
+        try:
+            last_seq = int(last_seq)
+        except (TypeError, ValueError):
+            await self.send_message({
+                'type': 'error',
+                'message': f'Invalid lastSeq: {last_seq}'
+            })
+            return
+        if self.actual_design_id is None:
+            self.actual_design_id = await database_sync_to_async(get_actual_design_id)(self.design_id)
+        if self.actual_design_id is None:
+            await self.send_message({
+                'type': 'error',
+                'message': 'Design not found'
+            })
+            return
+        
+        head, events = await database_sync_to_async(operation_service.missed)(
+            self.actual_design_id, last_seq
+        )
+        if events is None:
+            await self.send_message({
+                'type': 'sync:reload',
+                'seq': head
+            })
+        else:
+            await self.send_message({
+                'type': 'sync:replay',
+                'seq': head,
+                'events': events
+            })
+    
+    async def handle_presence_heartbeat(self, data):
+        """
+        Keep this connection's presence alive.
+        A connection that already expired joins again.
+        """
+        if self.presence_user_id is None:
+            return
+        alive = await get_presence_registry().heartbeat(self.room_group_name, self.channel_name)
+        if not alive:
+            await self.handle_design_join({'userId': self.presence_user_id})
+    
+    async def broadcast_user_left(self, entries):
         """
-        x = data.get('x')
-        y = data.get('y')
-        user_id = data.get('userId', 'unknown')
+        Tell the room that connections left.
+        """
+        for entry in entries:
+            await self.channel_layer.group_send(
+                self.room_group_name,
+                {
+                    'type': 'user_left',
+                    'userId': entry['userId'],
+                    'socketId': entry['socketId']
+                }
+            )
+    
+    async def handle_object_op(self, data):
+        """
+        Apply an object operation and broadcast it with its sequence number.
+        Rejected operations are reported to the sender only.
+        """
+        if self.actual_design_id is None:
+            self.actual_design_id = await database_sync_to_async(get_actual_design_id)(self.design_id)
+        if self.actual_design_id is None:
+            await self.reject_operation(data, 'Design not found')
+            return
+        
+        user_id = str(data.get('userId') or self.presence_user_id or 'unknown')
+        if not await self.authorize(user_id, 'editor'):
+            await self.reject_operation(data, 'Not allowed to edit this design')
+            return
+        # Patches (drags, resizes) are persisted write-behind; see write_behind.py
+        buffered = write_behind_config()['interval'] > 0
+        async with room_lock(self.room_group_name):
+            try:
+                message = await database_sync_to_async(operation_service.apply)(
+                    self.actual_design_id, user_id, data, buffered
+                )
+            except OperationError as e:
+                await self.reject_operation(data, str(e))
+                return
+            if buffered:
+                write_behind_buffer.ensure_flusher()
+            await self.channel_layer.group_send(
+                self.room_group_name,
+                {
+                    'type': 'design_operation',
+                    'message': message
+                }
+            )
+    
+    async def handle_lease(self, data):
+        """
+        Acquire (or renew) or release an edit lease on an object.
+        Grants and releases are broadcast to the room; a refused lease is
+        reported to the sender with the current holder's lease.
+        """
+        object_id = data.get('objectId')
+        if self.actual_design_id is None:
+            self.actual_design_id = await database_sync_to_async(get_actual_design_id)(self.design_id)
+        if self.actual_design_id is None or not object_id:
+            await self.send_message({
+                'type': 'error',
+                'message': 'Design not found' if object_id else 'objectId is required'
+            })
+            return
+        
+        object_id = str(object_id)
+        user_id = str(data.get('userId') or self.presence_user_id or 'unknown')
+        if data['type'] == 'lease:release':
+            await self.release_lease(object_id, user_id)
+            return
+        if not await self.authorize(user_id, 'editor'):
+            await self.send_message({
+                'type': 'lease:denied',
+                'objectId': object_id,
+                'error': 'Not allowed to edit this design'
+            })
+            return
         
-        # Broadcast cursor position
+        granted, lease = await sync_to_async(edit_leases.acquire)(self.actual_design_id, object_id, user_id)
+        if not granted:
+            await self.send_message({
+                'type': 'lease:denied',
+                'objectId': object_id,
+                'lease': lease
+            })
+            return
+        self.leases[object_id] = user_id
+        await self.broadcast_events([{'type': 'lease:acquired', **lease}])
+    
+    async def release_lease(self, object_id, user_id):
+        """
+        Release a lease taken through this socket and tell the room.
+        """
+        self.leases.pop(object_id, None)
+        released = await sync_to_async(edit_leases.release)(self.actual_design_id, object_id, user_id)
+        if released:
+            await self.broadcast_events([{
+                'type': 'lease:released',
+                'objectId': object_id,
+                'userId': user_id
+            }])
+    
+    async def broadcast_events(self, events):
+        """
+        Send frames to everyone in the room, this socket included.
+        """
         await self.channel_layer.group_send(
             self.room_group_name,
             {
-                'type': 'cursor_update',
-                'userId': user_id,
-                'x': x,
-                'y': y
+                'type': 'design_events',
+                'events': events
             }
         )
     
+    async def authorize(self, user_id, required_role):
+        """
+        Check a user's role on the design when AUTHORIZE_OPERATIONS is on.
+        Roles come from the role cache, so most messages need no query.
+        """
+        if not authorize_operations():
+            return True
+        access = await role_service.aget_access(self.actual_design_id, user_id)
+        return access is not None and access.has_role(required_role)
+    
+    async def reject_operation(self, data, error):
+        """
+        Tell the sender an operation was not applied.
+        """
+        await self.send_message({
+            'type': 'object:op:rejected',
+            'clientOpId': data.get('clientOpId'),
+            'error': error
+        })
+    
+    async def handle_cursor_move(self, data):
+        """
+        Handle cursor movement.
+        Only the latest position per user is kept; the room's coalescer
+        broadcasts them together as one cursor batch per tick.
+        """
+        user_id = str(data.get('userId', 'unknown'))
+        self.cursor_user_id = user_id
+        
+        cursor_coalescers.get(self.channel_layer, self.room_group_name).update(user_id, {
+            'userId': user_id,
+            'x': data.get('x'),
+            'y': data.get('y')
+        })
+    
     # Handler methods for group messages
     
     async def user_joined(self, event):
         """
         Send user joined event to WebSocket.
         """
-        await self.send(text_data=json.dumps({
+        await self.send_message({
             'type': 'user:joined',
             'userId': event['userId'],
             'socketId': event['socketId']
-        }))
+        })
     
     async def user_left(self, event):
         """
         Send user left event to WebSocket.
         """
-        await self.send(text_data=json.dumps({
+        await self.send_message({
             'type': 'user:left',
-            'userId': event['userId']
-        }))
+            'userId': event['userId'],
+            'socketId': event.get('socketId')
+        })
     
-    async def cursor_update(self, event):
+    async def cursor_batch(self, event):
         """
-        Send cursor update to WebSocket.
+        Send a cursor batch to WebSocket.
+        Batches that arrive while a previous frame is still queued are
+        merged into it, so a slow client only ever receives the newest
+        positions, and they are the first frames shed when it falls behind.
         """
-        await self.send(text_data=json.dumps({
-            'type': 'cursor:update',
-            'userId': event['userId'],
-            'x': event['x'],
-            'y': event['y']
-        }))
+        for cursor in event['cursors']:
+            self.pending_cursors[cursor['userId']] = cursor
+        self.send_queue.put(self.take_cursor_batch, PRIORITY_DROPPABLE, key='cursor:batch')
+    
+    def take_cursor_batch(self):
+        """
+        The cursor:batch frame of every pending cursor, or None if there are none.
+        """
+        if not self.pending_cursors:
+            return None
+        cursors, self.pending_cursors = self.pending_cursors, {}
+        return {
+            'type': 'cursor:batch',
+            'cursors': list(cursors.values())
+        }
     
-    async def comment_created(self, event):
+    async def design_operation(self, event):
         """
-        Send comment created event to WebSocket.
+        Send an applied object operation to WebSocket.
         """
-        await self.send(text_data=json.dumps({
-            'type': 'comment:created',
-            'comment': event['comment']
-        }))
+        await self.send_message(event['message'])
     
-    async def comment_resolved(self, event):
+    async def comment_batch(self, event):
         """
-        Send comment resolved event to WebSocket.
+        Send comment events to WebSocket.
+        A single event keeps its own frame; several are sent together.
         """
-        await self.send(text_data=json.dumps({
-            'type': 'comment:resolved',
-            'comment': event['comment']
-        }))
+        events = event['events']
+        if len(events) == 1:
+            await self.send_message(events[0])
+        else:
+            await self.send_message({
+                'type': 'comment:batch',
+                'events': events
+            })
     
-    async def comment_deleted(self, event):
+    async def design_events(self, event):
         """
-        Send comment deleted event to WebSocket.
+        Send design-wide events (such as design:restored and leases) to WebSocket.
         """
-        await self.send(text_data=json.dumps({
-            'type': 'comment:deleted',
-            'id': event['id']
-        }))
+        for message in event['events']:
+            await self.send_message(message)
     
     async def forward_message(self, event):
         """
         Forward a message to WebSocket.
         """
-        await self.send(text_data=json.dumps(event['data']))
+        await self.send_message(event['data'])
 
 
 # Signal handlers to broadcast database changes
-from django.db.models.signals import post_save, post_delete
+# Events are queued only once the surrounding transaction commits, and are
+# sent on the server's event loop, batched per design and tick.
+from django.db import transaction
+from django.db.models.signals import post_init, post_save, post_delete
 from django.dispatch import receiver
-from channels.layers import get_channel_layer
+from app.collaboration.outbox import comment_outbox
+
 
-channel_layer = get_channel_layer()
+def queue_comment_event(design_id, build_frame):
+    """
+    Queue a comment frame for the design's room after commit.
+    """
+    transaction.on_commit(
+        lambda: comment_outbox.enqueue(f'design_{design_id}', build_frame())
+    )
 
 
-@receiver(post_save, sender=DesignComment)
-def comment_saved(sender, instance, created, **kwargs):
+@receiver(post_init, sender=DesignComment)
+def comment_loaded(sender, instance, **kwargs):
     """
-    Broadcast when a comment is created or updated.
+    Remember the resolved flag so only the transition is broadcast.
     """
-    if channel_layer and created:
-        from asgiref.sync import async_to_sync
-        from app.collaboration.serializers import CommentSerializer
-        
-        serializer = CommentSerializer(instance)
-        async_to_sync(channel_layer.group_send)(
-            f'design_{instance.design.id}',
-            {
-                'type': 'comment_created',
-                'comment': serializer.data
-            }
-        )
+    instance._broadcast_resolved = instance.resolved
 
 
 @receiver(post_save, sender=DesignComment)
-def comment_resolved_signal(sender, instance, **kwargs):
+def comment_saved(sender, instance, created, **kwargs):
     """
-    Broadcast when a comment is resolved.
+    Broadcast when a comment is created or resolved.
     """
-    if channel_layer and instance.resolved:
-        from asgiref.sync import async_to_sync
-        from app.collaboration.serializers import CommentSerializer
-        
-        serializer = CommentSerializer(instance)
-        async_to_sync(channel_layer.group_send)(
-            f'design_{instance.design.id}',
-            {
-                'type': 'comment_resolved',
-                'comment': serializer.data
-            }
-        )
+    from app.collaboration.serializers import CommentSerializer
+    
+    was_resolved = instance._broadcast_resolved
+    instance._broadcast_resolved = instance.resolved
+    if created:
+        event_type = 'comment:created'
+    elif instance.resolved and not was_resolved:
+        event_type = 'comment:resolved'
+    else:
+        return
+    
+    queue_comment_event(instance.design_id, lambda: {
+        'type': event_type,
+        'comment': CommentSerializer(instance).data
+    })
 
 
 @receiver(post_delete, sender=DesignComment)
@@ -226,15 +534,8 @@ def comment_deleted_signal(sender, instance, **kwargs):
     """
     Broadcast when a comment is deleted.
     """
-    if channel_layer:
-        from asgiref.sync import async_to_sync
-        
-        async_to_sync(channel_layer.group_send)(
-            f'design_{instance.design.id}',
-            {
-                'type': 'comment_deleted',
-                'id': str(instance.id)
-            }
-        )
-
-
+    comment_id = str(instance.id)
+    queue_comment_event(instance.design_id, lambda: {
+        'type': 'comment:deleted',
+        'id': comment_id
+    })
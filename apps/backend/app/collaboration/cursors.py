@@ -0,0 +1,95 @@
+"""
+Cursor Coalescing - Batch cursor movements per design room
+"""
+import asyncio
+from typing import Any, Dict, Optional
+from django.conf import settings
+
+
+def cursor_flush_interval() -> float:
+    """Seconds between cursor batches, from COLLABORATION['CURSOR_FLUSH_HZ']"""
+    config = getattr(settings, 'COLLABORATION', {}) or {}
+    hz = float(config.get('CURSOR_FLUSH_HZ', 20))
+    return 1.0 / hz if hz > 0 else 0.0
+
+
+class CursorCoalescer:
+    """
+    Latest cursor per user for one room, flushed as a single cursor_batch.
+    
+    The first movement after an idle period is sent at once; movements
+    arriving while the room is ticking only overwrite the user's pending
+    position, so a room costs at most one group_send per interval however
+    many users are moving.
+    """
+    
+    def __init__(self, channel_layer, group_name: str, interval: float):
+        self.channel_layer = channel_layer
+        self.group_name = group_name
+        self.interval = interval
+        self.pending: Dict[str, Dict[str, Any]] = {}
+        self.task: Optional[asyncio.Task] = None
+    
+    def update(self, user_id: str, cursor: Dict[str, Any]) -> None:
+        """Record a user's latest cursor and make sure a flush is scheduled"""
+        self.pending[user_id] = cursor
+        if self.task is None or self.task.done():
+            self.task = asyncio.ensure_future(self.run())
+    
+    def discard(self, user_id: str) -> None:
+        """Drop a user's unsent cursor, e.g. when they disconnect"""
+        self.pending.pop(user_id, None)
+    
+    async def flush(self) -> None:
+        """Send every pending cursor in one group message"""
+        if not self.pending:
+            return
+        cursors, self.pending = self.pending, {}
+        await self.channel_layer.group_send(
+            self.group_name,
+            {
+                'type': 'cursor_batch',
+                'cursors': list(cursors.values())
+            }
+        )
+    
+    async def run(self) -> None:
+        """Flush, then keep ticking until a whole interval passes without movement"""
+        try:
+            while self.pending:
+                await self.flush()
+                await asyncio.sleep(self.interval)
+        finally:
+            cursor_coalescers.release(self)
+
+
+class CursorCoalescerRegistry:
+    """Coalescers by room group, created on demand and released when idle"""
+    
+    def __init__(self):
+        self.coalescers: Dict[Any, CursorCoalescer] = {}
+    
+    def get(self, channel_layer, group_name: str) -> CursorCoalescer:
+        # Keyed by event loop too: a coalescer's task belongs to the loop it was started on
+        key = (id(asyncio.get_running_loop()), group_name)
+        coalescer = self.coalescers.get(key)
+        if coalescer is None or coalescer.channel_layer is not channel_layer:
+            coalescer = CursorCoalescer(channel_layer, group_name, cursor_flush_interval())
+            self.coalescers[key] = coalescer
+        return coalescer
+    
+    def release(self, coalescer: CursorCoalescer) -> None:
+        if coalescer.pending:
+            return
+        for key, existing in list(self.coalescers.items()):
+            if existing is coalescer:
+                del self.coalescers[key]
+    
+    def discard(self, group_name: str, user_id: str) -> None:
+        key = (id(asyncio.get_running_loop()), group_name)
+        coalescer = self.coalescers.get(key)
+        if coalescer is not None:
+            coalescer.discard(user_id)
+
+
+cursor_coalescers = CursorCoalescerRegistry()
@@ -0,0 +1,221 @@
+"""
+Edit Lease Service - Short-lived claims on the objects users are editing
+"""
+import abc
+import json
+import threading
+import time
+import uuid
+from typing import Any, Dict, Iterable, Optional, Tuple
+from django.conf import settings
+
+
+Lease = Dict[str, Any]
+
+
+def lease_config() -> Dict[str, Any]:
+    config = getattr(settings, 'COLLABORATION', {}) or {}
+    return {
+        'ttl': float(config.get('LEASE_TTL', 10)),
+        'backend': config.get('LEASE_BACKEND', 'memory'),
+        'redis_url': config.get('LEASE_REDIS_URL') or config.get('PRESENCE_REDIS_URL'),
+    }
+
+
+class LeaseConflict(Exception):
+    """A write to an object someone else holds the edit lease on"""
+    
+    def __init__(self, lease: Lease):
+        super().__init__(f"Object is being edited by {lease['userId']}")
+        self.lease = lease
+
+
+class LeaseStore(abc.ABC):
+    """
+    Leases by key, each taken, renewed and released atomically.
+    
+    A holder check and the write that follows it are one step, so a lease
+    that lapses and is taken by someone else in between is never
+    overwritten or deleted by its previous holder.
+    """
+    
+    @abc.abstractmethod
+    def take(self, key: str, lease: Lease, ttl: float) -> Lease:
+        """Store lease unless another user holds key; returns the lease now held"""
+    
+    @abc.abstractmethod
+    def give_up(self, key: str, user_id: str) -> bool:
+        """Delete the lease if user_id holds it"""
+    
+    @abc.abstractmethod
+    def get(self, key: str) -> Optional[Lease]:
+        """The live lease on key, if any"""
+
+
+class InMemoryLeaseStore(LeaseStore):
+    """Process-local leases; only correct with a single worker"""
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        # key -> (lease, monotonic expiry)
+        self.leases: Dict[str, Tuple[Lease, float]] = {}
+    
+    def current(self, key: str) -> Optional[Lease]:
+        entry = self.leases.get(key)
+        if entry is None:
+            return None
+        if entry[1] <= time.monotonic():
+            del self.leases[key]
+            return None
+        return entry[0]
+    
+    def take(self, key: str, lease: Lease, ttl: float) -> Lease:
+        with self.lock:
+            current = self.current(key)
+            if current is not None and current['userId'] != lease['userId']:
+                return current
+            self.leases[key] = (lease, time.monotonic() + ttl)
+            return lease
+    
+    def give_up(self, key: str, user_id: str) -> bool:
+        with self.lock:
+            current = self.current(key)
+            if current is None or current['userId'] != user_id:
+                return False
+            del self.leases[key]
+            return True
+    
+    def get(self, key: str) -> Optional[Lease]:
+        with self.lock:
+            return self.current(key)
+
+
+class RedisLeaseStore(LeaseStore):
+    """
+    Leases shared by every worker.
+    
+    Each lease is a JSON string with a PX expiry. Taking and releasing
+    compare the holder and write in one Lua script.
+    """
+    
+    TAKE = """
+    local current = redis.call('GET', KEYS[1])
+    if current and cjson.decode(current)['userId'] ~= ARGV[2] then
+        return current
+    end
+    redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[3])
+    return ARGV[1]
+    """
+    GIVE_UP = """
+    local current = redis.call('GET', KEYS[1])
+    if current and cjson.decode(current)['userId'] == ARGV[1] then
+        return redis.call('DEL', KEYS[1])
+    end
+    return 0
+    """
+    
+    def __init__(self, url: str):
+        import redis
+        self.redis = redis.from_url(url)
+        self.take_script = self.redis.register_script(self.TAKE)
+        self.give_up_script = self.redis.register_script(self.GIVE_UP)
+    
+    def take(self, key: str, lease: Lease, ttl: float) -> Lease:
+        held = self.take_script(
+            keys=[key], args=[json.dumps(lease), lease['userId'], max(1, int(ttl * 1000))]
+        )
+        return json.loads(held)
+    
+    def give_up(self, key: str, user_id: str) -> bool:
+        return bool(self.give_up_script(keys=[key], args=[user_id]))
+    
+    def get(self, key: str) -> Optional[Lease]:
+        value = self.redis.get(key)
+        return json.loads(value) if value else None
+
+
+def create_lease_store() -> LeaseStore:
+    """Store configured by COLLABORATION['LEASE_BACKEND'] ('memory' or 'redis')"""
+    config = lease_config()
+    if config['backend'] == 'redis':
+        return RedisLeaseStore(config['redis_url'])
+    if config['backend'] == 'memory':
+        return InMemoryLeaseStore()
+    raise ValueError(f"Unknown lease backend: {config['backend']}")
+
+
+_store: Optional[LeaseStore] = None
+
+
+def get_lease_store() -> LeaseStore:
+    """Process-wide store, created on first use"""
+    global _store
+    if _store is None:
+        _store = create_lease_store()
+    return _store
+
+
+def reset_lease_store() -> None:
+    """Forget the process-wide store so settings changes take effect"""
+    global _store
+    _store = None
+
+
+class EditLeaseService:
+    """
+    Per-object edit leases.
+    
+    A user takes a lease before dragging or editing an object and renews it
+    by acquiring it again at least every LEASE_TTL seconds; it lapses on its
+    own if they stop. While it is held, writes to the object by anyone else
+    are refused instead of being persisted and then overwritten. Leases
+    live in LEASE_BACKEND, which must be 'redis' when several workers serve
+    the same design.
+    """
+    
+    KEY_PREFIX = 'lease:'
+    
+    def key(self, design_id: Any, object_id: Any) -> str:
+        try:
+            object_id = uuid.UUID(str(object_id))
+        except ValueError:
+            pass
+        return f'{self.KEY_PREFIX}{design_id}:{object_id}'
+    
+    def acquire(self, design_id: Any, object_id: Any, user_id: str) -> Tuple[bool, Lease]:
+        """
+        Take or renew a lease; returns (granted, lease), where lease is the
+        other holder's when it is not granted
+        """
+        ttl = lease_config()['ttl']
+        lease = {
+            'objectId': str(object_id),
+            'userId': user_id,
+            'expiresAt': time.time() + ttl,
+        }
+        held = get_lease_store().take(self.key(design_id, object_id), lease, ttl)
+        return held['userId'] == user_id, held
+    
+    def release(self, design_id: Any, object_id: Any, user_id: str) -> bool:
+        """Give up a lease; False if the user did not hold it"""
+        return get_lease_store().give_up(self.key(design_id, object_id), user_id)
+    
+    def holder(self, design_id: Any, object_id: Any) -> Optional[Lease]:
+        return get_lease_store().get(self.key(design_id, object_id))
+    
+    def conflict(self, design_id: Any, object_id: Any, user_id: Optional[str]) -> Optional[Lease]:
+        """The lease on the object if someone other than user_id holds it"""
+        current = self.holder(design_id, object_id)
+        if current is None or current['userId'] == user_id:
+            return None
+        return current
+    
+    def check(self, design_id: Any, object_ids: Iterable[Any], user_id: Optional[str]) -> None:
+        """Raise LeaseConflict if someone other than user_id holds any of the objects"""
+        for object_id in object_ids:
+            lease = self.conflict(design_id, object_id, user_id)
+            if lease is not None:
+                raise LeaseConflict(lease)
+
+
+edit_leases = EditLeaseService()
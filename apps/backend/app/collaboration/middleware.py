@@ -0,0 +1,17 @@
+"""
+Collaboration middleware.
+"""
+from app.collaboration.services import design_id_cache
+
+
+class DesignIdCacheMiddleware:
+    """
+    Remember design id resolutions for the rest of each request.
+    """
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+    
+    def __call__(self, request):
+        with design_id_cache.request_scope():
+            return self.get_response(request)
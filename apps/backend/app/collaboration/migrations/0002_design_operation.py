@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('collaboration', '0001_initial'),
+        ('designs', '0003_design_revision'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DesignOperation',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('seq', models.BigIntegerField()),
+                ('op', models.CharField(choices=[('create', 'Create'), ('patch', 'Patch'), ('delete', 'Delete'), ('reorder', 'Reorder')], max_length=20)),
+                ('object_id', models.UUIDField(blank=True, null=True)),
+                ('user_id', models.CharField(max_length=255)),
+                ('client_op_id', models.CharField(blank=True, max_length=100, null=True)),
+                ('payload', models.JSONField(default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('design', models.ForeignKey(db_column='design_id', on_delete=django.db.models.deletion.CASCADE, related_name='operations', to='designs.design')),
+            ],
+            options={
+                'db_table': 'design_operations',
+                'unique_together': {('design', 'seq')},
+            },
+        ),
+    ]
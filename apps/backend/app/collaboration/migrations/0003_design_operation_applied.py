@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('collaboration', '0002_design_operation'),
+        ('designs', '0003_design_revision'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='designoperation',
+            name='applied',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddIndex(
+            model_name='designoperation',
+            index=models.Index(condition=models.Q(('applied', False)), fields=['design', 'seq'], name='design_ops_unapplied_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('collaboration', '0003_design_operation_applied'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='designversion',
+            name='data',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='designversion',
+            name='is_keyframe',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AlterField(
+            model_name='designversion',
+            name='snapshot',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
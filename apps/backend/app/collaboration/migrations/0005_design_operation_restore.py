@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('collaboration', '0004_design_version_deltas'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='designoperation',
+            name='op',
+            field=models.CharField(choices=[('create', 'Create'), ('patch', 'Patch'), ('delete', 'Delete'), ('reorder', 'Reorder'), ('restore', 'Restore')], max_length=20),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_threads(apps, schema_editor):
+    DesignComment = apps.get_model('collaboration', 'DesignComment')
+    parents = dict(
+        DesignComment.objects.filter(parent__isnull=False).values_list('id', 'parent_id')
+    )
+
+    def root(comment_id):
+        while comment_id in parents:
+            comment_id = parents[comment_id]
+        return comment_id
+
+    threads = {}
+    for comment_id in parents:
+        threads.setdefault(root(comment_id), []).append(comment_id)
+    for thread_id, comment_ids in threads.items():
+        DesignComment.objects.filter(id__in=comment_ids).update(thread_id=thread_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('collaboration', '0005_design_operation_restore'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='designcomment',
+            name='thread',
+            field=models.ForeignKey(blank=True, db_column='thread_id', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='thread_replies', to='collaboration.designcomment'),
+        ),
+        migrations.RunPython(fill_threads, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:23
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('collaboration', '0006_design_comment_thread'),
+        ('designs', '0004_design_name_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='designchangelog',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='designchangelog',
+            index=models.Index(fields=['created_at'], name='design_chan_created_423832_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('collaboration', '0007_design_change_log_buffered'),
+        ('designs', '0004_design_name_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='designcomment',
+            index=models.Index(fields=['design', 'x', 'y'], name='design_comm_design__54495e_idx'),
+        ),
+    ]
@@ -1,5 +1,6 @@
 import uuid
 from django.db import models
+from django.utils import timezone
 from app.designs.models import Design
 
 
@@ -39,6 +40,8 @@ class DesignComment(models.Model):
     x = models.DecimalField(max_digits=10, decimal_places=4, null=True, blank=True)
     y = models.DecimalField(max_digits=10, decimal_places=4, null=True, blank=True)
     parent = models.ForeignKey('self', related_name='replies', on_delete=models.CASCADE, null=True, blank=True, db_column='parent_id')
+    # Top-level comment of the thread a reply belongs to; null for top-level comments
+    thread = models.ForeignKey('self', related_name='thread_replies', on_delete=models.CASCADE, null=True, blank=True, db_column='thread_id')
     resolved = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -50,18 +53,29 @@ class DesignComment(models.Model):
             models.Index(fields=['design', '-created_at']),
             models.Index(fields=['object_id']),
             models.Index(fields=['parent']),
+            # Viewport (?bbox=) queries
+            models.Index(fields=['design', 'x', 'y']),
         ]
 
     def __str__(self):
         return f"Comment by {self.user_id} on {self.design.id}"
 
+    def save(self, *args, **kwargs):
+        if self.parent_id and self.thread_id is None:
+            self.thread_id = self.parent.thread_id or self.parent_id
+        super().save(*args, **kwargs)
+
 
 class DesignVersion(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     design = models.ForeignKey(Design, related_name='versions', on_delete=models.CASCADE, db_column='design_id')
     version_number = models.IntegerField()
     created_by = models.CharField(max_length=255)
-    snapshot = models.JSONField()
+    # Plain snapshot of versions stored before keyframes and diffs
+    snapshot = models.JSONField(null=True, blank=True)
+    is_keyframe = models.BooleanField(default=True)
+    # zlib-compressed JSON: the snapshot for keyframes, otherwise the diff from the previous version
+    data = models.BinaryField(null=True, blank=True)
     description = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -84,7 +98,8 @@ class DesignChangeLog(models.Model):
     change_type = models.CharField(max_length=50)
     object_id = models.UUIDField(null=True, blank=True)
     description = models.TextField(blank=True, null=True)
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Set when the change is recorded, not when the buffered entry is written
+    created_at = models.DateTimeField(default=timezone.now)
 
     class Meta:
         app_label = 'collaboration'
@@ -92,7 +107,58 @@ class DesignChangeLog(models.Model):
         indexes = [
             models.Index(fields=['design', '-created_at']),
             models.Index(fields=['user_id']),
+            # Finds the retention cutoff
+            models.Index(fields=['created_at']),
         ]
 
     def __str__(self):
         return f"{self.change_type} by {self.user_id} on {self.design.id}"
+
+
+class DesignOperation(models.Model):
+    OP_CHOICES = [
+        ('create', 'Create'),
+        ('patch', 'Patch'),
+        ('delete', 'Delete'),
+        ('reorder', 'Reorder'),
+        ('restore', 'Restore'),
+    ]
+    
+    id = models.BigAutoField(primary_key=True)
+    design = models.ForeignKey(Design, related_name='operations', on_delete=models.CASCADE, db_column='design_id')
+    seq = models.BigIntegerField()
+    op = models.CharField(max_length=20, choices=OP_CHOICES)
+    object_id = models.UUIDField(null=True, blank=True)
+    user_id = models.CharField(max_length=255)
+    client_op_id = models.CharField(max_length=100, null=True, blank=True)
+    payload = models.JSONField(default=dict)
+    # False while a buffered edit has not been written to design_objects yet
+    applied = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        app_label = 'collaboration'
+        db_table = 'design_operations'
+        unique_together = [['design', 'seq']]
+        indexes = [
+            models.Index(
+                fields=['design', 'seq'],
+                condition=models.Q(applied=False),
+                name='design_ops_unapplied_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.op} #{self.seq} on {self.design_id}"
+
+    def to_message(self):
+        """The object:op message broadcast to collaborators"""
+        return {
+            'type': 'object:op',
+            'seq': self.seq,
+            'op': self.op,
+            'objectId': str(self.object_id) if self.object_id else None,
+            'data': self.payload,
+            'userId': self.user_id,
+            'clientOpId': self.client_op_id,
+        }
@@ -0,0 +1,407 @@
+"""
+Operation Service - Apply and log real-time object operations
+"""
+import copy
+import uuid
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from app.designs.models import Design, DesignObject
+from app.designs.serializers import (
+    DesignObjectSerializer, DesignObjectCreateSerializer, DesignObjectUpdateSerializer
+)
+from app.collaboration.models import DesignOperation
+from app.collaboration.change_log import change_log
+from app.collaboration.leases import edit_leases
+from app.collaboration.outbox import design_outbox
+from app.collaboration.replay import get_replay_buffer
+from app.collaboration.write_behind import write_behind_buffer, write_behind_config
+
+
+class OperationError(ValueError):
+    """An operation was rejected and nothing was applied"""
+
+
+def patch_payload(obj: DesignObject, names: Iterable[str]) -> Dict[str, Any]:
+    """The logged payload of a patch: the serialized new values and updated_at"""
+    fields = DesignObjectSerializer(obj).data
+    payload = {name: fields[name] for name in names}
+    payload['updated_at'] = fields['updated_at']
+    return payload
+
+
+def parse_uuid(value: Any, field: str) -> uuid.UUID:
+    try:
+        return uuid.UUID(str(value))
+    except (TypeError, ValueError) as e:
+        raise OperationError(f'Invalid {field}: {value}') from e
+
+
+class OperationService:
+    """
+    Apply object operations to a design and append them to its operation log.
+    
+    An operation is {'op': 'create' | 'patch' | 'delete' | 'reorder',
+    'objectId', 'data', 'clientOpId'}; version restores are logged as
+    'restore' operations by restore(). Each one is applied in its own
+    transaction with the design row locked, which hands out the design's
+    next revision as the operation's sequence number; the logged payload
+    is the normalized result, so replaying the log in seq order reproduces
+    the objects.
+    
+    With buffered=True, patches only write their log entry; the object rows
+    are left to the write-behind buffer. Other operations flush the
+    design's buffered edits first so they apply on top of them.
+    
+    Applied operations are also kept in the replay buffer, so reconnecting
+    clients can catch up without reloading the design. Patches and deletes
+    of an object someone else holds the edit lease on are refused.
+    """
+    
+    OPS = ('create', 'patch', 'delete', 'reorder')
+    # Operations refused while another user holds the object's edit lease
+    LEASED_OPS = ('patch', 'delete')
+    CHANGE_TYPES = {
+        'create': 'object_created',
+        'patch': 'object_updated',
+        'delete': 'object_deleted',
+        'reorder': 'layers_reordered',
+    }
+    MAX_SINCE = 1000
+    
+    def apply(
+        self,
+        design_id: str,
+        user_id: str,
+        operation: Dict[str, Any],
+        buffered: bool = False
+    ) -> Dict[str, Any]:
+        """Apply one operation; returns its object:op message"""
+        op = operation.get('op')
+        if op not in self.OPS:
+            raise OperationError(f'Unknown operation: {op}')
+        data = operation.get('data') or {}
+        if not isinstance(data, dict):
+            raise OperationError('Operation data must be an object')
+        client_op_id = operation.get('clientOpId')
+        client_op_id = str(client_op_id)[:100] if client_op_id is not None else None
+        if op in self.LEASED_OPS:
+            lease = edit_leases.conflict(design_id, operation.get('objectId'), user_id)
+            if lease is not None:
+                raise OperationError(f"Object is being edited by {lease['userId']}")
+        
+        if buffered and op == 'patch':
+            return self.apply_buffered_patch(design_id, user_id, operation.get('objectId'), data, client_op_id)
+        write_behind_buffer.settle(design_id)
+        
+        with transaction.atomic():
+            design = Design.objects.select_for_update().get(id=design_id)
+            object_id, payload = getattr(self, f'apply_{op}')(design, operation.get('objectId'), data)
+            design.revision += 1
+            design.last_edited_by = user_id
+            design.save(update_fields=['revision', 'last_edited_by', 'updated_at'])
+            logged = DesignOperation.objects.create(
+                design=design,
+                seq=design.revision,
+                op=op,
+                object_id=object_id,
+                user_id=user_id,
+                client_op_id=client_op_id,
+                payload=payload
+            )
+            change_log.record(design.id, self.CHANGE_TYPES[op], object_id, user_id)
+            message = logged.to_message()
+            self.buffer_for_replay(design.id, message)
+        return message
+    
+    def apply_buffered_patch(
+        self,
+        design_id: str,
+        user_id: str,
+        object_id: Any,
+        data: Dict[str, Any],
+        client_op_id: Optional[str]
+    ) -> Dict[str, Any]:
+        """Log a patch and hand the changed row to the write-behind buffer"""
+        object_id = parse_uuid(object_id, 'objectId')
+        try:
+            obj = write_behind_buffer.get_object(design_id, object_id)
+        except DesignObject.DoesNotExist as e:
+            raise OperationError(f'Object not found: {object_id}') from e
+        serializer = DesignObjectUpdateSerializer(obj, data=data, partial=True)
+        if not serializer.is_valid():
+            raise OperationError(str(serializer.errors))
+        if not serializer.validated_data:
+            raise OperationError('Patch changes no fields')
+        
+        # Edit a copy so a failed log write leaves the buffered row untouched
+        now = timezone.now()
+        edited = copy.copy(obj)
+        for name, value in serializer.validated_data.items():
+            setattr(edited, name, value)
+        edited.updated_at = now
+        payload = patch_payload(edited, serializer.validated_data)
+        
+        with transaction.atomic():
+            # The UPDATE holds the design row lock until commit, like select_for_update
+            Design.objects.filter(id=design_id).update(
+                revision=F('revision') + 1, last_edited_by=user_id, updated_at=now
+            )
+            seq = Design.objects.values_list('revision', flat=True).get(id=design_id)
+            logged = DesignOperation.objects.create(
+                design_id=design_id,
+                seq=seq,
+                op='patch',
+                object_id=object_id,
+                user_id=user_id,
+                client_op_id=client_op_id,
+                payload=payload,
+                applied=False
+            )
+            change_log.record(design_id, 'object_updated', object_id, user_id)
+            message = logged.to_message()
+            self.buffer_for_replay(design_id, message)
+        
+        dirty = write_behind_buffer.record(edited, set(serializer.validated_data), logged.id, seq)
+        if dirty >= write_behind_config()['max_pending']:
+            write_behind_buffer.flush()
+        return message
+    
+    def apply_create(self, design: Design, object_id: Any, data: Dict[str, Any]) -> Tuple[uuid.UUID, Dict]:
+        # Clients may pick the id so they can keep referring to the object
+        object_id = parse_uuid(object_id, 'objectId') if object_id else uuid.uuid4()
+        if DesignObject.objects.filter(id=object_id).exists():
+            raise OperationError(f'Object already exists: {object_id}')
+        serializer = DesignObjectCreateSerializer(data=data)
+        if not serializer.is_valid():
+            raise OperationError(str(serializer.errors))
+        obj = DesignObject.objects.create(id=object_id, design=design, **serializer.validated_data)
+        return obj.id, dict(DesignObjectSerializer(obj).data)
+    
+    def apply_patch(self, design: Design, object_id: Any, data: Dict[str, Any]) -> Tuple[uuid.UUID, Dict]:
+        obj = self.get_object(design, object_id)
+        serializer = DesignObjectUpdateSerializer(obj, data=data, partial=True)
+        if not serializer.is_valid():
+            raise OperationError(str(serializer.errors))
+        if not serializer.validated_data:
+            raise OperationError('Patch changes no fields')
+        serializer.save()
+        return obj.id, patch_payload(obj, serializer.validated_data)
+    
+    def apply_delete(self, design: Design, object_id: Any, data: Dict[str, Any]) -> Tuple[uuid.UUID, Dict]:
+        obj = self.get_object(design, object_id)
+        obj_id = obj.id
+        obj.delete()
+        return obj_id, {}
+    
+    def apply_reorder(self, design: Design, object_id: Any, data: Dict[str, Any]) -> Tuple[None, Dict]:
+        """
+        Restack the listed objects bottom to top.
+        They take over the z-indexes they already occupy, so objects that
+        are not listed keep their place in the stack.
+        """
+        ids = [parse_uuid(value, 'objectIds') for value in data.get('objectIds') or []]
+        if not ids or len(set(ids)) != len(ids):
+            raise OperationError('objectIds must list distinct objects')
+        objects = {
+            obj.id: obj
+            for obj in DesignObject.objects.filter(design=design, id__in=ids).only('id', 'z_index')
+        }
+        missing = [str(i) for i in ids if i not in objects]
+        if missing:
+            raise OperationError(f'Object not found: {", ".join(missing)}')
+        slots = sorted(obj.z_index for obj in objects.values())
+        for obj_id, z_index in zip(ids, slots):
+            objects[obj_id].z_index = z_index
+        DesignObject.objects.bulk_update(objects.values(), ['z_index'])
+        return None, {
+            'objectIds': [str(i) for i in ids],
+            'zIndex': {str(i): objects[i].z_index for i in ids},
+        }
+    
+    def restore(
+        self,
+        design_id: str,
+        user_id: str,
+        objects: List[Dict[str, Any]],
+        version: Dict[str, Any]
+    ) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+        """
+        Make a design's objects match a snapshot in one transaction.
+        
+        objects are create-serializer fields with an optional 'id'. Only rows
+        that differ are written: one bulk_create, one bulk_update per set of
+        changed fields and one delete. The restore is logged as a single
+        operation whose payload is that diff. Returns its object:op message
+        and the design's objects after the restore.
+        """
+        rows = []
+        for index, fields in enumerate(objects):
+            fields = dict(fields)
+            object_id = fields.pop('id', None)
+            serializer = DesignObjectCreateSerializer(data=fields)
+            if not serializer.is_valid():
+                raise OperationError(f'Object {index}: {serializer.errors}')
+            try:
+                object_id = uuid.UUID(str(object_id)) if object_id else None
+            except ValueError:
+                # Temporary client ids are not kept
+                object_id = None
+            rows.append((object_id, serializer.validated_data))
+        
+        write_behind_buffer.settle(design_id)
+        
+        with transaction.atomic():
+            design = Design.objects.select_for_update().get(id=design_id)
+            current = {obj.id: obj for obj in DesignObject.objects.filter(design=design)}
+            # Object ids are global, so ids now used by another design are replaced
+            foreign = set(DesignObject.objects.filter(
+                id__in=[object_id for object_id, _ in rows if object_id and object_id not in current]
+            ).values_list('id', flat=True))
+            
+            now = timezone.now()
+            created: List[DesignObject] = []
+            changed: Dict[uuid.UUID, List[str]] = {}
+            kept = set()
+            for object_id, fields in rows:
+                obj = current.get(object_id)
+                if obj is None or object_id in kept:
+                    if object_id is None or object_id in foreign or object_id in kept:
+                        object_id = uuid.uuid4()
+                    created.append(DesignObject(id=object_id, design=design, **fields))
+                    kept.add(object_id)
+                    continue
+                kept.add(object_id)
+                names = [name for name, value in fields.items() if getattr(obj, name) != value]
+                if names:
+                    for name in names:
+                        setattr(obj, name, fields[name])
+                    obj.updated_at = now
+                    changed[obj.id] = names
+            deleted = [object_id for object_id in current if object_id not in kept]
+            
+            if created:
+                DesignObject.objects.bulk_create(created, batch_size=500)
+            groups: Dict[frozenset, List[DesignObject]] = {}
+            for object_id, names in changed.items():
+                groups.setdefault(frozenset(names) | {'updated_at'}, []).append(current[object_id])
+            for fields, group in groups.items():
+                DesignObject.objects.bulk_update(group, sorted(fields), batch_size=500)
+            if deleted:
+                DesignObject.objects.filter(id__in=deleted).delete()
+            
+            restored = [obj for object_id, obj in current.items() if object_id in kept] + created
+            restored.sort(key=lambda obj: obj.z_index)
+            data = {str(obj.id): dict(DesignObjectSerializer(obj).data) for obj in restored}
+            
+            design.revision += 1
+            design.last_edited_by = user_id
+            design.save(update_fields=['revision', 'last_edited_by', 'updated_at'])
+            logged = DesignOperation.objects.create(
+                design=design,
+                seq=design.revision,
+                op='restore',
+                user_id=user_id,
+                payload={
+                    **version,
+                    'created': [data[str(obj.id)] for obj in created],
+                    'updated': {
+                        str(object_id): {
+                            name: data[str(object_id)][name] for name in names + ['updated_at']
+                        }
+                        for object_id, names in changed.items()
+                    },
+                    'deleted': [str(object_id) for object_id in deleted],
+                }
+            )
+            change_log.record(
+                design.id, 'version_restored', user_id=user_id,
+                description=f"Version {version.get('versionNumber')}"
+            )
+        return logged.to_message(), list(data.values())
+    
+    def log_applied(
+        self,
+        design_id: Any,
+        user_id: Optional[str],
+        op: str,
+        changes: List[Tuple[Optional[uuid.UUID], Dict[str, Any]]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Log writes made outside apply(), such as REST edits, as applied
+        operations, one per (object id, payload). They take the design's
+        next revisions, so a buffered edit flushed or replayed later does
+        not overwrite them. Their object:op messages are sent to the
+        design's room once the transaction commits, and returned.
+        """
+        if not changes:
+            return []
+        with transaction.atomic():
+            design = Design.objects.select_for_update().get(id=design_id)
+            first = design.revision + 1
+            design.revision += len(changes)
+            design.last_edited_by = user_id or design.last_edited_by
+            design.save(update_fields=['revision', 'last_edited_by', 'updated_at'])
+            logged = DesignOperation.objects.bulk_create([
+                DesignOperation(
+                    design=design,
+                    seq=seq,
+                    op=op,
+                    object_id=object_id,
+                    user_id=user_id or 'default-user',
+                    payload=payload
+                )
+                for seq, (object_id, payload) in enumerate(changes, first)
+            ])
+            messages = [operation.to_message() for operation in logged]
+            for message in messages:
+                self.buffer_for_replay(design.id, message)
+            self.broadcast(design.id, messages)
+        return messages
+    
+    def buffer_for_replay(self, design_id: Any, message: Dict[str, Any]) -> None:
+        """Keep a message for reconnecting clients once the transaction commits"""
+        transaction.on_commit(lambda: get_replay_buffer().append(design_id, message))
+    
+    def broadcast(self, design_id: Any, messages: List[Dict[str, Any]]) -> None:
+        """Send messages, in order, to the design's room once the transaction commits"""
+        def send():
+            for message in messages:
+                design_outbox.enqueue(f'design_{design_id}', message)
+        
+        transaction.on_commit(send)
+    
+    def get_object(self, design: Design, object_id: Any) -> DesignObject:
+        object_id = parse_uuid(object_id, 'objectId')
+        try:
+            return DesignObject.objects.get(id=object_id, design=design)
+        except DesignObject.DoesNotExist as e:
+            raise OperationError(f'Object not found: {object_id}') from e
+    
+    def since(self, design_id: str, after: int = 0, limit: Optional[int] = None) -> Dict[str, Any]:
+        """Logged operations with seq > after, oldest first"""
+        limit = min(limit or self.MAX_SINCE, self.MAX_SINCE)
+        revision = Design.objects.values_list('revision', flat=True).get(id=design_id)
+        operations: List[Dict[str, Any]] = [
+            operation.to_message()
+            for operation in DesignOperation.objects.filter(
+                design_id=design_id, seq__gt=after
+            ).order_by('seq')[:limit]
+        ]
+        return {
+            'revision': revision,
+            'operations': operations,
+            'hasMore': bool(operations) and operations[-1]['seq'] < revision,
+        }
+    
+    def missed(self, design_id: str, after: int) -> Tuple[int, Optional[List[Dict[str, Any]]]]:
+        """
+        The design's revision and the buffered messages after seq `after`,
+        or None instead of the messages if the replay buffer lacks some
+        """
+        revision = Design.objects.values_list('revision', flat=True).get(id=design_id)
+        return revision, get_replay_buffer().since(design_id, after, revision)
+
+
+operation_service = OperationService()
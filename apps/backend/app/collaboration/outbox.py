@@ -0,0 +1,117 @@
+"""
+Broadcast Outbox - Deliver model change events to rooms off the request thread
+"""
+import asyncio
+import atexit
+import logging
+import os
+import threading
+from typing import Any, Dict, List, Optional
+from asgiref.sync import SyncToAsync
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+def broadcast_tick() -> float:
+    config = getattr(settings, 'COLLABORATION', {}) or {}
+    return float(config.get('BROADCAST_TICK', 0.05))
+
+
+class BroadcastOutbox:
+    """
+    Queue of client frames per room group, sent from the server's event loop.
+    
+    Producers (signal handlers, usually from transaction.on_commit) only
+    append to the queue. Everything queued for a group within one tick is
+    sent as a single group message of type message_type, whose 'events'
+    holds the frames in order.
+    
+    Sends run on the ASGI event loop the producer was called from, where
+    the room consumers wait on the channel layer; the in-memory layer only
+    wakes receivers on their own loop. Without one (WSGI, workers, shell)
+    the batch is sent from a timer thread. Frames still queued at exit are
+    sent then.
+    """
+    
+    def __init__(self, message_type: str, channel_layer=None):
+        self.message_type = message_type
+        self.channel_layer = channel_layer
+        self.lock = threading.Lock()
+        self.pending: Dict[str, List[Dict[str, Any]]] = {}
+        self.scheduled = False
+    
+    def get_channel_layer(self):
+        if self.channel_layer is None:
+            from channels.layers import get_channel_layer
+            self.channel_layer = get_channel_layer()
+        return self.channel_layer
+    
+    def enqueue(self, group: str, frame: Dict[str, Any]) -> None:
+        """Queue a frame for a group; safe to call from any thread"""
+        with self.lock:
+            self.pending.setdefault(group, []).append(frame)
+            if self.scheduled:
+                return
+            self.scheduled = True
+        loop = self.server_loop()
+        if loop is not None:
+            asyncio.run_coroutine_threadsafe(self.flush_after_tick(), loop)
+        else:
+            timer = threading.Timer(broadcast_tick(), self.flush_sync)
+            timer.daemon = True
+            timer.start()
+    
+    @staticmethod
+    def server_loop() -> Optional[asyncio.AbstractEventLoop]:
+        """The event loop running this code, or the one its sync_to_async thread came from"""
+        try:
+            return asyncio.get_running_loop()
+        except RuntimeError:
+            pass
+        if getattr(SyncToAsync.threadlocal, 'main_event_loop_pid', None) != os.getpid():
+            return None
+        loop = getattr(SyncToAsync.threadlocal, 'main_event_loop', None)
+        if loop is None or loop.is_closed() or not loop.is_running():
+            return None
+        return loop
+    
+    async def flush_after_tick(self) -> None:
+        await asyncio.sleep(broadcast_tick())
+        await self.flush()
+    
+    def flush_sync(self) -> None:
+        """flush() from a thread without an event loop"""
+        if self.pending:
+            asyncio.run(self.flush())
+    
+    async def flush(self) -> None:
+        """Send everything queued, one message per group"""
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            self.scheduled = False
+        if not pending:
+            return
+        channel_layer = self.get_channel_layer()
+        if channel_layer is None:
+            return
+        for group, frames in pending.items():
+            try:
+                await channel_layer.group_send(group, {
+                    'type': self.message_type,
+                    'events': frames
+                })
+            except Exception:
+                logger.exception('Broadcast to %s failed', group)
+    
+    def flush_at_exit(self) -> None:
+        try:
+            self.flush_sync()
+        except Exception:
+            logger.exception('Broadcast flush at exit failed')
+
+
+comment_outbox = BroadcastOutbox('comment_batch')
+design_outbox = BroadcastOutbox('design_events')
+atexit.register(comment_outbox.flush_at_exit)
+atexit.register(design_outbox.flush_at_exit)
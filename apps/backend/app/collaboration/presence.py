@@ -0,0 +1,205 @@
+"""
+Presence Registry - Track who is connected to each design room
+"""
+import abc
+import json
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from django.conf import settings
+
+
+PresenceEntry = Dict[str, Any]
+
+
+class PresenceRegistry(abc.ABC):
+    """
+    Connections per room group, keyed by channel name.
+    
+    Every connection refreshes its entry with heartbeats; entries not seen
+    for ttl seconds are expired lazily when someone takes a snapshot, so
+    joining costs one snapshot and nobody has to re-announce themselves.
+    """
+    
+    def __init__(self, ttl: float = 60):
+        self.ttl = ttl
+    
+    @abc.abstractmethod
+    async def join(self, room: str, socket_id: str, user_id: str) -> PresenceEntry:
+        """Register a connection; joining again refreshes it"""
+    
+    @abc.abstractmethod
+    async def heartbeat(self, room: str, socket_id: str) -> bool:
+        """Refresh a connection; False if it is unknown or already expired"""
+    
+    @abc.abstractmethod
+    async def leave(self, room: str, socket_id: str) -> Optional[PresenceEntry]:
+        """Remove a connection, returning its entry if it was present"""
+    
+    @abc.abstractmethod
+    async def snapshot(self, room: str) -> Tuple[List[PresenceEntry], List[PresenceEntry]]:
+        """(present entries ordered by join time, entries expired by this call)"""
+    
+    def entry(self, socket_id: str, user_id: str, now: float) -> PresenceEntry:
+        return {'userId': user_id, 'socketId': socket_id, 'joinedAt': now, 'lastSeen': now}
+
+
+class InMemoryPresenceRegistry(PresenceRegistry):
+    """Process-local registry; only correct with a single ASGI worker"""
+    
+    def __init__(self, ttl: float = 60):
+        super().__init__(ttl)
+        self.rooms: Dict[str, Dict[str, PresenceEntry]] = {}
+    
+    async def join(self, room: str, socket_id: str, user_id: str) -> PresenceEntry:
+        now = time.time()
+        members = self.rooms.setdefault(room, {})
+        entry = members.get(socket_id)
+        if entry is None or entry['userId'] != user_id:
+            entry = self.entry(socket_id, user_id, now)
+            members[socket_id] = entry
+        entry['lastSeen'] = now
+        return dict(entry)
+    
+    async def heartbeat(self, room: str, socket_id: str) -> bool:
+        entry = self.rooms.get(room, {}).get(socket_id)
+        now = time.time()
+        if entry is None or entry['lastSeen'] < now - self.ttl:
+            return False
+        entry['lastSeen'] = now
+        return True
+    
+    async def leave(self, room: str, socket_id: str) -> Optional[PresenceEntry]:
+        members = self.rooms.get(room)
+        if not members:
+            return None
+        entry = members.pop(socket_id, None)
+        if not members:
+            del self.rooms[room]
+        return entry
+    
+    async def snapshot(self, room: str) -> Tuple[List[PresenceEntry], List[PresenceEntry]]:
+        members = self.rooms.get(room, {})
+        cutoff = time.time() - self.ttl
+        expired = [entry for entry in members.values() if entry['lastSeen'] < cutoff]
+        for entry in expired:
+            del members[entry['socketId']]
+        if room in self.rooms and not members:
+            del self.rooms[room]
+        present = sorted((dict(entry) for entry in members.values()), key=lambda e: e['joinedAt'])
+        return present, expired
+
+
+class RedisPresenceRegistry(PresenceRegistry):
+    """
+    Registry shared by every worker.
+    
+    Each room is a hash of entries plus a sorted set of last-seen times, so
+    heartbeats are a single ZADD and expiry is a range query on the set.
+    Both keys expire on their own once a room stops heartbeating.
+    """
+    
+    KEY_PREFIX = 'presence:'
+    
+    def __init__(self, url: str, ttl: float = 60):
+        super().__init__(ttl)
+        import redis.asyncio as redis
+        self.redis = redis.from_url(url, decode_responses=True)
+    
+    def keys(self, room: str) -> Tuple[str, str]:
+        return f'{self.KEY_PREFIX}{room}', f'{self.KEY_PREFIX}{room}:seen'
+    
+    async def join(self, room: str, socket_id: str, user_id: str) -> PresenceEntry:
+        entries_key, seen_key = self.keys(room)
+        now = time.time()
+        existing = await self.redis.hget(entries_key, socket_id)
+        entry = json.loads(existing) if existing else None
+        if entry is None or entry['userId'] != user_id:
+            entry = self.entry(socket_id, user_id, now)
+        entry['lastSeen'] = now
+        key_ttl = int(self.ttl * 2) + 1
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(entries_key, socket_id, json.dumps(entry))
+            pipe.zadd(seen_key, {socket_id: now})
+            pipe.expire(entries_key, key_ttl)
+            pipe.expire(seen_key, key_ttl)
+            await pipe.execute()
+        return entry
+    
+    async def heartbeat(self, room: str, socket_id: str) -> bool:
+        entries_key, seen_key = self.keys(room)
+        now = time.time()
+        last_seen = await self.redis.zscore(seen_key, socket_id)
+        if last_seen is None or last_seen < now - self.ttl:
+            return False
+        key_ttl = int(self.ttl * 2) + 1
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.zadd(seen_key, {socket_id: now}, xx=True)
+            pipe.expire(entries_key, key_ttl)
+            pipe.expire(seen_key, key_ttl)
+            await pipe.execute()
+        return True
+    
+    async def leave(self, room: str, socket_id: str) -> Optional[PresenceEntry]:
+        entries_key, seen_key = self.keys(room)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hget(entries_key, socket_id)
+            pipe.hdel(entries_key, socket_id)
+            pipe.zrem(seen_key, socket_id)
+            existing, _, _ = await pipe.execute()
+        return json.loads(existing) if existing else None
+    
+    async def snapshot(self, room: str) -> Tuple[List[PresenceEntry], List[PresenceEntry]]:
+        entries_key, seen_key = self.keys(room)
+        cutoff = time.time() - self.ttl
+        
+        expired = []
+        stale = await self.redis.zrangebyscore(seen_key, '-inf', f'({cutoff}')
+        if stale:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.hmget(entries_key, stale)
+                pipe.hdel(entries_key, *stale)
+                pipe.zrem(seen_key, *stale)
+                values, _, _ = await pipe.execute()
+            expired = [json.loads(value) for value in values if value]
+        
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.hgetall(entries_key)
+            pipe.zrange(seen_key, 0, -1, withscores=True)
+            raw, seen = await pipe.execute()
+        last_seen = dict(seen)
+        present = []
+        for socket_id, value in raw.items():
+            entry = json.loads(value)
+            entry['lastSeen'] = last_seen.get(socket_id, entry['lastSeen'])
+            present.append(entry)
+        present.sort(key=lambda e: e['joinedAt'])
+        return present, expired
+
+
+def create_presence_registry() -> PresenceRegistry:
+    """Registry configured by COLLABORATION['PRESENCE_BACKEND'] ('memory' or 'redis')"""
+    config = getattr(settings, 'COLLABORATION', {}) or {}
+    ttl = float(config.get('PRESENCE_TTL', 60))
+    backend = config.get('PRESENCE_BACKEND', 'memory')
+    if backend == 'redis':
+        return RedisPresenceRegistry(config['PRESENCE_REDIS_URL'], ttl)
+    if backend == 'memory':
+        return InMemoryPresenceRegistry(ttl)
+    raise ValueError(f'Unknown presence backend: {backend}')
+
+
+_registry: Optional[PresenceRegistry] = None
+
+
+def get_presence_registry() -> PresenceRegistry:
+    """Process-wide registry, created on first use"""
+    global _registry
+    if _registry is None:
+        _registry = create_presence_registry()
+    return _registry
+
+
+def reset_presence_registry() -> None:
+    """Forget the process-wide registry so settings changes take effect"""
+    global _registry
+    _registry = None
@@ -0,0 +1,94 @@
+"""
+Collaboration Protocol - Wire encodings for design room WebSockets
+"""
+import json
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - msgpack ships with channels-redis
+    msgpack = None
+
+
+class ProtocolError(ValueError):
+    """A frame could not be decoded"""
+
+
+class JsonCodec:
+    """Text frames carrying JSON; used when the client asks for nothing else"""
+    
+    subprotocol: Optional[str] = None
+    
+    def encode(self, message: Dict[str, Any]) -> Tuple[Optional[str], Optional[bytes]]:
+        """(text_data, bytes_data) for consumer.send"""
+        return json.dumps(message, separators=(',', ':')), None
+    
+    def decode(self, text_data: Optional[str], bytes_data: Optional[bytes]) -> Any:
+        if text_data is None:
+            raise ProtocolError('Binary frames require the msgpack subprotocol')
+        try:
+            return json.loads(text_data)
+        except json.JSONDecodeError as e:
+            raise ProtocolError('Invalid JSON') from e
+
+
+class MsgpackCodec(JsonCodec):
+    """
+    Binary frames carrying MessagePack.
+    
+    Messages keep the JSON shape, so clients only swap their decoder, except
+    cursor:batch: its cursors are sent as [userId, x, y] rows with 32-bit
+    floats, roughly halving the most frequent frame. Text frames are still
+    accepted as JSON, which lets a client send debugging messages by hand.
+    """
+    
+    subprotocol = 'design.msgpack.v1'
+    
+    def __init__(self):
+        self.packer = msgpack.Packer(use_bin_type=True, default=str)
+        self.cursor_packer = msgpack.Packer(use_bin_type=True, use_single_float=True, default=str)
+    
+    def encode(self, message: Dict[str, Any]) -> Tuple[Optional[str], Optional[bytes]]:
+        if message.get('type') == 'cursor:batch':
+            return None, self.cursor_packer.pack({
+                'type': 'cursor:batch',
+                'cursors': [
+                    [cursor['userId'], cursor['x'], cursor['y']]
+                    for cursor in message['cursors']
+                ]
+            })
+        return None, self.packer.pack(message)
+    
+    def decode(self, text_data: Optional[str], bytes_data: Optional[bytes]) -> Any:
+        if bytes_data is None:
+            return super().decode(text_data, bytes_data)
+        try:
+            return msgpack.unpackb(bytes_data, raw=False)
+        except (ValueError, msgpack.UnpackException) as e:
+            raise ProtocolError('Invalid MessagePack') from e
+
+
+JSON_SUBPROTOCOL = 'design.json.v1'
+
+json_codec = JsonCodec()
+
+
+def available_codecs() -> Dict[str, JsonCodec]:
+    """Codecs by subprotocol name, most preferred first"""
+    codecs: Dict[str, JsonCodec] = {}
+    if msgpack is not None:
+        codecs[MsgpackCodec.subprotocol] = MsgpackCodec()
+    codecs[JSON_SUBPROTOCOL] = json_codec
+    return codecs
+
+
+def negotiate(requested: Iterable[str]) -> Tuple[JsonCodec, Optional[str]]:
+    """
+    Pick the codec for a connection from the client's offered subprotocols.
+    Returns (codec, subprotocol to accept); unknown or missing offers get JSON.
+    """
+    requested = list(requested or [])
+    for name, codec in available_codecs().items():
+        if name in requested:
+            return codec, name
+    return json_codec, None
@@ -0,0 +1,181 @@
+"""
+Replay Buffer - Recent room events kept for reconnecting clients
+"""
+import abc
+import json
+import logging
+import threading
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+logger = logging.getLogger(__name__)
+
+ReplayEvent = Dict[str, Any]
+
+
+def replay_config() -> Dict[str, Any]:
+    config = getattr(settings, 'COLLABORATION', {}) or {}
+    return {
+        'backend': config.get('REPLAY_BACKEND', 'memory'),
+        'size': int(config.get('REPLAY_BUFFER_SIZE', 256)),
+        'redis_url': config.get('REPLAY_REDIS_URL') or config.get('PRESENCE_REDIS_URL'),
+    }
+
+
+class ReplayBuffer(abc.ABC):
+    """
+    The last few events with a sequence number sent to each design's room.
+    
+    Every object:op and design:restored frame carries the design revision
+    it produced as its seq, and revisions have no gaps, so a client that
+    saw up to lastSeq can be brought up to date with the buffered events
+    after it, as long as the buffer still holds all of them. Events are
+    stored by actual design id, once the operation has committed.
+    """
+    
+    def __init__(self, size: int = 256):
+        self.size = size
+    
+    def append(self, design_id: Any, event: ReplayEvent) -> None:
+        """Remember an event; failures are logged, never raised"""
+        try:
+            self.store(str(design_id), int(event['seq']), event)
+        except Exception:
+            logger.exception('Could not buffer event %s for design %s', event.get('seq'), design_id)
+    
+    def since(self, design_id: Any, after: int, head: int) -> Optional[List[ReplayEvent]]:
+        """
+        Events with after < seq <= head in order, or None if any of them
+        is no longer (or not yet) buffered.
+        """
+        if after == head:
+            return []
+        if after > head:
+            return None
+        try:
+            events = self.load(str(design_id), after)
+        except Exception:
+            logger.exception('Could not read buffered events for design %s', design_id)
+            return None
+        
+        by_seq = {seq: event for seq, event in events if after < seq <= head}
+        if len(by_seq) != head - after:
+            return None
+        return [by_seq[seq] for seq in range(after + 1, head + 1)]
+    
+    @abc.abstractmethod
+    def store(self, design_id: str, seq: int, event: ReplayEvent) -> None:
+        """Buffer an event, keeping the design's last size"""
+    
+    @abc.abstractmethod
+    def load(self, design_id: str, after: int) -> List[Tuple[int, ReplayEvent]]:
+        """Buffered (seq, event) pairs with seq > after, in any order"""
+    
+    @abc.abstractmethod
+    def clear(self) -> None:
+        """Forget every buffered event"""
+
+
+class InMemoryReplayBuffer(ReplayBuffer):
+    """Process-local buffer; only sees every event with a single ASGI worker"""
+    
+    # Rooms kept, least recently written dropped first
+    MAX_ROOMS = 1024
+    
+    def __init__(self, size: int = 256):
+        super().__init__(size)
+        self.lock = threading.Lock()
+        self.rooms: 'OrderedDict[str, Deque[Tuple[int, ReplayEvent]]]' = OrderedDict()
+    
+    def store(self, design_id: str, seq: int, event: ReplayEvent) -> None:
+        with self.lock:
+            events = self.rooms.get(design_id)
+            if events is None:
+                events = self.rooms[design_id] = deque(maxlen=self.size)
+            self.rooms.move_to_end(design_id)
+            events.append((seq, event))
+            while len(self.rooms) > self.MAX_ROOMS:
+                self.rooms.popitem(last=False)
+    
+    def load(self, design_id: str, after: int) -> List[Tuple[int, ReplayEvent]]:
+        with self.lock:
+            return [(seq, event) for seq, event in self.rooms.get(design_id, ()) if seq > after]
+    
+    def clear(self) -> None:
+        with self.lock:
+            self.rooms.clear()
+
+
+class RedisReplayBuffer(ReplayBuffer):
+    """
+    Buffer shared by every worker, one capped Redis stream per design.
+    
+    Workers may append slightly out of seq order, so entries carry their
+    seq and are ordered on read. Streams of idle designs expire after
+    KEY_TTL seconds.
+    """
+    
+    KEY_PREFIX = 'replay:'
+    KEY_TTL = 3600
+    
+    def __init__(self, url: str, size: int = 256):
+        super().__init__(size)
+        import redis
+        self.redis = redis.from_url(url)
+    
+    def key(self, design_id: str) -> str:
+        return f'{self.KEY_PREFIX}{design_id}'
+    
+    def store(self, design_id: str, seq: int, event: ReplayEvent) -> None:
+        key = self.key(design_id)
+        with self.redis.pipeline(transaction=False) as pipe:
+            pipe.xadd(
+                key,
+                {'seq': seq, 'event': json.dumps(event, cls=DjangoJSONEncoder)},
+                maxlen=self.size,
+                approximate=True
+            )
+            pipe.expire(key, self.KEY_TTL)
+            pipe.execute()
+    
+    def load(self, design_id: str, after: int) -> List[Tuple[int, ReplayEvent]]:
+        events = []
+        for _, fields in self.redis.xrange(self.key(design_id), count=self.size):
+            seq = int(fields[b'seq'])
+            if seq > after:
+                events.append((seq, json.loads(fields[b'event'])))
+        return events
+    
+    def clear(self) -> None:
+        keys = list(self.redis.scan_iter(match=f'{self.KEY_PREFIX}*'))
+        if keys:
+            self.redis.delete(*keys)
+
+
+def create_replay_buffer() -> ReplayBuffer:
+    """Buffer configured by COLLABORATION['REPLAY_BACKEND'] ('memory' or 'redis')"""
+    config = replay_config()
+    if config['backend'] == 'redis':
+        return RedisReplayBuffer(config['redis_url'], config['size'])
+    if config['backend'] == 'memory':
+        return InMemoryReplayBuffer(config['size'])
+    raise ValueError(f"Unknown replay backend: {config['backend']}")
+
+
+_buffer: Optional[ReplayBuffer] = None
+
+
+def get_replay_buffer() -> ReplayBuffer:
+    """Process-wide buffer, created on first use"""
+    global _buffer
+    if _buffer is None:
+        _buffer = create_replay_buffer()
+    return _buffer
+
+
+def reset_replay_buffer() -> None:
+    """Forget the process-wide buffer so settings changes take effect"""
+    global _buffer
+    _buffer = None
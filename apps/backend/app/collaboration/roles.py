@@ -0,0 +1,121 @@
+"""
+Role Service - Resolve and cache users' roles on designs
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional, Tuple
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.db.models import OuterRef, Subquery
+from app.designs.models import Design
+from app.collaboration.models import DesignCollaborator
+
+
+ROLE_LEVELS = {'owner': 3, 'editor': 2, 'viewer': 1}
+
+_MISSING = object()
+
+
+class DesignAccess(NamedTuple):
+    """A user's standing on one design"""
+    is_owner: bool
+    # The collaborator role, if the user was added as a collaborator
+    collaborator_role: Optional[str]
+    
+    @property
+    def role(self) -> Optional[str]:
+        """The collaborator role, else 'owner' for the design's owner"""
+        if self.collaborator_role is not None:
+            return self.collaborator_role
+        return 'owner' if self.is_owner else None
+    
+    def has_role(self, required_role: str) -> bool:
+        return ROLE_LEVELS.get(self.role, 0) >= ROLE_LEVELS.get(required_role, 1)
+
+
+def role_cache_config() -> Tuple[int, float]:
+    config = getattr(settings, 'COLLABORATION', {}) or {}
+    return int(config.get('ROLE_CACHE_SIZE', 4096)), float(config.get('ROLE_CACHE_TTL', 30))
+
+
+def authorize_operations() -> bool:
+    config = getattr(settings, 'COLLABORATION', {}) or {}
+    return bool(config.get('AUTHORIZE_OPERATIONS', False))
+
+
+class RoleService:
+    """
+    Look up a user's access to a design in one query and cache it.
+    
+    Entries live for ROLE_CACHE_TTL seconds; CollaboratorViewSet
+    invalidates a design's entries when its collaborators change, so only
+    changes made elsewhere (another process, the admin) wait for the TTL.
+    Designs are identified by their actual UUID.
+    """
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries: 'OrderedDict[Tuple[str, str], Tuple[Optional[DesignAccess], float]]' = OrderedDict()
+    
+    def get_access(self, design_id: str, user_id: str) -> Optional[DesignAccess]:
+        """The user's access to the design, or None if the design does not exist"""
+        access = self.get_cached(design_id, user_id)
+        if access is not _MISSING:
+            return access
+        role = DesignCollaborator.objects.filter(
+            design_id=OuterRef('id'), user_id=user_id
+        ).values('role')[:1]
+        row = Design.objects.filter(id=design_id).values_list('user_id', Subquery(role)).first()
+        access = DesignAccess(row[0] == user_id, row[1]) if row else None
+        self.store(design_id, user_id, access)
+        return access
+    
+    async def aget_access(self, design_id: str, user_id: str) -> Optional[DesignAccess]:
+        """get_access for async code; cache hits do not leave the event loop"""
+        access = self.get_cached(design_id, user_id)
+        if access is not _MISSING:
+            return access
+        return await database_sync_to_async(self.get_access)(design_id, user_id)
+    
+    def get_cached(self, design_id: str, user_id: str) -> object:
+        """The cached access without querying, or _MISSING; safe in async code"""
+        key = (str(design_id), str(user_id))
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return _MISSING
+            if entry[1] < time.monotonic():
+                del self.entries[key]
+                return _MISSING
+            self.entries.move_to_end(key)
+            return entry[0]
+    
+    def store(self, design_id: str, user_id: str, access: Optional[DesignAccess]) -> None:
+        max_size, ttl = role_cache_config()
+        with self.lock:
+            self.entries[(str(design_id), str(user_id))] = (access, time.monotonic() + ttl)
+            self.entries.move_to_end((str(design_id), str(user_id)))
+            while len(self.entries) > max_size:
+                self.entries.popitem(last=False)
+    
+    def has_role(self, design_id: str, user_id: str, required_role: str) -> bool:
+        access = self.get_access(design_id, user_id)
+        return access is not None and access.has_role(required_role)
+    
+    def invalidate(self, design_id: str, user_id: Optional[str] = None) -> None:
+        """Forget one user's entry on a design, or all of the design's entries"""
+        design_id = str(design_id)
+        with self.lock:
+            if user_id is not None:
+                self.entries.pop((design_id, str(user_id)), None)
+                return
+            for key in [key for key in self.entries if key[0] == design_id]:
+                del self.entries[key]
+    
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+
+
+role_service = RoleService()
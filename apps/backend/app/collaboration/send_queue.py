@@ -0,0 +1,182 @@
+"""
+Send Queue - Prioritized outgoing frames per WebSocket connection
+"""
+import asyncio
+import logging
+import threading
+import weakref
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Set, Tuple, Union
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Lower numbers are sent first
+PRIORITY_CRITICAL = 0   # operations, restores, comments, replies to the client
+PRIORITY_PRESENCE = 1   # joins and leaves
+PRIORITY_DROPPABLE = 2  # cursors and live transforms; superseded by the next one
+
+PRESENCE_TYPES = {'presence:snapshot', 'user:joined', 'user:left'}
+DROPPABLE_TYPES = {'cursor:batch', 'cursor:move', 'object:transform'}
+
+Frame = Dict[str, Any]
+# A frame, or a function building it when it is about to be written (None skips it)
+QueuedFrame = Union[Frame, Callable[[], Optional[Frame]]]
+
+
+def send_queue_max() -> int:
+    config = getattr(settings, 'COLLABORATION', {}) or {}
+    return int(config.get('SEND_QUEUE_MAX', 256))
+
+
+def priority_of(message_type: Optional[str]) -> int:
+    if message_type in DROPPABLE_TYPES:
+        return PRIORITY_DROPPABLE
+    if message_type in PRESENCE_TYPES:
+        return PRIORITY_PRESENCE
+    return PRIORITY_CRITICAL
+
+
+class SendQueueStats:
+    """Depth and shedding counters of every send queue in this process"""
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.queues: 'weakref.WeakSet[SendQueue]' = weakref.WeakSet()
+        self.dropped = 0
+        self.lagging = 0
+        self.max_depth = 0
+    
+    def register(self, queue: 'SendQueue') -> None:
+        with self.lock:
+            self.queues.add(queue)
+    
+    def observe(self, depth: int) -> None:
+        if depth > self.max_depth:
+            self.max_depth = depth
+    
+    def snapshot(self) -> Dict[str, int]:
+        with self.lock:
+            depths = [queue.depth for queue in list(self.queues) if not queue.closed]
+            return {
+                'connections': len(depths),
+                'depth': sum(depths),
+                'deepest': max(depths, default=0),
+                'maxDepth': self.max_depth,
+                'dropped': self.dropped,
+                'lagging': self.lagging,
+            }
+
+
+class SendQueue:
+    """
+    Frames waiting to be written to one connection, highest priority first.
+    
+    Group handlers only queue frames, so a client that reads slowly never
+    holds up the channel layer. A background task writes critical frames
+    before presence and presence before droppable ones, each in the order
+    they were queued. An operation on an object drops the live transforms
+    of it still waiting, which would otherwise be written after it and undo
+    it on screen. Once more than max_depth frames are waiting the oldest
+    droppable ones are shed; if the client is still too far behind the
+    queue is cleared and on_lagging is called to close the connection. A
+    failed write (the socket is gone) closes the queue.
+    """
+    
+    def __init__(
+        self,
+        write: Callable[[Frame], Awaitable[None]],
+        on_lagging: Callable[[], Awaitable[None]],
+        max_depth: Optional[int] = None
+    ):
+        self.write = write
+        self.on_lagging = on_lagging
+        self.max_depth = max_depth if max_depth is not None else send_queue_max()
+        self.queues: Tuple[Deque[Tuple[QueuedFrame, Optional[str]]], ...] = (deque(), deque(), deque())
+        # Keys of queued frames; a keyed frame is queued at most once
+        self.keys: Set[str] = set()
+        self.task: Optional[asyncio.Task] = None
+        self.closed = False
+        send_queue_stats.register(self)
+    
+    @property
+    def depth(self) -> int:
+        return sum(len(queue) for queue in self.queues)
+    
+    def put(self, frame: QueuedFrame, priority: int = PRIORITY_CRITICAL, key: Optional[str] = None) -> None:
+        """Queue a frame; with a key, nothing is queued if one with that key is waiting"""
+        if self.closed or (key is not None and key in self.keys):
+            return
+        if key is not None:
+            self.keys.add(key)
+        if priority < PRIORITY_DROPPABLE and isinstance(frame, dict) and frame.get('objectId'):
+            self.drop_transforms(frame['objectId'])
+        self.queues[priority].append((frame, key))
+        depth = self.depth
+        send_queue_stats.observe(depth)
+        if depth > self.max_depth:
+            self.shed()
+            if self.closed:
+                return
+        if self.task is None or self.task.done():
+            self.task = asyncio.ensure_future(self.run())
+    
+    def drop_transforms(self, object_id: str) -> None:
+        droppable = self.queues[PRIORITY_DROPPABLE]
+        stale = [
+            item for item in droppable
+            if isinstance(item[0], dict)
+            and item[0].get('type') == 'object:transform'
+            and item[0].get('objectId') == object_id
+        ]
+        for item in stale:
+            droppable.remove(item)
+            self.keys.discard(item[1])
+    
+    def shed(self) -> None:
+        droppable = self.queues[PRIORITY_DROPPABLE]
+        while droppable and self.depth > self.max_depth:
+            _, key = droppable.popleft()
+            self.keys.discard(key)
+            send_queue_stats.dropped += 1
+        if self.depth > self.max_depth:
+            send_queue_stats.lagging += 1
+            self.close()
+            asyncio.ensure_future(self.on_lagging())
+    
+    def pop(self) -> Optional[Tuple[QueuedFrame, Optional[str]]]:
+        for queue in self.queues:
+            if queue:
+                return queue.popleft()
+        return None
+    
+    async def run(self) -> None:
+        """Write queued frames until none are left"""
+        while not self.closed:
+            item = self.pop()
+            if item is None:
+                return
+            frame, key = item
+            self.keys.discard(key)
+            if callable(frame):
+                frame = frame()
+                if frame is None:
+                    continue
+            try:
+                await self.write(frame)
+            except Exception:
+                logger.debug('Send queue write failed; closing', exc_info=True)
+                self.close()
+                return
+    
+    def close(self) -> None:
+        """Drop everything queued and stop writing"""
+        self.closed = True
+        for queue in self.queues:
+            queue.clear()
+        self.keys.clear()
+        if self.task is not None and self.task is not asyncio.current_task():
+            self.task.cancel()
+
+
+send_queue_stats = SendQueueStats()
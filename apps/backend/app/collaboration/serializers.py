@@ -22,8 +22,9 @@ class CollaboratorCreateSerializer(serializers.Serializer):
 
 
 class CommentSerializer(serializers.ModelSerializer):
-    design_id = serializers.UUIDField(source='design.id', read_only=True)
-    parent_id = serializers.UUIDField(source='parent.id', read_only=True, allow_null=True)
+    # Read the foreign key columns, not the related rows
+    design_id = serializers.UUIDField(read_only=True)
+    parent_id = serializers.UUIDField(read_only=True, allow_null=True)
     
     class Meta:
         model = DesignComment
@@ -55,6 +56,19 @@ class VersionSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'version_number', 'created_at']
 
 
+class VersionSummarySerializer(serializers.ModelSerializer):
+    """Version metadata without the snapshot, which is rebuilt on demand"""
+    design_id = serializers.UUIDField(read_only=True)
+    
+    class Meta:
+        model = DesignVersion
+        fields = [
+            'id', 'design_id', 'version_number', 'created_by', 'is_keyframe',
+            'description', 'created_at'
+        ]
+        read_only_fields = fields
+
+
 class VersionCreateSerializer(serializers.Serializer):
     snapshot = serializers.JSONField()
     description = serializers.CharField(required=False, allow_blank=True)
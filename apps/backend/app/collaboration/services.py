@@ -3,10 +3,154 @@ Collaboration Service - Business logic for collaboration features
 Handles design ID resolution and auto-creation
 """
 import re
-from typing import Optional
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+from django.conf import settings
+from django.db.models import OuterRef, Subquery
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from app.designs.models import Design
 
 
+UUID_REGEX = re.compile(r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$', re.IGNORECASE)
+
+_MISSING = object()
+
+
+class DesignIdCache:
+    """
+    Resolved design ids, keyed by the UUID or alias (name) they were asked for.
+    
+    Found designs are kept in a size-bounded process-wide LRU for ttl
+    seconds; inside request_scope() every answer, misses included, is also
+    kept for the rest of the request. Creating, renaming or deleting a
+    design in this process invalidates its entries at once; other
+    processes see the change within ttl.
+    """
+    
+    def __init__(self, max_size: int = 1024, ttl: float = 60.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: 'OrderedDict[str, Tuple[str, float]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._scope: ContextVar[Optional[Dict[str, Optional[str]]]] = ContextVar('design_id_scope', default=None)
+    
+    @classmethod
+    def from_settings(cls) -> 'DesignIdCache':
+        config = getattr(settings, 'COLLABORATION', {}) or {}
+        return cls(
+            max_size=int(config.get('DESIGN_ID_CACHE_SIZE', 1024)),
+            ttl=float(config.get('DESIGN_ID_CACHE_TTL', 60))
+        )
+    
+    @contextmanager
+    def request_scope(self) -> Iterator[None]:
+        token = self._scope.set({})
+        try:
+            yield
+        finally:
+            self._scope.reset(token)
+    
+    def get(self, key: str) -> object:
+        """The cached design id (or None) for key, or _MISSING"""
+        scope = self._scope.get()
+        if scope is not None and key in scope:
+            return scope[key]
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _MISSING
+            if entry[1] < time.monotonic():
+                del self._entries[key]
+                return _MISSING
+            self._entries.move_to_end(key)
+        if scope is not None:
+            scope[key] = entry[0]
+        return entry[0]
+    
+    def set(self, key: str, value: Optional[str]) -> None:
+        scope = self._scope.get()
+        if scope is not None:
+            scope[key] = value
+        if value is None or self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+    
+    def invalidate(self, *keys: str, design_id: Optional[str] = None) -> None:
+        """Forget keys, and with design_id every key that resolved to it"""
+        dropped = set(keys)
+        scope = self._scope.get()
+        with self._lock:
+            if design_id is not None:
+                dropped.update(k for k, (v, _) in self._entries.items() if v == design_id)
+            for key in dropped:
+                self._entries.pop(key, None)
+        if scope is not None:
+            for key in dropped:
+                scope.pop(key, None)
+            if design_id is not None:
+                for key in [k for k, v in scope.items() if v == design_id]:
+                    del scope[key]
+    
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+        scope = self._scope.get()
+        if scope is not None:
+            scope.clear()
+
+
+design_id_cache = DesignIdCache.from_settings()
+
+
+def resolve_design_ids(design_ids: Iterable[str]) -> Dict[str, Optional[str]]:
+    """
+    Resolve many design ids at once; see get_actual_design_id.
+    Uncached UUIDs are looked up in one query and uncached aliases in another.
+    """
+    resolved: Dict[str, Optional[str]] = {}
+    uuids, names = [], []
+    for design_id in design_ids:
+        design_id = str(design_id)
+        if design_id in resolved:
+            continue
+        cached = design_id_cache.get(design_id)
+        if cached is not _MISSING:
+            resolved[design_id] = cached
+        elif UUID_REGEX.match(design_id):
+            uuids.append(design_id)
+            resolved[design_id] = None
+        else:
+            names.append(design_id)
+            resolved[design_id] = None
+    
+    if uuids:
+        found = {str(i) for i in Design.objects.filter(id__in=uuids).values_list('id', flat=True)}
+        for design_id in uuids:
+            actual = design_id.lower() if design_id.lower() in found else None
+            resolved[design_id] = actual
+            design_id_cache.set(design_id, actual)
+    if names:
+        # Several designs may share a name; the newest one wins
+        newest = Design.objects.filter(name=OuterRef('name')).order_by('-created_at').values('id')[:1]
+        found = dict(
+            Design.objects.filter(name__in=names, id=Subquery(newest)).values_list('name', 'id')
+        )
+        for name in names:
+            actual = str(found[name]) if name in found else None
+            resolved[name] = actual
+            design_id_cache.set(name, actual)
+    return resolved
+
+
 def get_actual_design_id(design_id: str) -> Optional[str]:
     """
     Get the actual design UUID from design_id.
@@ -18,22 +162,29 @@ def get_actual_design_id(design_id: str) -> Optional[str]:
     Returns:
         The actual UUID of the design, or None if not found
     """
-    uuid_regex = re.compile(r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$', re.IGNORECASE)
-    
-    if uuid_regex.match(design_id):
-        # It's a UUID, check if design exists
-        try:
-            design = Design.objects.get(id=design_id)
-            return str(design.id)
-        except Design.DoesNotExist:
-            return None
-    else:
-        # Not a UUID, look up by name
-        try:
-            design = Design.objects.filter(name=design_id).order_by('-created_at').first()
-            return str(design.id) if design else None
-        except Design.DoesNotExist:
-            return None
+    cached = design_id_cache.get(str(design_id))
+    if cached is not _MISSING:
+        return cached
+    return resolve_design_ids([design_id])[str(design_id)]
+
+
+@receiver(post_save, sender=Design)
+def design_saved(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Drop cached resolutions a new or renamed design changes.
+    """
+    if created:
+        design_id_cache.invalidate(str(instance.id), instance.name)
+    elif update_fields is None or 'name' in update_fields:
+        design_id_cache.invalidate(instance.name, design_id=str(instance.id))
+
+
+@receiver(post_delete, sender=Design)
+def design_deleted(sender, instance, **kwargs):
+    """
+    Drop cached resolutions of a deleted design.
+    """
+    design_id_cache.invalidate(str(instance.id), instance.name, design_id=str(instance.id))
 
 
 def ensure_design_exists(design_id: str, user_id: str) -> str:
@@ -54,8 +205,7 @@ def ensure_design_exists(design_id: str, user_id: str) -> str:
         return existing_id
     
     # Design doesn't exist, create it
-    uuid_regex = re.compile(r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$', re.IGNORECASE)
-    is_uuid = uuid_regex.match(design_id)
+    is_uuid = UUID_REGEX.match(design_id)
     
     if is_uuid:
         # Valid UUID - create design with this ID
@@ -0,0 +1,18 @@
+"""
+Collaboration Tasks - Background collaboration maintenance
+"""
+from celery import shared_task
+from app.collaboration import write_behind
+from app.collaboration.change_log import change_log_service
+
+
+@shared_task
+def replay_pending_operations(older_than: float = 60.0):
+    """Apply logged object edits that no worker flushed to design_objects"""
+    return write_behind.replay_pending_operations(older_than)
+
+
+@shared_task
+def prune_change_log(older_than_days: int = None):
+    """Delete change log entries older than CHANGE_LOG_RETENTION_DAYS"""
+    return change_log_service.prune(older_than_days)
@@ -1,3 +1,1224 @@
-from django.test import TestCase
+"""
+Tests for real-time collaboration.
+"""
+import asyncio
+import json
+import threading
+import time
+from datetime import timedelta
+import msgpack
+from types import SimpleNamespace
+from asgiref.sync import async_to_sync, sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from channels.layers import InMemoryChannelLayer
+from channels.routing import URLRouter
+from django.db import transaction
+from django.utils import timezone
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from app.designs.models import Design, DesignObject
+from app.designs.tests import DesignTestMixin
+from app.collaboration.change_log import change_log, change_log_service
+from app.collaboration.leases import edit_leases, reset_lease_store
+from app.collaboration.models import (
+    DesignChangeLog, DesignCollaborator, DesignComment, DesignOperation, DesignVersion
+)
+from app.collaboration.outbox import BroadcastOutbox, comment_outbox, design_outbox
+from app.collaboration.operations import OperationError, operation_service
+from app.collaboration.write_behind import replay_pending_operations, write_behind_buffer
+from app.collaboration.permissions import HasDesignPermission, IsDesignEditor, IsDesignOwner
+from app.collaboration.roles import role_service
+from app.collaboration.presence import InMemoryPresenceRegistry, reset_presence_registry
+from app.collaboration.replay import InMemoryReplayBuffer, reset_replay_buffer
+from app.collaboration.send_queue import (
+    PRIORITY_CRITICAL, PRIORITY_DROPPABLE, PRIORITY_PRESENCE, SendQueue, send_queue_stats
+)
+from app.collaboration.routing import websocket_urlpatterns
+from app.collaboration.services import design_id_cache, get_actual_design_id, resolve_design_ids
+from app.collaboration.version_store import json_diff, json_patch, version_store
 
-# Create your tests here.
+
+application = URLRouter(websocket_urlpatterns)
+
+
+class SocketClient(ApplicationCommunicator):
+    """
+    Minimal WebSocket test client; channels.testing needs daphne, which the
+    backend does not depend on.
+    """
+
+    def __init__(self, path, subprotocols=()):
+        super().__init__(application, {
+            'type': 'websocket',
+            'path': path,
+            'headers': [],
+            'subprotocols': list(subprotocols),
+        })
+        self.binary = False
+
+    async def send_json_to(self, data):
+        if self.binary:
+            await self.send_input({'type': 'websocket.receive', 'bytes': msgpack.packb(data)})
+        else:
+            await self.send_input({'type': 'websocket.receive', 'text': json.dumps(data)})
+
+    async def receive_json_from(self, timeout=1):
+        return decode_frame(await self.receive_output(timeout))
+
+    async def disconnect(self):
+        await self.send_input({'type': 'websocket.disconnect', 'code': 1000})
+        await self.wait(1)
+
+
+def decode_frame(message):
+    if message.get('bytes') is not None:
+        return msgpack.unpackb(message['bytes'])
+    return json.loads(message['text'])
+
+
+async def connect(design_id='room-1', subprotocols=()):
+    client = SocketClient(f'/ws/designs/{design_id}/', subprotocols)
+    await client.send_input({'type': 'websocket.connect'})
+    accepted = await client.receive_output(1)
+    assert accepted['type'] == 'websocket.accept'
+    client.binary = accepted.get('subprotocol') == 'design.msgpack.v1'
+    await client.receive_json_from()  # connection confirmation
+    return client
+
+
+async def receive_all(client, quiet=0.3):
+    """Every frame sent until the socket has been quiet for a while"""
+    frames = []
+    while True:
+        await asyncio.sleep(quiet)
+        if client.output_queue.empty():
+            return frames
+        while not client.output_queue.empty():
+            frames.append(decode_frame(client.output_queue.get_nowait()))
+
+
+@override_settings(COLLABORATION={'CURSOR_FLUSH_HZ': 10})
+class CursorCoalescingTestCase(SimpleTestCase):
+    """Test cases for cursor batching."""
+
+    async def test_moves_are_coalesced_into_batches(self):
+        alice = await connect()
+        bob = await connect()
+        for i in range(50):
+            await alice.send_json_to({'type': 'cursor:move', 'userId': 'alice', 'x': i, 'y': i})
+            await bob.send_json_to({'type': 'cursor:move', 'userId': 'bob', 'x': -i, 'y': 0})
+
+        frames = await receive_all(bob)
+        self.assertTrue(frames)
+        self.assertTrue(all(frame['type'] == 'cursor:batch' for frame in frames))
+        # 100 movements arrive within one or two ticks
+        self.assertLess(len(frames), 5)
+        latest = {}
+        for frame in frames:
+            for cursor in frame['cursors']:
+                latest[cursor['userId']] = cursor
+        self.assertEqual(latest['alice'], {'userId': 'alice', 'x': 49, 'y': 49})
+        self.assertEqual(latest['bob'], {'userId': 'bob', 'x': -49, 'y': 0})
+
+        await alice.disconnect()
+        await bob.disconnect()
+
+    async def test_idle_room_sends_nothing(self):
+        alice = await connect('room-2')
+        await alice.send_json_to({'type': 'cursor:move', 'userId': 'alice', 'x': 1, 'y': 2})
+        frames = await receive_all(alice)
+        self.assertEqual(frames, [
+            {'type': 'cursor:batch', 'cursors': [{'userId': 'alice', 'x': 1, 'y': 2}]}
+        ])
+        self.assertEqual(await receive_all(alice), [])
+        await alice.disconnect()
+
+
+@override_settings(COLLABORATION={'PRESENCE_BACKEND': 'memory', 'PRESENCE_TTL': 60})
+class PresenceTestCase(SimpleTestCase):
+    """Test cases for room presence."""
+
+    def setUp(self):
+        reset_presence_registry()
+
+    def tearDown(self):
+        reset_presence_registry()
+
+    async def test_joiner_receives_snapshot(self):
+        alice = await connect('room-3')
+        await alice.send_json_to({'type': 'design:join', 'userId': 'alice'})
+        snapshot, joined = await receive_all(alice)
+        self.assertEqual(snapshot['type'], 'presence:snapshot')
+        self.assertEqual([u['userId'] for u in snapshot['users']], ['alice'])
+        self.assertEqual(joined['type'], 'user:joined')
+
+        bob = await connect('room-3')
+        await bob.send_json_to({'type': 'design:join', 'userId': 'bob'})
+        frames = await receive_all(bob)
+        self.assertEqual([u['userId'] for u in frames[0]['users']], ['alice', 'bob'])
+        self.assertEqual(
+            [(f['type'], f['userId']) for f in await receive_all(alice)],
+            [('user:joined', 'bob')]
+        )
+
+        await bob.disconnect()
+        left = await receive_all(alice)
+        self.assertEqual([(f['type'], f['userId']) for f in left], [('user:left', 'bob')])
+        await alice.disconnect()
+
+    async def test_entries_expire_without_heartbeats(self):
+        registry = InMemoryPresenceRegistry(ttl=60)
+        await registry.join('room', 'a', 'alice')
+        await registry.join('room', 'b', 'bob')
+        registry.rooms['room']['a']['lastSeen'] -= 120
+
+        present, expired = await registry.snapshot('room')
+        self.assertEqual([e['userId'] for e in present], ['bob'])
+        self.assertEqual([e['userId'] for e in expired], ['alice'])
+        self.assertFalse(await registry.heartbeat('room', 'a'))
+        self.assertTrue(await registry.heartbeat('room', 'b'))
+        self.assertEqual((await registry.leave('room', 'b'))['userId'], 'bob')
+        self.assertEqual(registry.rooms, {})
+
+
+class ProtocolTestCase(SimpleTestCase):
+    """Test cases for subprotocol negotiation."""
+
+    async def test_msgpack_is_negotiated(self):
+        client = await connect('room-4', ['design.msgpack.v1', 'design.json.v1'])
+        self.assertTrue(client.binary)
+        await client.send_json_to({'type': 'object:update', 'id': 'a', 'x': 1.5})
+        frames = await receive_all(client)
+        self.assertEqual(frames, [{'type': 'object:update', 'id': 'a', 'x': 1.5}])
+
+        # Cursor batches use compact [userId, x, y] rows
+        await client.send_json_to({'type': 'cursor:move', 'userId': 'alice', 'x': 2.5, 'y': 4})
+        frames = await receive_all(client)
+        self.assertEqual(frames, [{'type': 'cursor:batch', 'cursors': [['alice', 2.5, 4]]}])
+        await client.disconnect()
+
+    async def test_json_fallback(self):
+        client = await connect('room-5', ['something-else'])
+        self.assertFalse(client.binary)
+        await client.send_input({'type': 'websocket.receive', 'text': 'not json'})
+        self.assertEqual(await receive_all(client), [{'type': 'error', 'message': 'Invalid JSON'}])
+        await client.send_input({'type': 'websocket.receive', 'bytes': msgpack.packb({'type': 'x'})})
+        frames = await receive_all(client)
+        self.assertEqual(frames[0]['type'], 'error')
+        await client.disconnect()
+
+
+class OperationServiceTestCase(DesignTestMixin, TestCase):
+    """Test cases for the object operation log."""
+
+    def test_operations_are_sequenced_and_logged(self):
+        design = self.create_design()
+        below = self.create_object(design, z_index=0)
+
+        created = operation_service.apply(design.id, 'alice', {
+            'op': 'create', 'clientOpId': 'c1',
+            'data': {'type': 'text', 'x': 1, 'y': 2, 'width': 3, 'height': 4,
+                     'z_index': 1, 'properties': {'text': 'Hi'}},
+        })
+        self.assertEqual((created['seq'], created['op'], created['clientOpId']), (1, 'create', 'c1'))
+        self.assertEqual(created['data']['properties'], {'text': 'Hi'})
+        new_id = created['objectId']
+
+        patched = operation_service.apply(design.id, 'bob', {
+            'op': 'patch', 'objectId': new_id, 'data': {'x': 5},
+        })
+        self.assertEqual(patched['seq'], 2)
+        self.assertEqual(set(patched['data']), {'x', 'updated_at'})
+        self.assertEqual(DesignObject.objects.get(id=new_id).x, 5)
+
+        reordered = operation_service.apply(design.id, 'bob', {
+            'op': 'reorder', 'data': {'objectIds': [new_id, str(below.id)]},
+        })
+        self.assertEqual(reordered['data']['zIndex'], {new_id: 0, str(below.id): 1})
+
+        operation_service.apply(design.id, 'alice', {'op': 'delete', 'objectId': new_id})
+        self.assertFalse(DesignObject.objects.filter(id=new_id).exists())
+
+        log = operation_service.since(design.id, after=1)
+        self.assertEqual(log['revision'], 4)
+        self.assertEqual([o['seq'] for o in log['operations']], [2, 3, 4])
+        self.assertFalse(log['hasMore'])
+
+    def test_rejected_operation_changes_nothing(self):
+        design = self.create_design()
+        obj = self.create_object(design)
+        with self.assertRaises(OperationError):
+            operation_service.apply(design.id, 'alice', {
+                'op': 'patch', 'objectId': str(obj.id), 'data': {'x': 'left'},
+            })
+        with self.assertRaises(OperationError):
+            operation_service.apply(design.id, 'alice', {'op': 'rotate'})
+        design.refresh_from_db()
+        self.assertEqual(design.revision, 0)
+        self.assertEqual(operation_service.since(design.id)['operations'], [])
+
+    def test_operations_endpoint(self):
+        design = self.create_design()
+        operation_service.apply(design.id, 'alice', {
+            'op': 'create', 'data': {'type': 'shape', 'x': 0, 'y': 0, 'width': 1, 'height': 1,
+                                     'z_index': 0, 'properties': {}},
+        })
+        response = self.client.get(f'/api/designs/{design.id}/operations/?after=0')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([o['seq'] for o in response.json()['operations']], [1])
+        self.assertEqual(self.client.get(f'/api/designs/{design.id}/operations/?after=x').status_code, 400)
+
+
+class OperationSocketTestCase(TransactionTestCase):
+    """Test cases for object operations over the design WebSocket."""
+
+    async def test_operation_is_broadcast_with_seq(self):
+        design = await Design.objects.acreate(user_id='owner', name='Live', width=8.5, height=11)
+        alice = await connect(str(design.id))
+        bob = await connect(str(design.id))
+        await alice.send_json_to({
+            'type': 'object:op', 'op': 'create', 'clientOpId': 'a1', 'userId': 'alice',
+            'data': {'type': 'shape', 'x': 1, 'y': 1, 'width': 2, 'height': 2,
+                     'z_index': 0, 'properties': {}},
+        })
+        for client in (alice, bob):
+            frames = await receive_all(client)
+            self.assertEqual([(f['type'], f['seq'], f['clientOpId']) for f in frames],
+                             [('object:op', 1, 'a1')])
+
+        await bob.send_json_to({'type': 'object:op', 'op': 'delete', 'objectId': 'nope', 'clientOpId': 'b1'})
+        self.assertEqual(await receive_all(bob), [
+            {'type': 'object:op:rejected', 'clientOpId': 'b1', 'error': 'Invalid objectId: nope'}
+        ])
+        self.assertEqual(await receive_all(alice), [])
+        await alice.disconnect()
+        await bob.disconnect()
+
+    @override_settings(COLLABORATION={'BROADCAST_TICK': 0.01})
+    async def test_rest_writes_are_broadcast_with_seq(self):
+        design = await Design.objects.acreate(user_id='owner', name='Rest', width=8.5, height=11)
+        obj = await DesignObject.objects.acreate(
+            design=design, type='shape', x=0, y=0, width=1, height=1, z_index=0, properties={}
+        )
+        alice = await connect(str(design.id))
+        for x in (5, 6):
+            response = await sync_to_async(self.client.put)(
+                f'/api/designs/{design.id}/objects/{obj.id}/',
+                {'user_id': 'bob', 'x': x}, content_type='application/json'
+            )
+            self.assertEqual(response.status_code, 200)
+        frames = await receive_all(alice)
+        self.assertEqual([(f['type'], f['seq'], f['op'], f['userId']) for f in frames],
+                         [('object:op', 1, 'patch', 'bob'), ('object:op', 2, 'patch', 'bob')])
+        self.assertEqual([f['data']['x'] for f in frames], ['5.0000', '6.0000'])
+        await alice.disconnect()
+
+    @override_settings(COLLABORATION={'WRITE_BEHIND_INTERVAL': 60})
+    async def test_disconnect_flushes_buffered_edits(self):
+        design = await Design.objects.acreate(user_id='owner', name='Drag', width=8.5, height=11)
+        obj = await DesignObject.objects.acreate(
+            design=design, type='shape', x=0, y=0, width=1, height=1, z_index=0, properties={}
+        )
+        alice = await connect(str(design.id))
+        for i in range(10):
+            await alice.send_json_to({
+                'type': 'object:op', 'op': 'patch', 'objectId': str(obj.id), 'data': {'x': i},
+            })
+        frames = await receive_all(alice)
+        self.assertEqual([f['seq'] for f in frames], list(range(1, 11)))
+        self.assertEqual((await DesignObject.objects.aget(id=obj.id)).x, 0)
+
+        await alice.disconnect()
+        self.assertEqual((await DesignObject.objects.aget(id=obj.id)).x, 9)
+
+
+class WriteBehindTestCase(DesignTestMixin, TestCase):
+    """Test cases for buffered object edits."""
+
+    def setUp(self):
+        write_behind_buffer.entries.clear()
+        self.design = self.create_design()
+        self.obj = self.create_object(self.design)
+
+    def tearDown(self):
+        write_behind_buffer.entries.clear()
+
+    def drag(self, steps):
+        for i in range(1, steps + 1):
+            operation_service.apply(self.design.id, 'alice', {
+                'op': 'patch', 'objectId': str(self.obj.id), 'data': {'x': i, 'y': i * 2},
+            }, buffered=True)
+
+    def test_patches_are_coalesced_until_flush(self):
+        self.drag(20)
+        self.assertEqual(write_behind_buffer.pending(), 1)
+        self.obj.refresh_from_db()
+        self.assertEqual(self.obj.x, 0)
+        self.assertEqual(DesignOperation.objects.filter(applied=False).count(), 20)
+
+        self.assertEqual(write_behind_buffer.flush(self.design.id), 1)
+        self.obj.refresh_from_db()
+        self.assertEqual((self.obj.x, self.obj.y), (20, 40))
+        self.assertFalse(DesignOperation.objects.filter(applied=False).exists())
+
+    def test_other_operations_flush_first(self):
+        self.drag(3)
+        operation_service.apply(self.design.id, 'bob', {
+            'op': 'patch', 'objectId': str(self.obj.id), 'data': {'width': 7},
+        })
+        self.assertEqual(write_behind_buffer.pending(), 0)
+        self.obj.refresh_from_db()
+        self.assertEqual((self.obj.x, self.obj.width), (3, 7))
+
+    def test_unflushed_patches_are_replayed(self):
+        self.drag(5)
+        write_behind_buffer.entries.clear()  # the worker died before flushing
+        self.assertEqual(replay_pending_operations(older_than=0), 5)
+        self.obj.refresh_from_db()
+        self.assertEqual((self.obj.x, self.obj.y), (5, 10))
+        self.assertEqual(replay_pending_operations(older_than=0), 0)
+
+    def put_object(self, **data):
+        return self.client.put(
+            f'/api/designs/{self.design.id}/objects/{self.obj.id}/',
+            {'user_id': 'bob', **data}, content_type='application/json'
+        )
+
+    def test_rest_writes_apply_on_top_of_buffered_patches(self):
+        self.drag(3)
+        self.assertEqual(self.put_object(x=50).status_code, 200)
+        self.assertEqual(write_behind_buffer.pending(), 0)
+        write_behind_buffer.flush()
+        self.obj.refresh_from_db()
+        self.assertEqual((self.obj.x, self.obj.y), (50, 6))
+        self.assertEqual(
+            list(DesignOperation.objects.order_by('seq').values_list('op', 'applied'))[-1], ('patch', True)
+        )
+
+    def test_late_flushes_keep_newer_rest_writes(self):
+        self.drag(3)
+        # The buffer lives in another worker, which flushes after the PUT
+        entries = dict(write_behind_buffer.entries)
+        write_behind_buffer.entries.clear()
+        self.assertEqual(self.put_object(x=50).status_code, 200)
+        write_behind_buffer.entries.update(entries)
+        self.assertEqual(write_behind_buffer.flush(), 1)
+        self.obj.refresh_from_db()
+        self.assertEqual((self.obj.x, self.obj.y), (50, 6))
+        self.assertFalse(DesignOperation.objects.filter(applied=False).exists())
+
+    def test_replay_keeps_newer_rest_writes(self):
+        self.drag(3)
+        write_behind_buffer.entries.clear()
+        self.assertEqual(self.put_object(x=50).status_code, 200)
+        self.assertEqual(replay_pending_operations(older_than=0), 3)
+        self.obj.refresh_from_db()
+        self.assertEqual((self.obj.x, self.obj.y), (50, 6))
+
+
+class RecordingChannelLayer:
+    """Channel layer that records group messages"""
+
+    def __init__(self):
+        self.messages = []
+
+    async def group_send(self, group, message):
+        self.messages.append((group, message))
+
+
+@override_settings(COLLABORATION={'BROADCAST_TICK': 0.05})
+class CommentBroadcastTestCase(DesignTestMixin, TestCase):
+    """Test cases for comment broadcasts through the outbox."""
+
+    def setUp(self):
+        self.layer = RecordingChannelLayer()
+        self.previous_layer = comment_outbox.channel_layer
+        comment_outbox.channel_layer = self.layer
+        self.design = self.create_design()
+
+    def tearDown(self):
+        comment_outbox.channel_layer = self.previous_layer
+
+    def sent(self, wait=0.3):
+        """Group messages sent once the outbox has had time to flush"""
+        time.sleep(wait)
+        return [(group, [e['type'] for e in message['events']]) for group, message in self.layer.messages]
+
+    def test_events_wait_for_commit_and_are_batched(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            comments = [
+                DesignComment.objects.create(design=self.design, user_id='u', content=f'#{i}')
+                for i in range(3)
+            ]
+            self.assertEqual(self.sent(wait=0.1), [])
+        self.assertEqual(self.sent(), [
+            (f'design_{self.design.id}', ['comment:created'] * 3)
+        ])
+        self.assertEqual(self.layer.messages[0][1]['type'], 'comment_batch')
+        self.assertEqual(
+            [e['comment']['content'] for e in self.layer.messages[0][1]['events']],
+            [c.content for c in comments]
+        )
+
+    def test_rolled_back_changes_are_not_broadcast(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    DesignComment.objects.create(design=self.design, user_id='u', content='gone')
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(callbacks, [])
+        self.assertEqual(self.sent(), [])
+
+    def test_resolve_is_broadcast_once(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            comment = DesignComment.objects.create(design=self.design, user_id='u', content='fix')
+        with self.captureOnCommitCallbacks(execute=True):
+            comment.resolved = True
+            comment.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            comment.content = 'fixed'
+            comment.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            DesignComment.objects.get(id=comment.id).delete()
+        events = [event for _, batch in self.sent() for event in batch]
+        self.assertEqual(events, ['comment:created', 'comment:resolved', 'comment:deleted'])
+
+
+class BroadcastOutboxTestCase(SimpleTestCase):
+    """Test cases for the outbox's event loop handling."""
+
+    @override_settings(COLLABORATION={'BROADCAST_TICK': 0.01})
+    def test_in_memory_receivers_are_woken(self):
+        layer = InMemoryChannelLayer()
+        outbox = BroadcastOutbox('comment_batch', layer)
+
+        async def receive():
+            channel = await layer.new_channel()
+            await layer.group_add('design_1', channel)
+            waiting = asyncio.ensure_future(layer.receive(channel))
+            # As from an on_commit callback in a view run by sync_to_async
+            await sync_to_async(outbox.enqueue)('design_1', {'type': 'comment:created'})
+            return await asyncio.wait_for(waiting, 1)
+
+        message = async_to_sync(receive)()
+        self.assertEqual(message['type'], 'comment_batch')
+        self.assertEqual(message['events'], [{'type': 'comment:created'}])
+
+    @override_settings(COLLABORATION={'BROADCAST_TICK': 0.01})
+    def test_sends_without_an_event_loop(self):
+        layer = RecordingChannelLayer()
+        outbox = BroadcastOutbox('design_events', layer)
+        outbox.enqueue('design_1', {'type': 'a'})
+        outbox.enqueue('design_1', {'type': 'b'})
+        time.sleep(0.2)
+        self.assertEqual(layer.messages, [
+            ('design_1', {'type': 'design_events', 'events': [{'type': 'a'}, {'type': 'b'}]})
+        ])
+
+    @override_settings(COLLABORATION={'BROADCAST_TICK': 60})
+    def test_pending_frames_are_sent_at_exit(self):
+        layer = RecordingChannelLayer()
+        outbox = BroadcastOutbox('design_events', layer)
+        outbox.enqueue('design_1', {'type': 'a'})
+        outbox.flush_at_exit()
+        self.assertEqual(layer.messages, [('design_1', {'type': 'design_events', 'events': [{'type': 'a'}]})])
+
+
+class VersionStoreTestCase(DesignTestMixin, TestCase):
+    """Test cases for keyframe plus diff version storage."""
+
+    def snapshot(self, count, moved=()):
+        return {'objects': [
+            {'id': f'obj-{i}', 'type': 'shape', 'x': 100 if i in moved else i, 'y': 0,
+             'width': 10, 'height': 10, 'properties': {'fill': '#ff0000', 'label': f'Shape number {i}'}}
+            for i in range(count)
+        ]}
+
+    def test_diff_round_trips(self):
+        old = {'objects': [{'id': 1, 'x': 0}, {'id': 2, 'x': 1}], 'grid': [1, 2], 'name': 'a'}
+        cases = [
+            {'objects': [{'id': 2, 'x': 5}, {'id': 3, 'x': 0}], 'grid': [1, 3], 'zoom': 2},
+            {'objects': [{'id': 3}, {'id': 1, 'x': 0}], 'grid': [1, 2], 'name': 'a'},
+            {'objects': [], 'grid': [1, 2, 3], 'name': None},
+            {'objects': [{'id': 1, 'x': 0}, {'id': 2, 'x': 1, 'y': 4}], 'grid': [1, 2], 'name': 'a'},
+            [1, 2],
+        ]
+        for new in cases:
+            self.assertEqual(json_patch(old, json.loads(json.dumps(json_diff(old, new)))), new)
+        self.assertIsNone(json_diff(old, json.loads(json.dumps(old))))
+
+    def test_keyed_diff_only_holds_changed_objects(self):
+        diff = json_diff(self.snapshot(50), self.snapshot(50, moved={7}))
+        self.assertEqual(diff, {'$d': {'sub': {'objects': {'$k': {
+            'sub': {'obj-7': {'$d': {'sub': {'x': {'$r': 100}}}}}
+        }}}}})
+
+    def test_versions_rebuild_from_keyframes_and_diffs(self):
+        design = self.create_design()
+        snapshots = [self.snapshot(40 + i, moved={i}) for i in range(25)]
+        versions = [version_store.create(design, 'alice', s, f'v{i}') for i, s in enumerate(snapshots)]
+
+        self.assertEqual(
+            [v.version_number for v in versions if v.is_keyframe],
+            [1, 11, 21]
+        )
+        self.assertTrue(all(v.snapshot is None for v in versions))
+        for version, snapshot in zip(versions, snapshots):
+            stored = DesignVersion.objects.get(id=version.id)
+            self.assertEqual(version_store.get_snapshot(stored), snapshot)
+
+    def test_large_change_is_stored_as_keyframe(self):
+        design = self.create_design()
+        version_store.create(design, 'alice', self.snapshot(30))
+        replaced = version_store.create(design, 'alice', {'objects': [
+            {'id': f'new-{i}', 'text': f'Completely different {i}'} for i in range(30)
+        ]})
+        self.assertTrue(replaced.is_keyframe)
+
+    def test_legacy_snapshot_rows_are_keyframes(self):
+        design = self.create_design()
+        DesignVersion.objects.create(
+            design=design, version_number=1, created_by='alice', snapshot=self.snapshot(20)
+        )
+        latest = version_store.create(design, 'alice', self.snapshot(20, moved={3}))
+        self.assertFalse(latest.is_keyframe)
+        self.assertEqual(version_store.get_snapshot(latest), self.snapshot(20, moved={3}))
+
+    def test_list_omits_snapshots_and_restore_rebuilds(self):
+        design = self.create_design()
+        url = f'/api/designs/{design.id}/versions/'
+        for i in range(3):
+            response = self.client.post(url, {
+                'user_id': 'alice', 'snapshot': self.snapshot(20, moved={i}), 'description': f'v{i}'
+            }, content_type='application/json')
+            self.assertEqual(response.status_code, 201)
+            self.assertNotIn('snapshot', response.json()['version'])
+
+        versions = self.client.get(url).json()['versions']
+        self.assertEqual([v['version_number'] for v in versions], [3, 2, 1])
+        self.assertTrue(all('snapshot' not in v for v in versions))
+
+        restored = self.client.post(f'/api/versions/{versions[0]["id"]}/restore/')
+        self.assertEqual(restored.json()['snapshot'], self.snapshot(20, moved={2}))
+
+
+@override_settings(COLLABORATION={'BROADCAST_TICK': 0.01})
+class VersionRestoreTestCase(DesignTestMixin, TestCase):
+    """Test cases for restoring a version on the server."""
+
+    def setUp(self):
+        self.layer = RecordingChannelLayer()
+        self.previous_layer = design_outbox.channel_layer
+        design_outbox.channel_layer = self.layer
+        self.design = self.create_design()
+
+    def tearDown(self):
+        design_outbox.channel_layer = self.previous_layer
+
+    def test_restore_writes_only_the_difference(self):
+        moved = self.create_object(self.design, z_index=0, properties={'shape': 'rect'})
+        same = self.create_object(self.design, z_index=1, properties={'shape': 'ellipse'})
+        gone = self.create_object(self.design, z_index=2, properties={'shape': 'star'})
+        same_updated_at = same.updated_at
+        # Editor snapshots flatten properties and use zIndex
+        snapshot = {'objects': [
+            {'id': str(moved.id), 'type': 'shape', 'x': 40, 'y': 0, 'width': 10, 'height': 10,
+             'zIndex': 0, 'shape': 'rect'},
+            {'id': str(same.id), 'type': 'shape', 'x': 0, 'y': 0, 'width': 10, 'height': 10,
+             'zIndex': 1, 'shape': 'ellipse'},
+            {'id': 'temp-1', 'type': 'text', 'x': 1, 'y': 2, 'width': 30, 'height': 5,
+             'zIndex': 3, 'text': 'Back again', 'fontSize': 12},
+        ]}
+        version = version_store.create(self.design, 'alice', snapshot)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                f'/api/versions/{version.id}/restore/', {'user_id': 'bob'}, content_type='application/json'
+            )
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body['revision'], 1)
+        self.assertEqual(len(body['objects']), 3)
+
+        rows = {obj.z_index: obj for obj in DesignObject.objects.filter(design=self.design)}
+        self.assertEqual(sorted(rows), [0, 1, 3])
+        self.assertEqual(rows[0].x, 40)
+        self.assertEqual(rows[1].updated_at, same_updated_at)
+        self.assertEqual(rows[3].properties, {'text': 'Back again', 'fontSize': 12})
+        self.assertFalse(DesignObject.objects.filter(id=gone.id).exists())
+
+        logged = DesignOperation.objects.get(design=self.design)
+        self.assertEqual((logged.seq, logged.op, logged.user_id), (1, 'restore', 'bob'))
+        self.assertEqual(list(logged.payload['updated']), [str(moved.id)])
+        self.assertEqual(set(logged.payload['updated'][str(moved.id)]), {'x', 'updated_at'})
+        self.assertEqual(logged.payload['deleted'], [str(gone.id)])
+        self.assertEqual([o['id'] for o in logged.payload['created']], [str(rows[3].id)])
+
+        time.sleep(0.2)
+        self.assertEqual(len(self.layer.messages), 1)
+        group, message = self.layer.messages[0]
+        self.assertEqual(group, f'design_{self.design.id}')
+        self.assertEqual([e['type'] for e in message['events']], ['design:restored'])
+        self.assertEqual(message['events'][0]['versionNumber'], 1)
+        self.assertEqual(len(message['events'][0]['objects']), 3)
+
+    def test_invalid_snapshot_changes_nothing(self):
+        kept = self.create_object(self.design)
+        version = version_store.create(self.design, 'alice', {'objects': [{'id': 'temp', 'type': 'shape'}]})
+        response = self.client.post(f'/api/versions/{version.id}/restore/')
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(DesignObject.objects.filter(id=kept.id).exists())
+        self.assertEqual(Design.objects.get(id=self.design.id).revision, 0)
+
+    def test_broken_diff_chain_is_a_conflict(self):
+        snapshot = {'objects': [
+            {'id': f'obj-{i}', 'type': 'shape', 'x': 0, 'y': i, 'width': 10, 'height': 10} for i in range(20)
+        ]}
+        version_store.create(self.design, 'alice', snapshot)
+        snapshot['objects'][0]['x'] = 1
+        version_store.create(self.design, 'alice', snapshot)
+        snapshot['objects'][0]['x'] = 2
+        latest = version_store.create(self.design, 'alice', snapshot)
+        self.assertFalse(latest.is_keyframe)
+        DesignVersion.objects.filter(design=self.design, version_number=2).delete()
+
+        response = self.client.post(f'/api/versions/{latest.id}/restore/')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json(), {
+            'success': False, 'error': 'Version 2 is missing from the diff chain'
+        })
+        self.assertEqual(Design.objects.get(id=self.design.id).revision, 0)
+
+
+class DesignIdResolutionTestCase(DesignTestMixin, TestCase):
+    """Test cases for cached design id resolution."""
+
+    def setUp(self):
+        design_id_cache.clear()
+
+    def test_resolutions_are_cached(self):
+        design = self.create_design(name='local-design')
+        with self.assertNumQueries(1):
+            self.assertEqual(get_actual_design_id('local-design'), str(design.id))
+        with self.assertNumQueries(1):
+            self.assertEqual(get_actual_design_id(str(design.id).upper()), str(design.id))
+        with self.assertNumQueries(0):
+            get_actual_design_id('local-design')
+            get_actual_design_id(str(design.id).upper())
+
+    def test_resolve_many_in_two_queries(self):
+        older = self.create_design(name='shared')
+        newer = self.create_design(name='shared')
+        other = self.create_design(name='other')
+        missing = '00000000-0000-0000-0000-000000000000'
+        Design.objects.filter(id=older.id).update(created_at=newer.created_at.replace(year=2000))
+        with self.assertNumQueries(2):
+            resolved = resolve_design_ids(['shared', str(other.id), missing, 'nope', 'shared'])
+        self.assertEqual(resolved, {
+            'shared': str(newer.id), str(other.id): str(other.id), missing: None, 'nope': None
+        })
+
+    def test_create_and_delete_invalidate(self):
+        with design_id_cache.request_scope():
+            self.assertIsNone(get_actual_design_id('alias'))
+            with self.assertNumQueries(0):
+                self.assertIsNone(get_actual_design_id('alias'))
+            design = self.create_design(name='alias')
+            self.assertEqual(get_actual_design_id('alias'), str(design.id))
+            design.delete()
+            self.assertIsNone(get_actual_design_id('alias'))
+            self.assertIsNone(get_actual_design_id(str(design.id)))
+
+    def test_misses_are_only_cached_per_request(self):
+        with design_id_cache.request_scope():
+            self.assertIsNone(get_actual_design_id('later'))
+        # bulk_create sends no signals, so nothing invalidates the cache
+        design, = Design.objects.bulk_create([Design(user_id='owner', name='later', width=1, height=1)])
+        with self.assertNumQueries(1):
+            self.assertEqual(get_actual_design_id('later'), str(design.id))
+
+
+class RoleServiceTestCase(DesignTestMixin, TestCase):
+    """Test cases for cached role resolution."""
+
+    def setUp(self):
+        role_service.clear()
+        design_id_cache.clear()
+        self.design = self.create_design(user_id='owner')
+        DesignCollaborator.objects.create(design=self.design, user_id='viewer', role='viewer')
+        DesignCollaborator.objects.create(design=self.design, user_id='editor', role='editor')
+
+    def allowed(self, permission, user_id):
+        request = Request(APIRequestFactory().get('/', {'user_id': user_id}))
+        view = SimpleNamespace(kwargs={'design_id': str(self.design.id)})
+        return permission().has_permission(request, view)
+
+    def test_permissions_use_roles(self):
+        self.assertEqual(
+            [self.allowed(IsDesignOwner, u) for u in ('owner', 'editor', 'viewer', 'stranger')],
+            [True, False, False, False]
+        )
+        self.assertEqual(
+            [self.allowed(IsDesignEditor, u) for u in ('owner', 'editor', 'viewer', 'stranger')],
+            [True, True, False, False]
+        )
+        self.assertEqual(
+            [self.allowed(HasDesignPermission, u) for u in ('owner', 'editor', 'viewer', 'stranger')],
+            [True, True, True, False]
+        )
+
+    def test_access_is_one_query_then_cached(self):
+        design_id = str(self.design.id)
+        with self.assertNumQueries(1):
+            access = role_service.get_access(design_id, 'editor')
+        self.assertEqual((access.is_owner, access.role), (False, 'editor'))
+        get_actual_design_id(design_id)
+        with self.assertNumQueries(0):
+            self.assertTrue(role_service.has_role(design_id, 'editor', 'editor'))
+            self.assertTrue(self.allowed(IsDesignEditor, 'editor'))
+        self.assertIsNone(role_service.get_access('00000000-0000-0000-0000-000000000000', 'editor'))
+
+    def test_collaborator_changes_invalidate(self):
+        design_id = str(self.design.id)
+        self.assertFalse(role_service.has_role(design_id, 'viewer', 'editor'))
+        response = self.client.post(f'/api/designs/{design_id}/collaborators/', {
+            'user_id': 'viewer', 'role': 'editor', 'invited_by': 'owner'
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(role_service.has_role(design_id, 'viewer', 'editor'))
+
+        self.client.delete(f'/api/designs/{design_id}/collaborators/viewer/')
+        self.assertFalse(role_service.has_role(design_id, 'viewer', 'viewer'))
+
+
+@override_settings(COLLABORATION={'AUTHORIZE_OPERATIONS': True, 'WRITE_BEHIND_INTERVAL': 0})
+class OperationAuthorizationTestCase(TransactionTestCase):
+    """Test cases for role checks on socket operations."""
+
+    async def test_viewers_cannot_apply_operations(self):
+        role_service.clear()
+        design = await Design.objects.acreate(user_id='owner', name='Locked', width=8.5, height=11)
+        await DesignCollaborator.objects.acreate(design=design, user_id='viewer', role='viewer')
+        client = await connect(str(design.id))
+        create = {'type': 'shape', 'x': 1, 'y': 1, 'width': 2, 'height': 2, 'z_index': 0, 'properties': {}}
+        await client.send_json_to({
+            'type': 'object:op', 'op': 'create', 'clientOpId': 'v1', 'userId': 'viewer', 'data': create
+        })
+        await client.send_json_to({
+            'type': 'object:op', 'op': 'create', 'clientOpId': 'o1', 'userId': 'owner', 'data': create
+        })
+        frames = await receive_all(client)
+        self.assertEqual([(f['type'], f['clientOpId']) for f in frames], [
+            ('object:op:rejected', 'v1'), ('object:op', 'o1')
+        ])
+        await client.disconnect()
+
+
+class CommentThreadTestCase(DesignTestMixin, TestCase):
+    """Test cases for paginated comment threads."""
+
+    def setUp(self):
+        design_id_cache.clear()
+        self.design = self.create_design()
+        self.url = f'/api/designs/{self.design.id}/comments/threads/'
+
+    def comment(self, content, parent=None, **kwargs):
+        return DesignComment.objects.create(
+            design=self.design, user_id='u', content=content, parent=parent, **kwargs
+        )
+
+    def test_threads_are_paged_with_nested_replies(self):
+        roots = [self.comment(f'root {i}') for i in range(5)]
+        reply = self.comment('reply', parent=roots[4])
+        nested = self.comment('nested', parent=reply)
+        self.comment('other reply', parent=roots[3])
+        self.assertEqual(nested.thread_id, roots[4].id)
+
+        get_actual_design_id(str(self.design.id))
+        with self.assertNumQueries(2):
+            first = self.client.get(self.url, {'limit': 2}).json()
+        self.assertEqual([t['content'] for t in first['threads']], ['root 4', 'root 3'])
+        self.assertEqual(first['threads'][0]['replies'][0]['content'], 'reply')
+        self.assertEqual(first['threads'][0]['replies'][0]['replies'][0]['content'], 'nested')
+        self.assertEqual([r['content'] for r in first['threads'][1]['replies']], ['other reply'])
+
+        seen = [t['content'] for t in first['threads']]
+        cursor = first['nextCursor']
+        while cursor:
+            page = self.client.get(self.url, {'limit': 2, 'cursor': cursor}).json()
+            seen += [t['content'] for t in page['threads']]
+            cursor = page['nextCursor']
+        self.assertEqual(seen, [f'root {i}' for i in range(4, -1, -1)])
+
+    def test_filters_and_bad_cursor(self):
+        obj = self.create_object(self.design)
+        self.comment('open')
+        self.comment('done', resolved=True)
+        self.comment('pinned', object_id=obj.id)
+        resolved = self.client.get(self.url, {'resolved': 'true'}).json()['threads']
+        self.assertEqual([t['content'] for t in resolved], ['done'])
+        pinned = self.client.get(self.url, {'object_id': str(obj.id)}).json()['threads']
+        self.assertEqual([t['content'] for t in pinned], ['pinned'])
+        self.assertEqual(self.client.get(self.url, {'cursor': 'nope'}).status_code, 400)
+
+    def test_viewport_query(self):
+        plain = self.create_object(self.design, x=10, y=10, width=2, height=2)
+        rotated = self.create_object(self.design, x=20, y=0, width=2, height=2, rotation=45)
+        inside = self.comment('inside', x=1, y=1)
+        self.comment('reply', parent=inside)
+        self.comment('outside', x=50, y=50)
+        self.comment('on plain', object_id=plain.id)
+        self.comment('on rotated', object_id=rotated.id)
+        url = f'/api/designs/{self.design.id}/comments/'
+
+        def contents(bbox):
+            response = self.client.get(url, {'bbox': bbox})
+            return sorted(c['content'] for c in response.json()['comments'])
+
+        self.assertEqual(contents('0,0,5,5'), ['inside', 'reply'])
+        self.assertEqual(contents('11,11,30,12'), ['on plain'])
+        self.assertEqual(contents('17,0,19,1'), ['on rotated'])
+        self.assertEqual(contents('60,60,70,70'), [])
+        threads = self.client.get(self.url, {'bbox': '0,0,12,12'}).json()['threads']
+        self.assertEqual([t['content'] for t in threads], ['on plain', 'inside'])
+        self.assertEqual(threads[1]['replies'][0]['content'], 'reply')
+        for bad in ('1,2,3', '5,0,1,1', 'a,b,c,d', 'nan,0,1,1'):
+            self.assertEqual(self.client.get(url, {'bbox': bad}).status_code, 400)
+
+
+@override_settings(COLLABORATION={'CHANGE_LOG_FLUSH_INTERVAL': 60, 'WRITE_BEHIND_INTERVAL': 0})
+class ChangeLogTestCase(DesignTestMixin, TestCase):
+    """Test cases for the buffered change log."""
+
+    def setUp(self):
+        change_log.flush()
+        self.design = self.create_design()
+
+    def logged(self):
+        change_log.flush()
+        return list(
+            DesignChangeLog.objects.filter(design=self.design).order_by('id').values_list('change_type', 'object_id')
+        )
+
+    def test_entries_wait_for_commit_and_coalesce(self):
+        obj = self.create_object(self.design)
+        with self.captureOnCommitCallbacks(execute=True):
+            for x in range(5):
+                operation_service.apply(self.design.id, 'alice', {
+                    'op': 'patch', 'objectId': str(obj.id), 'data': {'x': x}
+                })
+            self.assertEqual(change_log.pending, {})
+        self.assertEqual(self.logged(), [('object_updated', obj.id)])
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    change_log.record(self.design.id, 'object_deleted', obj.id)
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(callbacks, [])
+        self.assertEqual(len(self.logged()), 1)
+
+    def test_distinct_changes_are_kept(self):
+        url = f'/api/designs/{self.design.id}/collaborators/'
+        with self.captureOnCommitCallbacks(execute=True):
+            for user in ('bob', 'carol'):
+                self.client.post(url, {'user_id': user, 'role': 'editor', 'invited_by': 'alice'},
+                                 content_type='application/json')
+            self.client.delete(f'{url}bob/?removed_by=alice')
+            self.client.delete(f'{url}carol/?removed_by=alice')
+        self.assertEqual([change for change, _ in self.logged()], [
+            'collaborator_added', 'collaborator_added', 'collaborator_removed', 'collaborator_removed'
+        ])
+        self.assertEqual(
+            list(DesignChangeLog.objects.filter(design=self.design).order_by('id').values_list('user_id', 'description')),
+            [('alice', 'bob as editor'), ('alice', 'carol as editor'), ('alice', 'bob'), ('alice', 'carol')]
+        )
+
+    def test_rest_mutations_are_logged(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            created = self.client.post(f'/api/designs/{self.design.id}/objects/', {
+                'type': 'shape', 'x': 0, 'y': 0, 'width': 1, 'height': 1, 'z_index': 0,
+                'properties': {}, 'user_id': 'bob'
+            }, content_type='application/json').json()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/designs/{self.design.id}/layers/{created["id"]}/lock/')
+        self.assertEqual([change for change, _ in self.logged()], ['object_created', 'layer_locked'])
+        self.assertEqual(DesignChangeLog.objects.filter(design=self.design).first().user_id, 'bob')
+
+    def test_range_query_streams_and_prune_deletes_old(self):
+        now = timezone.now()
+        DesignChangeLog.objects.bulk_create([
+            DesignChangeLog(design=self.design, user_id='u', change_type=f'change {days}',
+                            created_at=now - timedelta(days=days))
+            for days in (200, 100, 10, 1)
+        ])
+        response = self.client.get(f'/api/designs/{self.design.id}/changes/', {
+            'since': (now - timedelta(days=150)).isoformat(), 'until': (now - timedelta(days=5)).isoformat()
+        })
+        self.assertTrue(response.streaming)
+        body = json.loads(b''.join(response.streaming_content))
+        self.assertEqual([c['change_type'] for c in body['changes']], ['change 100', 'change 10'])
+        self.assertEqual(self.client.get(f'/api/designs/{self.design.id}/changes/', {'since': 'soon'}).status_code, 400)
+
+        self.assertEqual(change_log_service.prune(90), 2)
+        self.assertEqual([c for c, _ in self.logged()], ['change 10', 'change 1'])
+
+
+class ReplayBufferTestCase(SimpleTestCase):
+    """Test cases for the per-design replay buffer."""
+
+    def test_since_needs_every_missed_event(self):
+        buffer = InMemoryReplayBuffer(size=3)
+        for seq in range(1, 6):
+            buffer.append('d1', {'type': 'object:op', 'seq': seq})
+        self.assertEqual([e['seq'] for e in buffer.since('d1', 2, 5)], [3, 4, 5])
+        self.assertEqual(buffer.since('d1', 5, 5), [])
+        self.assertIsNone(buffer.since('d1', 1, 5))  # seq 2 fell out
+        self.assertIsNone(buffer.since('d1', 3, 6))  # seq 6 is not buffered yet
+        self.assertIsNone(buffer.since('d1', 7, 5))
+        self.assertIsNone(buffer.since('d2', 0, 1))
+
+
+@override_settings(COLLABORATION={
+    'PRESENCE_BACKEND': 'memory', 'REPLAY_BACKEND': 'memory', 'REPLAY_BUFFER_SIZE': 3,
+    'WRITE_BEHIND_INTERVAL': 0
+})
+class ReconnectTestCase(TransactionTestCase):
+    """Test cases for catching up after a reconnect."""
+
+    def setUp(self):
+        reset_presence_registry()
+        reset_replay_buffer()
+
+    def tearDown(self):
+        reset_presence_registry()
+        reset_replay_buffer()
+
+    async def test_missed_operations_are_replayed(self):
+        design = await Design.objects.acreate(user_id='owner', name='Resume', width=8.5, height=11)
+        obj = await DesignObject.objects.acreate(
+            design=design, type='shape', x=0, y=0, width=1, height=1, z_index=0, properties={}
+        )
+        alice = await connect(str(design.id))
+        for x in range(4):
+            await alice.send_json_to({
+                'type': 'object:op', 'op': 'patch', 'objectId': str(obj.id), 'data': {'x': x}
+            })
+        await receive_all(alice)
+
+        bob = await connect(str(design.id))
+        await bob.send_json_to({'type': 'design:join', 'userId': 'bob', 'lastSeq': 2})
+        frames = await receive_all(bob)
+        replay = next(f for f in frames if f['type'] == 'sync:replay')
+        self.assertEqual(replay['seq'], 4)
+        self.assertEqual([(e['seq'], float(e['data']['x'])) for e in replay['events']], [(3, 2), (4, 3)])
+
+        carol = await connect(str(design.id))
+        await carol.send_json_to({'type': 'design:join', 'userId': 'carol', 'lastSeq': 0})
+        frames = await receive_all(carol)
+        self.assertIn({'type': 'sync:reload', 'seq': 4}, frames)
+        for client in (alice, bob, carol):
+            await client.disconnect()
+
+
+class SendQueueTestCase(SimpleTestCase):
+    """Test cases for per-connection send queues."""
+
+    def make_queue(self, max_depth):
+        self.written = []
+        self.lagging = False
+        self.gate = asyncio.Event()
+
+        async def write(frame):
+            await self.gate.wait()
+            self.written.append(frame['n'])
+
+        async def on_lagging():
+            self.lagging = True
+
+        return SendQueue(write, on_lagging, max_depth)
+
+    async def test_frames_are_written_by_priority(self):
+        queue = self.make_queue(10)
+        queue.put({'n': 'cursor'}, PRIORITY_DROPPABLE)
+        queue.put({'n': 'joined'}, PRIORITY_PRESENCE)
+        queue.put({'n': 'op1'}, PRIORITY_CRITICAL)
+        queue.put({'n': 'op2'}, PRIORITY_CRITICAL)
+        queue.put(lambda: None, PRIORITY_CRITICAL)  # built when written; None is skipped
+        self.gate.set()
+        await queue.task
+        self.assertEqual(self.written, ['op1', 'op2', 'joined', 'cursor'])
+
+    async def test_droppable_frames_are_shed_before_disconnecting(self):
+        dropped = send_queue_stats.dropped
+        queue = self.make_queue(3)
+        queue.put({'n': 'c1'}, PRIORITY_DROPPABLE, key='cursor')
+        queue.put({'n': 'c2'}, PRIORITY_DROPPABLE, key='cursor')
+        self.assertEqual(queue.depth, 1)  # keyed frames are queued once
+        queue.put({'n': 't1'}, PRIORITY_DROPPABLE)
+        for n in range(3):
+            queue.put({'n': n}, PRIORITY_CRITICAL)
+        self.assertEqual(send_queue_stats.dropped - dropped, 2)
+        self.assertEqual(queue.depth, 3)
+        self.assertFalse(self.lagging)
+
+        queue.put({'n': 3}, PRIORITY_CRITICAL)
+        await asyncio.sleep(0)
+        self.assertTrue(self.lagging)
+        self.assertTrue(queue.closed)
+        self.assertEqual(queue.depth, 0)
+        queue.put({'n': 4}, PRIORITY_CRITICAL)
+        self.assertEqual(queue.depth, 0)
+
+
+    async def test_operations_drop_older_transforms_of_their_object(self):
+        queue = self.make_queue(10)
+        queue.put({'n': 't1', 'type': 'object:transform', 'objectId': 'a'}, PRIORITY_DROPPABLE)
+        queue.put({'n': 't2', 'type': 'object:transform', 'objectId': 'b'}, PRIORITY_DROPPABLE)
+        queue.put({'n': 'op', 'type': 'object:op', 'objectId': 'a'}, PRIORITY_CRITICAL)
+        queue.put({'n': 't3', 'type': 'object:transform', 'objectId': 'a'}, PRIORITY_DROPPABLE)
+        self.gate.set()
+        await queue.task
+        self.assertEqual(self.written, ['op', 't2', 't3'])
+
+    async def test_failed_writes_close_the_queue(self):
+        async def write(frame):
+            raise ConnectionResetError
+
+        async def on_lagging():
+            pass
+
+        queue = SendQueue(write, on_lagging, 10)
+        queue.put({'n': 1}, PRIORITY_CRITICAL)
+        queue.put({'n': 2}, PRIORITY_CRITICAL)
+        await queue.task
+        self.assertTrue(queue.closed)
+        self.assertEqual(queue.depth, 0)
+
+
+@override_settings(COLLABORATION={'LEASE_TTL': 10, 'WRITE_BEHIND_INTERVAL': 0})
+class EditLeaseTestCase(DesignTestMixin, TestCase):
+    """Test cases for object edit leases."""
+
+    def setUp(self):
+        reset_lease_store()
+        self.design = self.create_design()
+        self.obj = self.create_object(self.design)
+
+    def test_lease_is_exclusive_until_released(self):
+        granted, lease = edit_leases.acquire(self.design.id, self.obj.id, 'alice')
+        self.assertTrue(granted)
+        self.assertEqual((lease['userId'], lease['objectId']), ('alice', str(self.obj.id)))
+        self.assertEqual(edit_leases.acquire(self.design.id, self.obj.id, 'bob'), (False, lease))
+        self.assertTrue(edit_leases.acquire(self.design.id, str(self.obj.id).upper(), 'alice')[0])
+
+        self.assertFalse(edit_leases.release(self.design.id, self.obj.id, 'bob'))
+        self.assertTrue(edit_leases.release(self.design.id, self.obj.id, 'alice'))
+        self.assertTrue(edit_leases.acquire(self.design.id, self.obj.id, 'bob')[0])
+
+    @override_settings(COLLABORATION={'LEASE_TTL': 0.05})
+    def test_lease_lapses_without_renewal(self):
+        edit_leases.acquire(self.design.id, self.obj.id, 'alice')
+        time.sleep(0.1)
+        self.assertIsNone(edit_leases.conflict(self.design.id, self.obj.id, 'bob'))
+
+    def test_only_one_of_racing_users_is_granted(self):
+        results = []
+        threads = [
+            threading.Thread(target=lambda u=user: results.append(edit_leases.acquire(self.design.id, self.obj.id, u)))
+            for user in ('alice', 'bob', 'carol', 'dave')
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        holder = edit_leases.holder(self.design.id, self.obj.id)['userId']
+        self.assertEqual([lease['userId'] for granted, lease in results if granted], [holder])
+        self.assertTrue(all(lease['userId'] == holder for _, lease in results))
+
+    def test_layer_and_bulk_writes_by_others_are_refused(self):
+        other = self.create_object(self.design, z_index=1, properties={'fill': '#ff0000'})
+        edit_leases.acquire(self.design.id, self.obj.id, 'alice')
+        self.obj.properties = {'fill': '#fe0000'}
+        self.obj.save()
+        base = f'/api/designs/{self.design.id}/'
+        requests = [
+            (f'{base}layers/{self.obj.id}/lock/', {}),
+            (f'{base}layers/{self.obj.id}/toggle-visibility/', {}),
+            (f'{base}layers/reorder/', {'objectId': str(self.obj.id), 'newZIndex': 1}),
+            (f'{base}layers/group/', {'objectIds': [str(self.obj.id), str(other.id)]}),
+            (f'{base}transform/align/', {'objectIds': [str(self.obj.id), str(other.id)], 'alignment': 'left'}),
+            (f'{base}colors/consolidate/', {'mapping': {'#fe0000': '#ff0000'}}),
+        ]
+        for url, data in requests:
+            response = self.client.post(url, {**data, 'user_id': 'bob'}, content_type='application/json')
+            self.assertEqual((url, response.status_code), (url, 409))
+            self.assertEqual(response.json()['lease']['userId'], 'alice')
+        self.obj.refresh_from_db()
+        self.assertEqual((self.obj.locked, self.obj.visible, self.obj.z_index), (False, True, 0))
+        self.assertEqual(self.obj.properties, {'fill': '#fe0000'})
+
+        response = self.client.post(f'{base}layers/{self.obj.id}/lock/', {'user_id': 'alice'},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_writes_by_others_are_refused(self):
+        url = f'/api/designs/{self.design.id}/objects/{self.obj.id}/'
+        response = self.client.post(url + 'lease/', {'user_id': 'alice'}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.post(url + 'lease/', {'user_id': 'bob'}, content_type='application/json')
+        self.assertEqual((response.status_code, response.json()['lease']['userId']), (409, 'alice'))
+
+        response = self.client.put(url, {'x': 5, 'user_id': 'bob'}, content_type='application/json')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(
+            self.client.delete(url, {'user_id': 'bob'}, content_type='application/json').status_code, 409
+        )
+        with self.assertRaisesMessage(OperationError, 'Object is being edited by alice'):
+            operation_service.apply(self.design.id, 'bob', {
+                'op': 'patch', 'objectId': str(self.obj.id), 'data': {'x': 5}
+            })
+        response = self.client.put(url, {'x': 5, 'user_id': 'alice'}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+
+        self.client.delete(url + 'lease/?user_id=alice')
+        response = self.client.put(url, {'x': 6, 'user_id': 'bob'}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(COLLABORATION={'LEASE_TTL': 10, 'WRITE_BEHIND_INTERVAL': 0})
+class EditLeaseSocketTestCase(TransactionTestCase):
+    """Test cases for edit leases over the design WebSocket."""
+
+    async def test_leases_are_broadcast_and_released_on_disconnect(self):
+        reset_lease_store()
+        design = await Design.objects.acreate(user_id='owner', name='Leased', width=8.5, height=11)
+        obj = await DesignObject.objects.acreate(
+            design=design, type='shape', x=0, y=0, width=1, height=1, z_index=0, properties={}
+        )
+        alice = await connect(str(design.id))
+        bob = await connect(str(design.id))
+        await alice.send_json_to({'type': 'lease:acquire', 'objectId': str(obj.id), 'userId': 'alice'})
+        frames = await receive_all(bob)
+        self.assertEqual([(f['type'], f['userId']) for f in frames], [('lease:acquired', 'alice')])
+        await receive_all(alice)
+
+        await bob.send_json_to({'type': 'lease:acquire', 'objectId': str(obj.id), 'userId': 'bob'})
+        await bob.send_json_to({
+            'type': 'object:op', 'op': 'patch', 'objectId': str(obj.id), 'clientOpId': 'b1',
+            'userId': 'bob', 'data': {'x': 3}
+        })
+        frames = await receive_all(bob)
+        self.assertEqual([f['type'] for f in frames], ['lease:denied', 'object:op:rejected'])
+        self.assertEqual(frames[0]['lease']['userId'], 'alice')
+        self.assertEqual(await receive_all(alice), [])
+
+        await alice.disconnect()
+        frames = await receive_all(bob)
+        self.assertIn({'type': 'lease:released', 'objectId': str(obj.id), 'userId': 'alice'}, frames)
+        await bob.disconnect()
@@ -1,6 +1,7 @@
 from django.urls import path
 from app.collaboration.views import (
-    CollaboratorViewSet, CommentViewSet, VersionViewSet
+    CollaboratorViewSet, CommentViewSet, VersionViewSet, OperationViewSet, ChangeLogViewSet,
+    ObjectLeaseViewSet
 )
 
 urlpatterns = [
@@ -16,6 +17,9 @@ urlpatterns = [
     path('api/designs/<str:design_id>/comments/', 
          CommentViewSet.as_view({'get': 'list', 'post': 'create'}), 
          name='comment-list'),
+    path('api/designs/<str:design_id>/comments/threads/', 
+         CommentViewSet.as_view({'get': 'threads'}), 
+         name='comment-threads'),
     # Comment resolve - can be accessed via /api/comments/:id/resolve or /api/designs/:designId/comments/:id/resolve
     path('api/comments/<uuid:pk>/resolve/', 
          CommentViewSet.as_view({'post': 'resolve'}), 
@@ -32,4 +36,19 @@ urlpatterns = [
     path('api/versions/<uuid:pk>/restore/', 
          VersionViewSet.as_view({'post': 'restore'}), 
          name='version-restore'),
+    
+    # Object operation log - mounted at /api/designs/
+    path('api/designs/<str:design_id>/operations/', 
+         OperationViewSet.as_view({'get': 'list'}), 
+         name='operation-list'),
+    
+    # Change log - mounted at /api/designs/
+    path('api/designs/<str:design_id>/changes/', 
+         ChangeLogViewSet.as_view({'get': 'list'}), 
+         name='change-log-list'),
+    
+    # Object edit leases - mounted at /api/designs/
+    path('api/designs/<str:design_id>/objects/<uuid:object_id>/lease/', 
+         ObjectLeaseViewSet.as_view({'post': 'create', 'delete': 'destroy'}), 
+         name='object-lease'),
 ]
@@ -2,18 +2,28 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from django.shortcuts import get_object_or_404
 from django.db import IntegrityError
-from app.designs.models import Design
+from app.designs.models import Design, DesignObject
 from app.collaboration.models import (
     DesignCollaborator, DesignComment, DesignVersion
 )
 from app.collaboration.serializers import (
     CollaboratorSerializer, CollaboratorCreateSerializer,
     CommentSerializer, CommentCreateSerializer,
-    VersionSerializer, VersionCreateSerializer
+    VersionSummarySerializer, VersionCreateSerializer
 )
 from app.collaboration.services import get_actual_design_id, ensure_design_exists
+from app.collaboration.roles import role_service
+from app.collaboration.comments import comment_thread_service, comments_in_viewport, parse_bbox
+from app.collaboration.change_log import change_log, change_log_service
+from app.collaboration.leases import edit_leases
+from app.collaboration.outbox import design_outbox
+from app.collaboration.operations import OperationError, operation_service
+from app.collaboration.version_store import VersionChainError, version_store
 
 
 class CollaboratorViewSet(viewsets.ViewSet):
@@ -62,6 +72,8 @@ class CollaboratorViewSet(viewsets.ViewSet):
                     'invited_by': invited_by,
                 }
             )
+            role_service.invalidate(actual_design_id, user_id)
+            change_log.record(actual_design_id, 'collaborator_added', user_id=invited_by, description=f'{user_id} as {role}')
             
             response_serializer = CollaboratorSerializer(collaborator)
             return Response({'success': True, 'collaborator': response_serializer.data}, status=status.HTTP_201_CREATED)
@@ -74,7 +86,7 @@ class CollaboratorViewSet(viewsets.ViewSet):
     def destroy(self, request, design_id=None, user_id=None):
         """
         Remove a collaborator from a design.
-        DELETE /api/designs/:designId/collaborators/:userId/
+        DELETE /api/designs/:designId/collaborators/:userId/?removed_by=:userId
         """
         actual_design_id = get_actual_design_id(design_id)
         if not actual_design_id:
@@ -86,6 +98,9 @@ class CollaboratorViewSet(viewsets.ViewSet):
         try:
             collaborator = DesignCollaborator.objects.get(design_id=actual_design_id, user_id=user_id)
             collaborator.delete()
+            role_service.invalidate(actual_design_id, user_id)
+            removed_by = request.query_params.get('removed_by', request.data.get('removed_by', 'default-user'))
+            change_log.record(actual_design_id, 'collaborator_removed', user_id=removed_by, description=user_id)
             return Response({'success': True}, status=status.HTTP_200_OK)
         except DesignCollaborator.DoesNotExist:
             return Response(
@@ -103,20 +118,59 @@ class CommentViewSet(viewsets.ViewSet):
     def list(self, request, design_id=None):
         """
         Get all comments for a design (flat list with parent_id for frontend to build tree).
-        GET /api/designs/:designId/comments/
+        GET /api/designs/:designId/comments/?bbox=minX,minY,maxX,maxY
+        With bbox, only threads pinned in the box or on objects overlapping it.
         """
         actual_design_id = get_actual_design_id(design_id)
         if not actual_design_id:
             return Response({'success': True, 'comments': []}, status=status.HTTP_200_OK)
         
-        # Get ALL comments (frontend will build the tree structure)
-        comments = DesignComment.objects.filter(
-            design_id=actual_design_id
-        ).order_by('-created_at')
+        bbox = request.query_params.get('bbox')
+        if bbox is not None:
+            try:
+                comments = comments_in_viewport(actual_design_id, parse_bbox(bbox))
+            except ValueError as e:
+                return Response(
+                    {'success': False, 'error': str(e)},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        else:
+            # Get ALL comments (frontend will build the tree structure)
+            comments = DesignComment.objects.filter(design_id=actual_design_id)
+        comments = comments.order_by('-created_at')
         
         serializer = CommentSerializer(comments, many=True)
         return Response({'success': True, 'comments': serializer.data})
     
+    @action(detail=False, methods=['get'], url_path='threads')
+    def threads(self, request, design_id=None):
+        """
+        Get top-level comments newest first, each with its reply tree.
+        GET /api/designs/:designId/comments/threads/?cursor=&limit=&resolved=&object_id=&bbox=
+        """
+        actual_design_id = get_actual_design_id(design_id)
+        if not actual_design_id:
+            return Response({'success': True, 'threads': [], 'nextCursor': None}, status=status.HTTP_200_OK)
+        
+        params = request.query_params
+        resolved = params.get('resolved')
+        try:
+            limit = int(params['limit']) if 'limit' in params else None
+            result = comment_thread_service.page(
+                actual_design_id,
+                cursor=params.get('cursor'),
+                limit=limit,
+                resolved=None if resolved is None else resolved.lower() == 'true',
+                object_id=params.get('object_id'),
+                bbox=parse_bbox(params['bbox']) if 'bbox' in params else None,
+            )
+        except ValueError as e:
+            return Response(
+                {'success': False, 'error': str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response({'success': True, **result})
+    
     def create(self, request, design_id=None):
         """
         Create a comment on a design.
@@ -204,15 +258,17 @@ class VersionViewSet(viewsets.ViewSet):
     
     def list(self, request, design_id=None):
         """
-        Get all versions for a design.
+        Get version metadata for a design; snapshots are not included.
         GET /api/designs/:designId/versions/
         """
         actual_design_id = get_actual_design_id(design_id)
         if not actual_design_id:
             return Response({'success': True, 'versions': []}, status=status.HTTP_200_OK)
         
-        versions = DesignVersion.objects.filter(design_id=actual_design_id).order_by('-version_number')
-        serializer = VersionSerializer(versions, many=True)
+        versions = DesignVersion.objects.filter(
+            design_id=actual_design_id
+        ).defer('snapshot', 'data').order_by('-version_number')
+        serializer = VersionSummarySerializer(versions, many=True)
         return Response({'success': True, 'versions': serializer.data})
     
     def create(self, request, design_id=None):
@@ -231,20 +287,16 @@ class VersionViewSet(viewsets.ViewSet):
             actual_design_id = ensure_design_exists(design_id, user_id)
             design = Design.objects.get(id=actual_design_id)
             
-            # Get next version number
-            last_version = DesignVersion.objects.filter(design=design).order_by('-version_number').first()
-            next_version = (last_version.version_number + 1) if last_version else 1
-            
-            # Create version
-            version = DesignVersion.objects.create(
-                design=design,
-                version_number=next_version,
-                created_by=user_id,
-                snapshot=serializer.validated_data['snapshot'],
-                description=serializer.validated_data.get('description', ''),
+            # Stored as a keyframe or a diff from the previous version
+            version = version_store.create(
+                design,
+                user_id,
+                serializer.validated_data['snapshot'],
+                serializer.validated_data.get('description', ''),
             )
+            change_log.record(design.id, 'version_created', user_id=user_id, description=f'Version {version.version_number}')
             
-            response_serializer = VersionSerializer(version)
+            response_serializer = VersionSummarySerializer(version)
             return Response({'success': True, 'version': response_serializer.data}, status=status.HTTP_201_CREATED)
         except Exception as e:
             return Response(
@@ -255,14 +307,150 @@ class VersionViewSet(viewsets.ViewSet):
     @action(detail=True, methods=['post'], url_path='restore')
     def restore(self, request, design_id=None, pk=None):
         """
-        Restore a version.
-        POST /api/designs/:designId/versions/:id/restore
+        Restore a version: the design's objects are rewritten to match it
+        and the room is sent one design:restored event.
+        POST /api/versions/:id/restore
         """
         try:
             version = DesignVersion.objects.get(id=pk)
-            return Response({'success': True, 'snapshot': version.snapshot})
         except DesignVersion.DoesNotExist:
             return Response(
                 {'success': False, 'error': 'Version not found'},
                 status=status.HTTP_404_NOT_FOUND
             )
+        
+        user_id = request.data.get('user_id', 'default-user')
+        try:
+            restored = version_store.restore(version, user_id)
+        except OperationError as e:
+            return Response(
+                {'success': False, 'error': str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        except VersionChainError as e:
+            return Response(
+                {'success': False, 'error': str(e)},
+                status=status.HTTP_409_CONFLICT
+            )
+        return Response({'success': True, **restored})
+
+
+class OperationViewSet(viewsets.ViewSet):
+    """
+    ViewSet for reading a design's object operation log.
+    """
+    permission_classes = [AllowAny]  # For MVP - can be changed to [HasDesignPermission] later
+    
+    def list(self, request, design_id=None):
+        """
+        Get operations after a sequence number, oldest first.
+        GET /api/designs/:designId/operations/?after=:seq&limit=:n
+        """
+        actual_design_id = get_actual_design_id(design_id)
+        if not actual_design_id:
+            return Response(
+                {'success': False, 'error': 'Design not found'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        
+        try:
+            after = int(request.query_params.get('after', 0))
+            limit = int(request.query_params['limit']) if 'limit' in request.query_params else None
+        except ValueError:
+            return Response(
+                {'success': False, 'error': 'after and limit must be integers'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        result = operation_service.since(actual_design_id, after, limit)
+        return Response({'success': True, **result})
+
+
+class ChangeLogViewSet(viewsets.ViewSet):
+    """
+    ViewSet for reading a design's change log.
+    """
+    permission_classes = [AllowAny]  # For MVP - can be changed to [HasDesignPermission] later
+    
+    def list(self, request, design_id=None):
+        """
+        Stream changes in a time range, oldest first.
+        GET /api/designs/:designId/changes/?since=:iso&until=:iso
+        """
+        actual_design_id = get_actual_design_id(design_id)
+        if not actual_design_id:
+            return Response(
+                {'success': False, 'error': 'Design not found'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        
+        bounds = {}
+        for name in ('since', 'until'):
+            value = request.query_params.get(name)
+            if value is None:
+                bounds[name] = None
+                continue
+            parsed = parse_datetime(value)
+            if parsed is None:
+                return Response(
+                    {'success': False, 'error': f'{name} must be an ISO 8601 datetime'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            bounds[name] = parsed if timezone.is_aware(parsed) else timezone.make_aware(parsed)
+        
+        changes = change_log_service.between(actual_design_id, bounds['since'], bounds['until'])
+        return StreamingHttpResponse(
+            change_log_service.stream_json(changes), content_type='application/json'
+        )
+
+
+class ObjectLeaseViewSet(viewsets.ViewSet):
+    """
+    ViewSet for edit leases on design objects.
+    """
+    permission_classes = [AllowAny]  # For MVP - can be changed to [IsDesignEditor] later
+    
+    def create(self, request, design_id=None, object_id=None):
+        """
+        Acquire or renew the edit lease on an object.
+        POST /api/designs/:designId/objects/:objectId/lease/
+        """
+        actual_design_id = get_actual_design_id(design_id)
+        if not actual_design_id or not DesignObject.objects.filter(
+            id=object_id, design_id=actual_design_id
+        ).exists():
+            return Response(
+                {'success': False, 'error': 'Object not found'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        user_id = request.data.get('user_id', 'default-user')
+        
+        granted, lease = edit_leases.acquire(actual_design_id, object_id, user_id)
+        if not granted:
+            return Response(
+                {'success': False, 'error': f"Object is being edited by {lease['userId']}", 'lease': lease},
+                status=status.HTTP_409_CONFLICT
+            )
+        design_outbox.enqueue(f'design_{actual_design_id}', {'type': 'lease:acquired', **lease})
+        return Response({'success': True, 'lease': lease}, status=status.HTTP_200_OK)
+    
+    def destroy(self, request, design_id=None, object_id=None):
+        """
+        Release the edit lease on an object.
+        DELETE /api/designs/:designId/objects/:objectId/lease/?user_id=:userId
+        """
+        actual_design_id = get_actual_design_id(design_id)
+        if not actual_design_id:
+            return Response(
+                {'success': False, 'error': 'Design not found'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        user_id = request.query_params.get('user_id', 'default-user')
+        
+        if edit_leases.release(actual_design_id, object_id, user_id):
+            design_outbox.enqueue(f'design_{actual_design_id}', {
+                'type': 'lease:released',
+                'objectId': str(object_id),
+                'userId': user_id
+            })
+        return Response({'success': True}, status=status.HTTP_200_OK)
@@ -0,0 +1,236 @@
+"""
+Write-Behind Buffer - Coalesce high-frequency object edits before persisting
+"""
+import asyncio
+import atexit
+import logging
+import threading
+import uuid
+from datetime import timedelta
+from typing import Any, Dict, Iterable, List, Set
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from app.designs.models import DesignObject
+from app.designs.serializers import DesignObjectUpdateSerializer
+from app.collaboration.models import DesignOperation
+
+logger = logging.getLogger(__name__)
+
+
+def write_behind_config() -> Dict[str, float]:
+    config = getattr(settings, 'COLLABORATION', {}) or {}
+    return {
+        'interval': float(config.get('WRITE_BEHIND_INTERVAL', 0.5)),
+        'max_pending': int(config.get('WRITE_BEHIND_MAX_PENDING', 500)),
+    }
+
+
+class WriteBehindBuffer:
+    """
+    Dirty object rows held in memory until the next flush.
+    
+    Patches are applied to a cached DesignObject and only the touched fields
+    are remembered, so any number of edits to one object cost one row in
+    one bulk_update. The operation log is written synchronously with
+    applied=False for every buffered edit; a flush marks those operations
+    applied, and replay_pending_operations re-applies any a crashed process
+    never flushed.
+    
+    Writes that bypass the buffer (REST edits, restores) call settle()
+    first and are logged as applied operations. A flush leaves out fields
+    that an applied operation newer than the buffered edit has written,
+    so edits flushed late, e.g. by another worker, never overwrite them.
+    """
+    
+    def __init__(self):
+        self.lock = threading.RLock()
+        # object id -> {'object', 'fields': {name: seq}, 'operations'}
+        self.entries: Dict[uuid.UUID, Dict[str, Any]] = {}
+        self.flushers: Dict[int, asyncio.Task] = {}
+    
+    def get_object(self, design_id: Any, object_id: uuid.UUID) -> DesignObject:
+        """The buffered instance of an object, loading it on first edit"""
+        with self.lock:
+            entry = self.entries.get(object_id)
+        if entry is not None and str(entry['object'].design_id) == str(design_id):
+            return entry['object']
+        return DesignObject.objects.get(id=object_id, design_id=design_id)
+    
+    def record(self, obj: DesignObject, fields: Set[str], operation_id: int, seq: int) -> int:
+        """Remember edit seq to obj; returns the number of dirty objects"""
+        with self.lock:
+            entry = self.entries.setdefault(obj.id, {
+                'object': obj, 'fields': {}, 'operations': []
+            })
+            entry['object'] = obj
+            entry['fields'].update(dict.fromkeys(fields, seq))
+            entry['operations'].append(operation_id)
+            return len(self.entries)
+    
+    def pending(self, design_id: Any = None) -> int:
+        with self.lock:
+            if design_id is None:
+                return len(self.entries)
+            return sum(1 for e in self.entries.values() if str(e['object'].design_id) == str(design_id))
+    
+    def settle(self, design_id: Any) -> None:
+        """Flush a design's buffered edits, if any, before reading or writing its objects"""
+        if self.pending(design_id):
+            self.flush(design_id)
+    
+    def flush(self, design_id: Any = None) -> int:
+        """Write dirty objects (of one design, or all) in batched bulk_updates"""
+        with self.lock:
+            taken = {
+                object_id: entry for object_id, entry in self.entries.items()
+                if design_id is None or str(entry['object'].design_id) == str(design_id)
+            }
+            for object_id in taken:
+                del self.entries[object_id]
+        if not taken:
+            return 0
+        
+        operation_ids = [op_id for entry in taken.values() for op_id in entry['operations']]
+        try:
+            with transaction.atomic():
+                # bulk_update writes the same columns for every row, so group rows by
+                # their dirty fields rather than overwrite fields they never touched
+                groups: Dict[frozenset, List[DesignObject]] = {}
+                for entry, fields in self.unwritten(taken.values()):
+                    groups.setdefault(frozenset(fields) | {'updated_at'}, []).append(entry['object'])
+                for fields, objects in groups.items():
+                    DesignObject.objects.bulk_update(objects, sorted(fields), batch_size=500)
+                DesignOperation.objects.filter(id__in=operation_ids).update(applied=True)
+        except Exception:
+            # Keep the edits for the next attempt unless newer ones replaced them
+            with self.lock:
+                for object_id, entry in taken.items():
+                    newer = self.entries.get(object_id)
+                    if newer is None:
+                        self.entries[object_id] = entry
+                    else:
+                        newer['fields'] = {**entry['fields'], **newer['fields']}
+                        newer['operations'][:0] = entry['operations']
+            raise
+        return len(taken)
+    
+    @staticmethod
+    def unwritten(entries: Iterable[Dict[str, Any]]):
+        """Each entry with the fields no newer applied operation has written"""
+        by_design: Dict[Any, List[Dict[str, Any]]] = {}
+        for entry in entries:
+            by_design.setdefault(entry['object'].design_id, []).append(entry)
+        for design_id, group in by_design.items():
+            oldest = min(seq for entry in group for seq in entry['fields'].values())
+            writes = later_writes(design_id, oldest)
+            for entry in group:
+                written = writes.get(str(entry['object'].id), {})
+                if DELETED in written:
+                    continue
+                fields = [
+                    name for name, seq in entry['fields'].items()
+                    if written.get(name, 0) <= seq
+                ]
+                if fields:
+                    yield entry, fields
+    
+    def ensure_flusher(self) -> None:
+        """Start the periodic flush on the running event loop if it is not running"""
+        loop = asyncio.get_running_loop()
+        task = self.flushers.get(id(loop))
+        if task is None or task.done():
+            self.flushers[id(loop)] = loop.create_task(self.run_flusher())
+    
+    async def run_flusher(self) -> None:
+        interval = write_behind_config()['interval']
+        while self.pending():
+            await asyncio.sleep(interval)
+            try:
+                await database_sync_to_async(self.flush)()
+            except Exception:
+                logger.exception('Write-behind flush failed')
+    
+    def flush_at_exit(self) -> None:
+        try:
+            self.flush()
+        except Exception:
+            logger.exception('Write-behind flush at exit failed')
+
+
+def apply_fields(obj: DesignObject, payload: Dict[str, Any]) -> Set[str]:
+    """Set logged patch fields on obj; returns the fields set"""
+    data = {name: value for name, value in payload.items() if name != 'updated_at'}
+    serializer = DesignObjectUpdateSerializer(obj, data=data, partial=True)
+    serializer.is_valid(raise_exception=True)
+    for name, value in serializer.validated_data.items():
+        setattr(obj, name, value)
+    return set(serializer.validated_data)
+
+
+# Marks an object deleted in the result of later_writes
+DELETED = '__deleted__'
+
+
+def later_writes(design_id: Any, after: int) -> Dict[str, Dict[str, int]]:
+    """
+    Fields written by the design's applied operations with seq > after.
+    
+    Returns {object id: {field: seq of the last write}}; a deleted object
+    also maps DELETED to the seq that deleted it.
+    """
+    writes: Dict[str, Dict[str, int]] = {}
+    
+    def wrote(object_id: Any, fields: Iterable[str], seq: int) -> None:
+        writes.setdefault(str(object_id), {}).update(dict.fromkeys(fields, seq))
+    
+    for seq, op, object_id, payload in DesignOperation.objects.filter(
+        design_id=design_id, seq__gt=after, applied=True
+    ).order_by('seq').values_list('seq', 'op', 'object_id', 'payload'):
+        if op in ('create', 'patch'):
+            wrote(object_id, payload, seq)
+        elif op == 'delete':
+            wrote(object_id, [DELETED], seq)
+        elif op == 'reorder':
+            for reordered in payload.get('zIndex', {}):
+                wrote(reordered, ['z_index'], seq)
+        elif op == 'restore':
+            for updated, fields in payload.get('updated', {}).items():
+                wrote(updated, fields, seq)
+            for deleted in payload.get('deleted', []):
+                wrote(deleted, [DELETED], seq)
+    return writes
+
+
+def replay_pending_operations(older_than: float = 60.0) -> int:
+    """
+    Apply buffered patches that were logged but never flushed.
+    
+    Only operations older than older_than seconds are replayed, so live
+    processes get to flush their own buffers first. A field that a later
+    applied operation already wrote is left alone. Returns the number of
+    operations replayed.
+    """
+    cutoff = timezone.now() - timedelta(seconds=older_than)
+    pending = list(
+        DesignOperation.objects.filter(applied=False, created_at__lt=cutoff).order_by('design_id', 'seq')
+    )
+    replayed = 0
+    for operation in pending:
+        with transaction.atomic():
+            overwritten = later_writes(operation.design_id, operation.seq).get(str(operation.object_id), {})
+            deleted = DELETED in overwritten
+            obj = None if deleted else DesignObject.objects.filter(id=operation.object_id).first()
+            if obj is not None:
+                payload = {k: v for k, v in operation.payload.items() if k not in overwritten}
+                fields = apply_fields(obj, payload)
+                if fields:
+                    obj.save(update_fields=sorted(fields | {'updated_at'}))
+            DesignOperation.objects.filter(id=operation.id).update(applied=True)
+            replayed += 1
+    return replayed
+
+
+write_behind_buffer = WriteBehindBuffer()
+atexit.register(write_behind_buffer.flush_at_exit)
@@ -0,0 +1,190 @@
+"""
+Color Cache - Memoization layer for color computations
+Designs reuse a small set of colors, so conversions, validations, contrast
+checks and harmonies are cached on normalized inputs.
+"""
+import copy
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import wraps
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+HEX_DIGITS = frozenset('0123456789abcdef')
+
+_MISSING = object()
+
+
+def normalize_hex(color: Any) -> Optional[str]:
+    """
+    Normalize a hex color to lowercase '#rrggbb'.
+    
+    Returns None for anything that is not a 6-digit hex color so that
+    callers skip the cache and let the underlying computation raise.
+    """
+    if not isinstance(color, str):
+        return None
+    value = color.strip().lstrip('#').lower()
+    if len(value) != 6 or not HEX_DIGITS.issuperset(value):
+        return None
+    return f'#{value}'
+
+
+class ColorComputationCache:
+    """
+    Size-bounded, thread-safe LRU shared by all color operations.
+    
+    Entries are keyed on (operation, normalized params). When a Django cache
+    alias is configured it is used as a second, cross-process level behind
+    the in-process LRU. Hits and misses are counted per operation.
+    """
+    
+    KEY_PREFIX = 'colors:v1'
+    
+    def __init__(
+        self,
+        max_size: int = 4096,
+        backend: Optional[str] = None,
+        timeout: Optional[int] = 3600
+    ):
+        self.max_size = max_size
+        self.backend = backend
+        self.timeout = timeout
+        self._entries: 'OrderedDict[Tuple[str, Tuple[Any, ...]], Any]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[str, int]] = {}
+    
+    @classmethod
+    def from_settings(cls) -> 'ColorComputationCache':
+        """Build the cache from settings.COLOR_CACHE"""
+        from django.conf import settings
+        
+        config = getattr(settings, 'COLOR_CACHE', {}) if settings.configured else {}
+        return cls(
+            max_size=config.get('MAX_SIZE', 4096),
+            backend=config.get('BACKEND'),
+            timeout=config.get('TIMEOUT', 3600)
+        )
+    
+    def get_or_compute(
+        self,
+        operation: str,
+        params: Tuple[Any, ...],
+        compute: Callable[[], Any]
+    ) -> Any:
+        """Return the cached result for (operation, params), computing it on a miss"""
+        value = self.get(operation, params, _MISSING)
+        if value is not _MISSING:
+            return value
+        
+        key = (operation, params)
+        remote = self._remote()
+        value = compute()
+        with self._lock:
+            self._count(operation, 'misses')
+        self._store(key, value)
+        if remote is not None:
+            remote.set(self._remote_key(key), value, self.timeout)
+        return copy.deepcopy(value)
+    
+    def get(self, operation: str, params: Tuple[Any, ...], default: Any = None) -> Any:
+        """Return a cached result without computing it; does not count a miss"""
+        key = (operation, params)
+        with self._lock:
+            value = self._entries.get(key, _MISSING)
+            if value is not _MISSING:
+                self._entries.move_to_end(key)
+                self._count(operation, 'hits')
+                return copy.deepcopy(value)
+        remote = self._remote()
+        if remote is not None:
+            value = remote.get(self._remote_key(key), _MISSING)
+            if value is not _MISSING:
+                self._store(key, value)
+                with self._lock:
+                    self._count(operation, 'remoteHits')
+                return copy.deepcopy(value)
+        return default
+    
+    def _store(self, key: Tuple[str, Tuple[Any, ...]], value: Any) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+    
+    def _count(self, operation: str, counter: str) -> None:
+        """Increment a counter; caller holds the lock"""
+        counters = self._counters.setdefault(
+            operation, {'hits': 0, 'remoteHits': 0, 'misses': 0}
+        )
+        counters[counter] += 1
+    
+    def _remote(self):
+        if not self.backend:
+            return None
+        from django.core.cache import caches
+        return caches[self.backend]
+    
+    def _remote_key(self, key: Tuple[str, Tuple[Any, ...]]) -> str:
+        digest = hashlib.sha1(repr(key[1]).encode()).hexdigest()
+        return f'{self.KEY_PREFIX}:{key[0]}:{digest}'
+    
+    def clear(self) -> None:
+        """Drop all local entries and reset counters"""
+        with self._lock:
+            self._entries.clear()
+            self._counters.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters per operation and in total"""
+        with self._lock:
+            operations = {}
+            total_hits = total_misses = 0
+            for operation, counters in self._counters.items():
+                hits = counters['hits'] + counters['remoteHits']
+                lookups = hits + counters['misses']
+                operations[operation] = {
+                    **counters,
+                    'hitRate': round(hits / lookups, 4) if lookups else 0.0
+                }
+                total_hits += hits
+                total_misses += counters['misses']
+            total = total_hits + total_misses
+            return {
+                'hits': total_hits,
+                'misses': total_misses,
+                'hitRate': round(total_hits / total, 4) if total else 0.0,
+                'size': len(self._entries),
+                'maxSize': self.max_size,
+                'backend': self.backend or 'local',
+                'operations': operations
+            }
+
+
+color_cache = ColorComputationCache.from_settings()
+
+
+def memoize(operation: str, key_func: Callable[..., Optional[Tuple[Any, ...]]]):
+    """
+    Memoize a method through the shared color cache.
+    
+    key_func receives the method arguments and returns the normalized params
+    tuple, or None (or a tuple containing None) to bypass the cache.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            params = key_func(*args, **kwargs)
+            if params is None or any(p is None for p in params):
+                return func(*args, **kwargs)
+            try:
+                hash(params)
+            except TypeError:
+                return func(*args, **kwargs)
+            return color_cache.get_or_compute(
+                operation, params, lambda: func(*args, **kwargs)
+            )
+        return wrapper
+    return decorator
@@ -0,0 +1,279 @@
+"""
+Color Management - ICC profile based color conversion
+Profiles are loaded from disk once and transforms are built once per
+(source, destination, intent), then reused for single colors, arrays and images.
+"""
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from app.colors import vectorized
+
+try:
+    from PIL import Image, ImageCms
+except ImportError:  # Pillow missing or built without LittleCMS
+    Image = ImageCms = None
+
+
+SRGB = 'srgb'
+
+PROFILE_EXTENSIONS = ('.icc', '.icm')
+
+RENDERING_INTENTS = {
+    'perceptual': 0,
+    'relative': 1,
+    'saturation': 2,
+    'absolute': 3,
+}
+
+# ICC color space signatures to Pillow image modes
+COLOR_SPACE_MODES = {
+    'RGB': 'RGB',
+    'CMYK': 'CMYK',
+    'GRAY': 'L',
+    'LAB': 'LAB',
+}
+
+
+class UnknownProfileError(ValueError):
+    """Raised when a profile name or rendering intent is not available"""
+
+
+def profile_key(name: str) -> str:
+    """Normalize a profile name or file name to its lookup key"""
+    base = os.path.basename(name.strip())
+    stem, ext = os.path.splitext(base)
+    if ext.lower() in PROFILE_EXTENSIONS:
+        base = stem
+    return base.lower()
+
+
+class ColorManagementService:
+    """
+    Registry of ICC profiles and cache of color transforms.
+    
+    Profiles come from PROFILE_DIR (every .icc/.icm file, keyed by its
+    lowercased file name) and the explicit PROFILES mapping; sRGB is built
+    in. Conversions to or from CMYK use the named profile and fall back to
+    the naive ColorConversion formulas when no profile is selected or
+    LittleCMS is unavailable.
+    """
+    
+    def __init__(
+        self,
+        profile_dir: Optional[str] = None,
+        profiles: Optional[Dict[str, str]] = None,
+        default_cmyk_profile: Optional[str] = None,
+        default_intent: str = 'relative'
+    ):
+        self.profile_dir = profile_dir
+        self.extra_profiles = profiles or {}
+        self.default_cmyk_profile = default_cmyk_profile
+        self.default_intent = default_intent
+        self._lock = threading.RLock()
+        self._paths: Optional[Dict[str, str]] = None
+        self._profiles: Dict[str, Any] = {}
+        self._transforms: Dict[Tuple[str, str, int], Any] = {}
+    
+    @classmethod
+    def from_settings(cls) -> 'ColorManagementService':
+        """Build the service from settings.COLOR_MANAGEMENT"""
+        from django.conf import settings
+        
+        config = getattr(settings, 'COLOR_MANAGEMENT', {}) if settings.configured else {}
+        return cls(
+            profile_dir=config.get('PROFILE_DIR'),
+            profiles=config.get('PROFILES'),
+            default_cmyk_profile=config.get('DEFAULT_CMYK_PROFILE'),
+            default_intent=config.get('RENDERING_INTENT', 'relative')
+        )
+    
+    @property
+    def enabled(self) -> bool:
+        """Whether ICC transforms can be built"""
+        return ImageCms is not None
+    
+    def _discover(self) -> Dict[str, str]:
+        """Map profile keys to file paths; scanned once"""
+        with self._lock:
+            if self._paths is None:
+                paths = {}
+                if self.profile_dir and os.path.isdir(self.profile_dir):
+                    for filename in sorted(os.listdir(self.profile_dir)):
+                        if filename.lower().endswith(PROFILE_EXTENSIONS):
+                            paths[profile_key(filename)] = os.path.join(self.profile_dir, filename)
+                for name, path in self.extra_profiles.items():
+                    paths[profile_key(name)] = path
+                self._paths = paths
+            return self._paths
+    
+    def reload(self) -> None:
+        """Forget discovered profiles and built transforms"""
+        with self._lock:
+            self._paths = None
+            self._profiles.clear()
+            self._transforms.clear()
+    
+    def has_profile(self, name: str) -> bool:
+        key = profile_key(name)
+        return key == SRGB or key in self._discover()
+    
+    def get_profile(self, name: str):
+        """Load an ICC profile by name, once"""
+        if not self.enabled:
+            raise UnknownProfileError('ICC color management is not available')
+        key = profile_key(name)
+        with self._lock:
+            profile = self._profiles.get(key)
+            if profile is None:
+                if key == SRGB:
+                    profile = ImageCms.ImageCmsProfile(ImageCms.createProfile('sRGB'))
+                else:
+                    path = self._discover().get(key)
+                    if path is None:
+                        raise UnknownProfileError(f'Unknown color profile: {name}')
+                    profile = ImageCms.getOpenProfile(path)
+                self._profiles[key] = profile
+            return profile
+    
+    def color_space(self, name: str) -> str:
+        """Pillow mode for the profile's color space, e.g. 'RGB' or 'CMYK'"""
+        space = self.get_profile(name).profile.xcolor_space.strip().upper()
+        mode = COLOR_SPACE_MODES.get(space)
+        if mode is None:
+            raise UnknownProfileError(f'Unsupported profile color space: {space}')
+        return mode
+    
+    def list_profiles(self) -> List[Dict[str, Any]]:
+        """Describe every available profile"""
+        names = [SRGB] + [key for key in self._discover() if key != SRGB]
+        default = profile_key(self.default_cmyk_profile) if self.default_cmyk_profile else None
+        result = []
+        for name in names:
+            entry = {
+                'name': name,
+                'builtin': name == SRGB,
+                'default': name == default,
+            }
+            if self.enabled:
+                try:
+                    profile = self.get_profile(name)
+                    entry['description'] = ImageCms.getProfileDescription(profile).strip()
+                    entry['colorSpace'] = self.color_space(name)
+                except (UnknownProfileError, OSError, ImageCms.PyCMSError) as e:
+                    entry['error'] = str(e)
+            result.append(entry)
+        return result
+    
+    def resolve_profile_name(self, name: Optional[str]) -> Optional[str]:
+        """
+        Resolve a requested CMYK output profile.
+        
+        None falls back to the configured default (which may itself be None
+        for the naive conversion). Unknown or non-CMYK profiles raise
+        UnknownProfileError.
+        """
+        if not name:
+            name = self.default_cmyk_profile
+            if not name or not self.has_profile(name):
+                return None
+        if not self.has_profile(name):
+            raise UnknownProfileError(f'Unknown color profile: {name}')
+        if self.enabled and self.color_space(name) != 'CMYK':
+            raise UnknownProfileError(f'Not a CMYK output profile: {name}')
+        return profile_key(name)
+    
+    def resolve_intent(self, intent: Optional[str]) -> int:
+        """Map an intent name ('perceptual', 'relative', ...) to its ICC code"""
+        name = (intent or self.default_intent).lower()
+        if name not in RENDERING_INTENTS:
+            raise UnknownProfileError(f'Unknown rendering intent: {intent}')
+        return RENDERING_INTENTS[name]
+    
+    def get_transform(self, source: str, destination: str, intent: Optional[str] = None):
+        """Build (once) and return the transform from source to destination"""
+        intent_code = self.resolve_intent(intent)
+        key = (profile_key(source), profile_key(destination), intent_code)
+        with self._lock:
+            transform = self._transforms.get(key)
+            if transform is None:
+                transform = ImageCms.buildTransform(
+                    self.get_profile(source),
+                    self.get_profile(destination),
+                    self.color_space(source),
+                    self.color_space(destination),
+                    renderingIntent=intent_code
+                )
+                self._transforms[key] = transform
+            return transform
+    
+    def transform_pixels(
+        self,
+        pixels: np.ndarray,
+        source: str,
+        destination: str,
+        intent: Optional[str] = None
+    ) -> np.ndarray:
+        """Transform an (N, channels) uint8 array between two profiles"""
+        transform = self.get_transform(source, destination, intent)
+        data = np.ascontiguousarray(pixels, dtype=np.uint8)
+        count = data.shape[0]
+        if count == 0:
+            return np.zeros((0, len(transform.output_mode)), dtype=np.uint8)
+        image = Image.frombytes(transform.input_mode, (count, 1), data.tobytes())
+        result = transform.apply(image)
+        return np.frombuffer(result.tobytes(), dtype=np.uint8).reshape(count, -1)
+    
+    def transform_image(
+        self,
+        image,
+        source: str,
+        destination: str,
+        intent: Optional[str] = None
+    ):
+        """Transform a whole PIL image between two profiles"""
+        transform = self.get_transform(source, destination, intent)
+        if image.mode != transform.input_mode:
+            image = image.convert(transform.input_mode)
+        return transform.apply(image)
+    
+    def rgb_to_cmyk(
+        self,
+        rgb: np.ndarray,
+        profile: Optional[str] = None,
+        intent: Optional[str] = None
+    ) -> np.ndarray:
+        """
+        Convert (N, 3) sRGB in 0-255 to rounded (N, 4) CMYK in 0-100.
+        Without a profile this is the naive ColorConversion formula.
+        """
+        if not profile or not self.enabled:
+            return vectorized.rgb_to_cmyk(rgb)
+        cmyk = self.transform_pixels(rgb, SRGB, profile, intent)
+        return np.rint(cmyk.astype(np.float64) * (100 / 255))
+    
+    def cmyk_to_rgb(
+        self,
+        cmyk: np.ndarray,
+        profile: Optional[str] = None,
+        intent: Optional[str] = None
+    ) -> np.ndarray:
+        """Convert (N, 4) CMYK in 0-100 to (N, 3) sRGB in 0-255"""
+        if not profile or not self.enabled:
+            return vectorized.cmyk_to_rgb(cmyk)
+        data = np.rint(np.asarray(cmyk, dtype=np.float64) * 2.55)
+        rgb = self.transform_pixels(np.clip(data, 0, 255), profile, SRGB, intent)
+        return rgb.astype(np.float64)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Counts of discovered profiles, loaded profiles and cached transforms"""
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'profiles': len(self._discover()) + 1,
+                'loadedProfiles': len(self._profiles),
+                'transforms': len(self._transforms),
+            }
+
+
+color_management = ColorManagementService.from_settings()
@@ -1,43 +1,171 @@
 """
 Color Conversion - Convert between color spaces
 Converted from TypeScript ColorConversion.ts
+
+The tuple functions below work on plain (r, g, b), (c, m, y, k) and
+(l, a, b) tuples or packed 0xRRGGBB integers and allocate no color objects;
+the ColorConversion methods are thin wrappers over them.
 """
 import math
-from typing import Dict, Any
+from typing import Dict, Any, Tuple
+
+
+RGBTuple = Tuple[int, int, int]
+CMYKTuple = Tuple[float, float, float, float]
+LABTuple = Tuple[float, float, float]
+
+_LAB_DELTA = 6 / 29
+_LAB_DELTA_CUBED = _LAB_DELTA ** 3
+_LAB_SLOPE = 3 * _LAB_DELTA ** 2
+
+_HEX_DIGITS = frozenset('0123456789abcdefABCDEF')
+
+
+def hex_to_rgb_tuple(hex_color: str) -> RGBTuple:
+    """Convert HEX to an (r, g, b) tuple"""
+    value = hex_to_packed(hex_color)
+    return (value >> 16, (value >> 8) & 0xFF, value & 0xFF)
+
+
+def hex_to_packed(hex_color: str) -> int:
+    """Convert HEX to a packed 0xRRGGBB integer"""
+    hex_color = hex_color.lstrip('#')
+    if len(hex_color) != 6 or not _HEX_DIGITS.issuperset(hex_color):
+        raise ValueError('Invalid hex color')
+    return int(hex_color, 16)
+
+
+def pack_rgb(r: int, g: int, b: int) -> int:
+    return (r << 16) | (g << 8) | b
+
+
+def unpack_rgb(packed: int) -> RGBTuple:
+    return (packed >> 16, (packed >> 8) & 0xFF, packed & 0xFF)
+
+
+def rgb_tuple_to_hex(r: float, g: float, b: float) -> str:
+    """Convert RGB components to HEX"""
+    return '#%02x%02x%02x' % (int(round(r)), int(round(g)), int(round(b)))
+
+
+def rgb_tuple_to_cmyk(r: int, g: int, b: int) -> CMYKTuple:
+    """Convert RGB components to a rounded (c, m, y, k) tuple"""
+    r = r / 255.0
+    g = g / 255.0
+    b = b / 255.0
+    
+    k = 1.0 - max(r, g, b)
+    
+    if k == 1.0:
+        return (0, 0, 0, 100)
+    
+    return (
+        round(((1.0 - r - k) / (1.0 - k)) * 100),
+        round(((1.0 - g - k) / (1.0 - k)) * 100),
+        round(((1.0 - b - k) / (1.0 - k)) * 100),
+        round(k * 100)
+    )
+
+
+def cmyk_tuple_to_rgb(c: float, m: float, y: float, k: float) -> RGBTuple:
+    """Convert CMYK components to a rounded (r, g, b) tuple"""
+    k = 1.0 - k / 100.0
+    return (
+        round(255 * (1.0 - c / 100.0) * k),
+        round(255 * (1.0 - m / 100.0) * k),
+        round(255 * (1.0 - y / 100.0) * k)
+    )
+
+
+def _lab_f(t: float) -> float:
+    return t ** (1/3) if t > _LAB_DELTA_CUBED else t / _LAB_SLOPE + 4 / 29
+
+
+def rgb_tuple_to_lab(r: int, g: int, b: int) -> LABTuple:
+    """Convert RGB components to an (l, a, b) tuple using D65 illuminant"""
+    # First convert RGB to XYZ
+    r = r / 255.0
+    g = g / 255.0
+    b = b / 255.0
+    
+    # Apply gamma correction
+    r = ((r + 0.055) / 1.055) ** 2.4 if r > 0.04045 else r / 12.92
+    g = ((g + 0.055) / 1.055) ** 2.4 if g > 0.04045 else g / 12.92
+    b = ((b + 0.055) / 1.055) ** 2.4 if b > 0.04045 else b / 12.92
+    
+    # Convert to XYZ (D65 illuminant), then to LAB against the D65 white
+    fx = _lab_f((r * 0.4124564 + g * 0.3575761 + b * 0.1804375) * 100 / 95.047)
+    fy = _lab_f((r * 0.2126729 + g * 0.7151522 + b * 0.072175) * 100 / 100.0)
+    fz = _lab_f((r * 0.0193339 + g * 0.119192 + b * 0.9503041) * 100 / 108.883)
+    
+    return (
+        round((116 * fy - 16) * 100) / 100,
+        round((500 * (fx - fy)) * 100) / 100,
+        round((200 * (fy - fz)) * 100) / 100
+    )
+
+
+def delta_e_lab(lab1: LABTuple, lab2: LABTuple) -> float:
+    """Delta E (CIE76) between two LAB tuples"""
+    return math.sqrt(
+        (lab1[0] - lab2[0]) ** 2 + (lab1[1] - lab2[1]) ** 2 + (lab1[2] - lab2[2]) ** 2
+    )
+
+
+def delta_e_rgb(rgb1: RGBTuple, rgb2: RGBTuple) -> float:
+    """Delta E (CIE76) between two RGB tuples"""
+    return delta_e_lab(rgb_tuple_to_lab(*rgb1), rgb_tuple_to_lab(*rgb2))
 
 
 class RGBColor:
+    __slots__ = ('r', 'g', 'b')
+    
     def __init__(self, r: int, g: int, b: int):
         self.r = r
         self.g = g
         self.b = b
     
+    def as_tuple(self) -> RGBTuple:
+        return (self.r, self.g, self.b)
+    
     def to_dict(self) -> Dict[str, int]:
         return {'r': self.r, 'g': self.g, 'b': self.b}
 
 
 class CMYKColor:
+    __slots__ = ('c', 'm', 'y', 'k')
+    
     def __init__(self, c: float, m: float, y: float, k: float):
         self.c = c
         self.m = m
         self.y = y
         self.k = k
     
+    def as_tuple(self) -> CMYKTuple:
+        return (self.c, self.m, self.y, self.k)
+    
     def to_dict(self) -> Dict[str, float]:
         return {'c': self.c, 'm': self.m, 'y': self.y, 'k': self.k}
 
 
 class LABColor:
+    __slots__ = ('l', 'a', 'b')
+    
     def __init__(self, l: float, a: float, b: float):
         self.l = l
         self.a = a
         self.b = b
     
+    def as_tuple(self) -> LABTuple:
+        return (self.l, self.a, self.b)
+    
     def to_dict(self) -> Dict[str, float]:
         return {'l': self.l, 'a': self.a, 'b': self.b}
 
 
 class PantoneColor:
+    __slots__ = ('code', 'rgb', 'cmyk')
+    
     def __init__(self, code: str, rgb: RGBColor, cmyk: CMYKColor):
         self.code = code
         self.rgb = rgb
@@ -57,118 +185,40 @@ class ColorConversion:
     @staticmethod
     def hex_to_rgb(hex_color: str) -> RGBColor:
         """Convert HEX to RGB"""
-        hex_color = hex_color.lstrip('#')
-        if len(hex_color) != 6:
-            raise ValueError('Invalid hex color')
-        
-        r = int(hex_color[0:2], 16)
-        g = int(hex_color[2:4], 16)
-        b = int(hex_color[4:6], 16)
-        
-        return RGBColor(r, g, b)
+        return RGBColor(*hex_to_rgb_tuple(hex_color))
     
     @staticmethod
     def rgb_to_hex(rgb: RGBColor) -> str:
         """Convert RGB to HEX"""
-        def to_hex(n: int) -> str:
-            hex_val = format(int(round(n)), 'x')
-            return hex_val if len(hex_val) == 2 else '0' + hex_val
-        
-        return f"#{to_hex(rgb.r)}{to_hex(rgb.g)}{to_hex(rgb.b)}"
+        return rgb_tuple_to_hex(rgb.r, rgb.g, rgb.b)
     
     @staticmethod
     def rgb_to_cmyk(rgb: RGBColor) -> CMYKColor:
         """Convert RGB to CMYK"""
-        r = rgb.r / 255.0
-        g = rgb.g / 255.0
-        b = rgb.b / 255.0
-        
-        k = 1.0 - max(r, g, b)
-        
-        if k == 1.0:
-            return CMYKColor(0, 0, 0, 100)
-        
-        c = ((1.0 - r - k) / (1.0 - k)) * 100
-        m = ((1.0 - g - k) / (1.0 - k)) * 100
-        y = ((1.0 - b - k) / (1.0 - k)) * 100
-        
-        return CMYKColor(
-            round(c),
-            round(m),
-            round(y),
-            round(k * 100)
-        )
+        return CMYKColor(*rgb_tuple_to_cmyk(rgb.r, rgb.g, rgb.b))
     
     @staticmethod
     def cmyk_to_rgb(cmyk: CMYKColor) -> RGBColor:
         """Convert CMYK to RGB"""
-        c = cmyk.c / 100.0
-        m = cmyk.m / 100.0
-        y = cmyk.y / 100.0
-        k = cmyk.k / 100.0
-        
-        r = 255 * (1.0 - c) * (1.0 - k)
-        g = 255 * (1.0 - m) * (1.0 - k)
-        b = 255 * (1.0 - y) * (1.0 - k)
-        
-        return RGBColor(round(r), round(g), round(b))
+        return RGBColor(*cmyk_tuple_to_rgb(cmyk.c, cmyk.m, cmyk.y, cmyk.k))
     
     @staticmethod
     def rgb_to_lab(rgb: RGBColor) -> LABColor:
         """Convert RGB to LAB using D65 illuminant"""
-        # First convert RGB to XYZ
-        r = rgb.r / 255.0
-        g = rgb.g / 255.0
-        b = rgb.b / 255.0
-        
-        # Apply gamma correction
-        r = ((r + 0.055) / 1.055) ** 2.4 if r > 0.04045 else r / 12.92
-        g = ((g + 0.055) / 1.055) ** 2.4 if g > 0.04045 else g / 12.92
-        b = ((b + 0.055) / 1.055) ** 2.4 if b > 0.04045 else b / 12.92
-        
-        # Convert to XYZ (D65 illuminant)
-        x = (r * 0.4124564 + g * 0.3575761 + b * 0.1804375) * 100
-        y = (r * 0.2126729 + g * 0.7151522 + b * 0.072175) * 100
-        z = (r * 0.0193339 + g * 0.119192 + b * 0.9503041) * 100
-        
-        # Convert XYZ to LAB
-        xn = 95.047  # D65 reference white
-        yn = 100.0
-        zn = 108.883
-        
-        fx = ColorConversion._lab_f(x / xn)
-        fy = ColorConversion._lab_f(y / yn)
-        fz = ColorConversion._lab_f(z / zn)
-        
-        l = 116 * fy - 16
-        a = 500 * (fx - fy)
-        b_val = 200 * (fy - fz)
-        
-        return LABColor(
-            round(l * 100) / 100,
-            round(a * 100) / 100,
-            round(b_val * 100) / 100
-        )
+        return LABColor(*rgb_tuple_to_lab(rgb.r, rgb.g, rgb.b))
     
     @staticmethod
     def _lab_f(t: float) -> float:
         """Helper function for LAB conversion"""
-        delta = 6 / 29
-        return t ** (1/3) if t > delta ** 3 else t / (3 * delta ** 2) + 4 / 29
+        return _lab_f(t)
     
     @staticmethod
     def calculate_delta_e(rgb1: RGBColor, rgb2: RGBColor) -> float:
         """Calculate Delta E (color difference) between two RGB colors"""
-        lab1 = ColorConversion.rgb_to_lab(rgb1)
-        lab2 = ColorConversion.rgb_to_lab(rgb2)
-        
-        delta_l = lab1.l - lab2.l
-        delta_a = lab1.a - lab2.a
-        delta_b = lab1.b - lab2.b
-        
-        return math.sqrt(delta_l ** 2 + delta_a ** 2 + delta_b ** 2)
+        return delta_e_lab(
+            rgb_tuple_to_lab(rgb1.r, rgb1.g, rgb1.b),
+            rgb_tuple_to_lab(rgb2.r, rgb2.g, rgb2.b)
+        )
 
 
 color_conversion = ColorConversion()
-
-
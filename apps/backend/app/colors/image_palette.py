@@ -0,0 +1,223 @@
+"""
+Image Palette - Dominant color extraction from images
+Images are decoded at reduced size, downsampled to a bounded pixel budget and
+clustered in LAB with vectorized k-means++. Results are cached by content hash.
+"""
+import base64
+import hashlib
+import io
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from django.conf import settings
+from django.core.files.storage import default_storage
+from PIL import Image
+from app.colors import vectorized
+from app.colors.cache import color_cache
+
+
+class ImagePaletteExtractor:
+    """Extract dominant colors from encoded image bytes"""
+    
+    MAX_PIXELS = 128 * 128  # Pixel budget for clustering
+    HISTOGRAM_BITS = 5  # Bits kept per channel when binning pixels
+    MAX_ITERATIONS = 20
+    TOLERANCE = 0.5  # Stop once no center moves further (Delta E)
+    MIN_ALPHA = 128  # Pixels more transparent than this are ignored
+    MAX_COLORS = 16
+    SEED = 0  # Fixed so the same image always yields the same palette
+    
+    # Larger images are processed by a Celery worker instead of the request.
+    # JPEG decodes at reduced scale, so its cost follows the file size; other
+    # formats decode every pixel.
+    ASYNC_THRESHOLD_BYTES = 3 * 1024 * 1024
+    ASYNC_THRESHOLD_PIXELS = 4_000_000
+    
+    MAX_IMAGE_BYTES = 50 * 1024 * 1024
+    
+    def read_url(self, url: str) -> bytes:
+        """
+        Load image bytes from a data: URL or the URL of a file in our storage.
+        
+        Other URLs are refused rather than fetched, so callers cannot make
+        the server request internal hosts.
+        """
+        if url.startswith('data:'):
+            header, _, payload = url.partition(',')
+            if not header.endswith(';base64'):
+                raise ValueError('Only base64 data URLs are supported')
+            data = base64.b64decode(payload)
+        else:
+            name = self.storage_name(url)
+            if name is None:
+                raise ValueError('imageUrl must be a data: URL or an uploaded file')
+            if not default_storage.exists(name):
+                raise ValueError('Image not found')
+            with default_storage.open(name, 'rb') as f:
+                data = f.read(self.MAX_IMAGE_BYTES + 1)
+        if len(data) > self.MAX_IMAGE_BYTES:
+            raise ValueError('Image is too large')
+        return data
+    
+    @staticmethod
+    def storage_name(url: str) -> Optional[str]:
+        """Name of the stored file a MEDIA_URL or storage URL points to, if any"""
+        prefixes = [settings.MEDIA_URL, default_storage.url('').split('?', 1)[0]]
+        for prefix in prefixes:
+            if prefix and url.startswith(prefix):
+                name = url[len(prefix):].split('?', 1)[0]
+                if name and '..' not in name.split('/'):
+                    return name
+        return None
+    
+    @staticmethod
+    def content_hash(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+    
+    def cache_params(self, data: bytes, count: int) -> Tuple[str, int]:
+        return (self.content_hash(data), count)
+    
+    def get_cached(self, data: bytes, count: int) -> Optional[List[Dict[str, Any]]]:
+        """Return the cached palette for these bytes, if any"""
+        return color_cache.get('image_palette', self.cache_params(data, count))
+    
+    def extract(self, data: bytes, count: int = 5) -> List[Dict[str, Any]]:
+        """
+        Dominant colors, most common first.
+        
+        Each entry is {'color': '#rrggbb', 'rgb': {...}, 'population': fraction}.
+        """
+        count = max(1, min(int(count), self.MAX_COLORS))
+        return color_cache.get_or_compute(
+            'image_palette',
+            self.cache_params(data, count),
+            lambda: self._extract(data, count)
+        )
+    
+    def needs_background(self, data: bytes) -> bool:
+        """Whether an image is too large to process on the request thread"""
+        if len(data) > self.ASYNC_THRESHOLD_BYTES:
+            return True
+        with Image.open(io.BytesIO(data)) as image:
+            width, height = image.size
+            reducible = image.format == 'JPEG'
+        return not reducible and width * height > self.ASYNC_THRESHOLD_PIXELS
+    
+    def _extract(self, data: bytes, count: int) -> List[Dict[str, Any]]:
+        rgb, weights = self.histogram(self.load_pixels(data))
+        if not len(rgb):
+            return []
+        
+        lab = vectorized.rgb_to_lab(rgb, rounded=False)
+        labels = self.kmeans(lab, count, weights)
+        populations = np.bincount(labels, weights=weights)
+        total = weights.sum()
+        
+        # Report the mean RGB of each cluster rather than converting LAB back
+        palette = []
+        for cluster in np.argsort(-populations, kind='stable'):
+            if not populations[cluster]:
+                continue
+            members = labels == cluster
+            mean = (rgb[members] * weights[members, None]).sum(axis=0) / populations[cluster]
+            r, g, b = (int(v) for v in np.clip(np.rint(mean), 0, 255))
+            palette.append({
+                'color': vectorized.rgb_to_hex(np.array([[r, g, b]]))[0],
+                'rgb': {'r': r, 'g': g, 'b': b},
+                'population': round(float(populations[cluster] / total), 4)
+            })
+        return palette
+    
+    def load_pixels(self, data: bytes) -> np.ndarray:
+        """Decode and downsample to at most MAX_PIXELS opaque RGB pixels"""
+        with Image.open(io.BytesIO(data)) as image:
+            width, height = image.size
+            scale = min(1.0, (self.MAX_PIXELS / float(width * height)) ** 0.5)
+            size = (max(1, int(width * scale)), max(1, int(height * scale)))
+            
+            # JPEG can decode directly at 1/2, 1/4 or 1/8 scale
+            image.draft('RGB', size)
+            has_alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+            image = image.convert('RGBA' if has_alpha else 'RGB')
+            if image.size != size:
+                image = image.resize(size, Image.Resampling.BOX)
+            pixels = np.asarray(image)
+        
+        if has_alpha:
+            pixels = pixels.reshape(-1, 4)
+            return pixels[pixels[:, 3] >= self.MIN_ALPHA, :3]
+        return pixels.reshape(-1, 3)
+    
+    def histogram(self, rgb: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Bin pixels by their top HISTOGRAM_BITS bits per channel.
+        
+        Returns the mean color of each occupied bin and its pixel count, so
+        clustering runs over a few thousand weighted points at most.
+        """
+        if not len(rgb):
+            return np.zeros((0, 3)), np.zeros(0)
+        shift = 8 - self.HISTOGRAM_BITS
+        binned = (rgb >> shift).astype(np.int64)
+        keys = (binned[:, 0] << (2 * self.HISTOGRAM_BITS)) | (binned[:, 1] << self.HISTOGRAM_BITS) | binned[:, 2]
+        size = 1 << (3 * self.HISTOGRAM_BITS)
+        counts = np.bincount(keys, minlength=size)
+        occupied = np.flatnonzero(counts)
+        sums = np.stack([
+            np.bincount(keys, weights=rgb[:, channel], minlength=size)[occupied]
+            for channel in range(3)
+        ], axis=1)
+        weights = counts[occupied].astype(np.float64)
+        return sums / weights[:, None], weights
+    
+    def kmeans(self, points: np.ndarray, k: int, weights: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Weighted, vectorized k-means with k-means++ seeding.
+        
+        Returns the cluster label of each point. Fewer than k clusters are
+        used when the points have fewer distinct values.
+        """
+        if weights is None:
+            weights = np.ones(len(points))
+        rng = np.random.default_rng(self.SEED)
+        k = min(k, len(points))
+        
+        centers = np.empty((k, points.shape[1]))
+        centers[0] = points[rng.choice(len(points), p=weights / weights.sum())]
+        closest = ((points - centers[0]) ** 2).sum(axis=1)
+        for i in range(1, k):
+            scores = closest * weights
+            total = scores.sum()
+            if total == 0:
+                # Every point already coincides with a center
+                return self._assign(points, centers[:i])
+            centers[i] = points[rng.choice(len(points), p=scores / total)]
+            closest = np.minimum(closest, ((points - centers[i]) ** 2).sum(axis=1))
+        
+        labels = self._assign(points, centers)
+        for _ in range(self.MAX_ITERATIONS):
+            mass = np.bincount(labels, weights=weights, minlength=k)
+            sums = np.stack([
+                np.bincount(labels, weights=points[:, d] * weights, minlength=k)
+                for d in range(points.shape[1])
+            ], axis=1)
+            nonempty = mass > 0
+            previous = centers.copy()
+            centers[nonempty] = sums[nonempty] / mass[nonempty, None]
+            labels = self._assign(points, centers)
+            if np.sqrt(((centers - previous) ** 2).sum(axis=1)).max() < self.TOLERANCE:
+                break
+        
+        return labels
+    
+    @staticmethod
+    def _assign(points: np.ndarray, centers: np.ndarray) -> np.ndarray:
+        """Index of the nearest center for each point"""
+        distances = (
+            (points ** 2).sum(axis=1)[:, None]
+            - 2 * points @ centers.T
+            + (centers ** 2).sum(axis=1)[None, :]
+        )
+        return distances.argmin(axis=1)
+
+
+image_palette = ImagePaletteExtractor()
@@ -2,8 +2,189 @@
 Pantone Service - Pantone color management
 Converted from TypeScript PantoneService.ts
 """
-from typing import List, Optional, Dict, Any, Literal
-from app.colors.conversion import ColorConversion, RGBColor, PantoneColor, CMYKColor
+import re
+from functools import lru_cache
+from typing import List, Optional, Dict, Any, Literal, Set, Tuple
+from app.colors.conversion import (
+    RGBColor, PantoneColor, CMYKColor, LABTuple, delta_e_lab,
+    rgb_tuple_to_lab
+)
+
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def normalize_code(code: str) -> str:
+    """Normalize a Pantone code for lookups (case and whitespace insensitive)"""
+    return _WHITESPACE_RE.sub(' ', code.strip().lower())
+
+
+def _trigrams(text: str) -> Set[str]:
+    """Padded character trigrams used for fuzzy matching"""
+    padded = f'  {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class PantoneIndex:
+    """
+    Precomputed in-memory index over a Pantone library.
+    
+    Holds an exact-code hash map, a prefix trie over every word boundary of
+    the normalized codes, a trigram index for substring and fuzzy matching
+    and a 1-2 character gram index for very short queries. Built once;
+    queries never touch the whole library.
+    """
+    
+    # Rank buckets, lower is better
+    RANK_EXACT = 0
+    RANK_PREFIX = 1
+    RANK_WORD_PREFIX = 2
+    RANK_SUBSTRING = 3
+    RANK_FUZZY = 4
+    
+    MIN_FUZZY_SIMILARITY = 0.5
+    # Fuzzy matches are only a fallback for queries with few strong matches
+    FUZZY_FALLBACK_BELOW = 10
+    QUERY_CACHE_SIZE = 1024
+    
+    def __init__(self, colors: List[PantoneColor]):
+        self.colors = colors
+        self.normalized: List[str] = [normalize_code(p.code) for p in colors]
+        # As floats, so nearest_rgb's arithmetic allocates no int objects
+        self.rgb: List[Tuple[float, float, float]] = [
+            (float(p.rgb.r), float(p.rgb.g), float(p.rgb.b)) for p in colors
+        ]
+        self.lab: List[LABTuple] = [rgb_tuple_to_lab(*rgb) for rgb in self.rgb]
+        self.by_code: Dict[str, int] = {}
+        self.by_normalized: Dict[str, int] = {}
+        self.trie: Dict[str, Any] = self._trie_node()
+        self.trigram_index: Dict[str, Set[int]] = {}
+        self.short_gram_index: Dict[str, Set[int]] = {}
+        
+        for idx, (color, norm) in enumerate(zip(colors, self.normalized)):
+            self.by_code.setdefault(color.code, idx)
+            self.by_normalized.setdefault(norm, idx)
+            
+            # Insert the code from every word boundary so "186" finds "pantone 186 c"
+            starts = [0] + [m.end() for m in re.finditer(' ', norm)]
+            for start in starts:
+                self._trie_insert(norm[start:], idx, start == 0)
+            
+            for size in (1, 2):
+                for i in range(len(norm) - size + 1):
+                    self.short_gram_index.setdefault(norm[i:i + size], set()).add(idx)
+            
+            for gram in _trigrams(norm):
+                self.trigram_index.setdefault(gram, set()).add(idx)
+        
+        self._search_cached = lru_cache(maxsize=self.QUERY_CACHE_SIZE)(self._search)
+    
+    def _trie_insert(self, key: str, idx: int, is_full_code: bool) -> None:
+        """Insert key into the prefix trie; every node keeps its subtree ids"""
+        node = self.trie
+        for char in key:
+            node = node['children'].setdefault(char, self._trie_node())
+            node['full' if is_full_code else 'word'].add(idx)
+    
+    @staticmethod
+    def _trie_node() -> Dict[str, Any]:
+        return {'children': {}, 'full': set(), 'word': set()}
+    
+    def _trie_lookup(self, prefix: str) -> Tuple[Set[int], Set[int]]:
+        """Return (full-code prefix ids, word prefix ids) for prefix"""
+        node = self.trie
+        for char in prefix:
+            node = node['children'].get(char)
+            if node is None:
+                return set(), set()
+        return node['full'], node['word']
+    
+    def get(self, code: str) -> Optional[PantoneColor]:
+        """Exact lookup, falling back to a normalized code match"""
+        idx = self.by_code.get(code)
+        if idx is None:
+            idx = self.by_normalized.get(normalize_code(code))
+        return self.colors[idx] if idx is not None else None
+    
+    def nearest_rgb(self, r: int, g: int, b: int) -> Tuple[int, float]:
+        """Index and squared RGB distance of the nearest color; first wins ties"""
+        r = float(r)
+        g = float(g)
+        b = float(b)
+        best_index = 0
+        best_distance = float('inf')
+        index = 0
+        for pr, pg, pb in self.rgb:
+            dr = r - pr
+            dg = g - pg
+            db = b - pb
+            distance = dr * dr + dg * dg + db * db
+            if distance < best_distance:
+                best_index = index
+                best_distance = distance
+            index += 1
+        return best_index, best_distance
+    
+    def search(self, query: str, fuzzy: bool = True) -> Tuple[Tuple[int, float, int], ...]:
+        """
+        Rank library entries against query.
+        
+        Returns (rank, similarity, index) tuples sorted best first. The index
+        is immutable, so rankings for repeated type-ahead prefixes are cached.
+        """
+        return self._search_cached(normalize_code(query), fuzzy)
+    
+    def _search(self, norm: str, fuzzy: bool) -> Tuple[Tuple[int, float, int], ...]:
+        if not norm:
+            return ()
+        
+        ranked: Dict[int, Tuple[int, float]] = {}
+        
+        exact = self.by_normalized.get(norm)
+        if exact is not None:
+            ranked[exact] = (self.RANK_EXACT, 1.0)
+        
+        full_prefix, word_prefix = self._trie_lookup(norm)
+        for idx in full_prefix:
+            ranked.setdefault(idx, (self.RANK_PREFIX, 1.0))
+        for idx in word_prefix:
+            ranked.setdefault(idx, (self.RANK_WORD_PREFIX, 1.0))
+        
+        query_grams = _trigrams(norm)
+        if len(norm) >= 3:
+            # Unpadded trigrams must all be present for a substring match
+            inner = [norm[i:i + 3] for i in range(len(norm) - 2)]
+            postings = sorted((self.trigram_index.get(g, set()) for g in inner), key=len)
+            candidates = set(postings[0]).intersection(*postings[1:]) if postings else set()
+        else:
+            candidates = self.short_gram_index.get(norm, set())
+        for idx in candidates:
+            if idx not in ranked and norm in self.normalized[idx]:
+                ranked[idx] = (self.RANK_SUBSTRING, 1.0)
+        
+        if fuzzy and len(norm) >= 3 and len(ranked) < self.FUZZY_FALLBACK_BELOW:
+            # Trigrams shared by most of the library ("pan", "ton", ...) carry
+            # no signal and would turn every fuzzy query into a full scan
+            common_limit = max(1, len(self.colors) // 2)
+            informative = [
+                g for g in query_grams
+                if len(self.trigram_index.get(g, ())) <= common_limit
+            ]
+            overlap: Dict[int, int] = {}
+            for gram in informative:
+                for idx in self.trigram_index.get(gram, ()):
+                    overlap[idx] = overlap.get(idx, 0) + 1
+            for idx, shared in overlap.items():
+                if idx in ranked:
+                    continue
+                # Share of the query's informative trigrams found in the code
+                similarity = shared / len(informative)
+                if similarity >= self.MIN_FUZZY_SIMILARITY:
+                    ranked[idx] = (self.RANK_FUZZY, similarity)
+        
+        results = [(rank, similarity, idx) for idx, (rank, similarity) in ranked.items()]
+        results.sort(key=lambda r: (r[0], -r[1], len(self.normalized[r[2]]), self.normalized[r[2]]))
+        return tuple(results)
 
 
 class PantoneService:
@@ -48,44 +229,52 @@ class PantoneService:
             PantoneColor('PANTONE Cool Gray 11 C', RGBColor(83, 86, 90), CMYKColor(0, 0, 0, 80)),
             PantoneColor('PANTONE Warm Gray 11 C', RGBColor(82, 76, 66), CMYKColor(0, 9, 16, 80)),
         ]
+        self.index = PantoneIndex(self.pantone_library)
     
-    def search(self, query: str) -> List[PantoneColor]:
-        """Search Pantone colors by code or name"""
-        lower_query = query.lower()
-        return [
-            p for p in self.pantone_library
-            if lower_query in p.code.lower()
-        ]
+    def search(
+        self,
+        query: str,
+        limit: Optional[int] = None,
+        offset: int = 0,
+        fuzzy: bool = True
+    ) -> List[PantoneColor]:
+        """Search Pantone colors by code or name, best matches first"""
+        return [p for p, _ in self.search_ranked(query, limit, offset, fuzzy)['results']]
+    
+    def search_ranked(
+        self,
+        query: str,
+        limit: Optional[int] = None,
+        offset: int = 0,
+        fuzzy: bool = True
+    ) -> Dict[str, Any]:
+        """Search with ranking metadata and pagination"""
+        ranked = self.index.search(query, fuzzy=fuzzy)
+        end = None if limit is None else offset + limit
+        page = ranked[offset:end]
+        return {
+            'total': len(ranked),
+            'results': [
+                (self.pantone_library[idx], {'rank': rank, 'score': round(similarity, 3)})
+                for rank, similarity, idx in page
+            ]
+        }
     
     def get_by_code(self, code: str) -> Optional[PantoneColor]:
         """Get Pantone by exact code"""
-        for pantone in self.pantone_library:
-            if pantone.code == code:
-                return pantone
-        return None
+        return self.index.get(code)
     
     def find_closest_match(self, rgb: RGBColor) -> Dict[str, Any]:
         """Find closest Pantone match for RGB color"""
-        closest_color = self.pantone_library[0]
-        min_distance = float('inf')
-        
-        for pantone in self.pantone_library:
-            distance = (
-                (rgb.r - pantone.rgb.r) ** 2 +
-                (rgb.g - pantone.rgb.g) ** 2 +
-                (rgb.b - pantone.rgb.b) ** 2
-            ) ** 0.5
-            
-            if distance < min_distance:
-                min_distance = distance
-                closest_color = pantone
+        index, squared_distance = self.index.nearest_rgb(rgb.r, rgb.g, rgb.b)
+        closest_color = self.pantone_library[index]
         
         # Calculate Delta E for accuracy
-        delta_e = ColorConversion.calculate_delta_e(rgb, closest_color.rgb)
+        delta_e = delta_e_lab(rgb_tuple_to_lab(rgb.r, rgb.g, rgb.b), self.index.lab[index])
         
         return {
             'pantone': closest_color.to_dict(),
-            'distance': round(min_distance),
+            'distance': round(squared_distance ** 0.5),
             'deltaE': round(delta_e * 100) / 100
         }
     
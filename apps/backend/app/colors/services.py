@@ -6,6 +6,9 @@ from typing import List, Dict, Any, Literal, Optional
 from app.colors.conversion import ColorConversion, RGBColor, CMYKColor, LABColor
 from app.colors.validation import ColorValidation
 from app.colors.pantone_service import PantoneService
+from app.colors.cache import memoize, normalize_hex
+from app.colors.color_management import color_management
+from app.colors.image_palette import image_palette
 
 
 class GradientStop:
@@ -70,13 +73,18 @@ class ColorService:
         self.validation = ColorValidation()
         self.pantone = PantoneService()
     
+    @memoize('convert', lambda self, color, from_format, to_format, profile=None, intent=None: (
+        normalize_hex(color), from_format, to_format, profile or '', intent or ''
+    ))
     def convert(
         self,
         color: str,
         from_format: Literal['rgb', 'cmyk', 'lab'],
-        to_format: Literal['rgb', 'cmyk', 'lab', 'hex']
+        to_format: Literal['rgb', 'cmyk', 'lab', 'hex'],
+        profile: Optional[str] = None,
+        intent: Optional[str] = None
     ) -> Any:
-        """Convert color between formats"""
+        """Convert color between formats; CMYK uses the ICC profile when given"""
         # Parse source color
         if from_format == 'rgb':
             rgb = self.conversion.hex_to_rgb(color)
@@ -88,6 +96,9 @@ class ColorService:
         if to_format == 'rgb':
             return rgb.to_dict()
         elif to_format == 'cmyk':
+            if profile:
+                c, m, y, k = color_management.rgb_to_cmyk([[rgb.r, rgb.g, rgb.b]], profile, intent)[0]
+                return CMYKColor(int(c), int(m), int(y), int(k)).to_dict()
             return self.conversion.rgb_to_cmyk(rgb).to_dict()
         elif to_format == 'lab':
             return self.conversion.rgb_to_lab(rgb).to_dict()
@@ -96,9 +107,17 @@ class ColorService:
         else:
             return rgb.to_dict()
     
-    def validate(self, color: str) -> Dict[str, Any]:
+    @memoize('validate', lambda self, color, profile=None, intent=None: (
+        normalize_hex(color), profile or '', intent or ''
+    ))
+    def validate(
+        self,
+        color: str,
+        profile: Optional[str] = None,
+        intent: Optional[str] = None
+    ) -> Dict[str, Any]:
         """Validate color for print"""
-        result = self.validation.validate_for_print(color)
+        result = self.validation.validate_for_print(color, profile, intent)
         return result.to_dict()
     
     def create_gradient(
@@ -195,8 +214,14 @@ class ColorService:
         scheme: Literal['complementary', 'analogous', 'triadic', 'tetradic', 'monochromatic']
     ) -> ColorHarmony:
         """Generate color harmonies"""
+        # The base color is echoed back as given; only the derived colors are cached
+        return ColorHarmony(scheme, [base_color] + self._harmony_colors(base_color, scheme))
+    
+    @memoize('harmony', lambda self, base_color, scheme: (normalize_hex(base_color), scheme))
+    def _harmony_colors(self, base_color: str, scheme: str) -> List[str]:
+        """Colors derived from base_color for a harmony scheme"""
         rgb = self.conversion.hex_to_rgb(base_color)
-        colors = [base_color]
+        colors = []
         
         # Convert to HSL for easier harmony calculation
         hsl = self._rgb_to_hsl(rgb)
@@ -222,7 +247,7 @@ class ColorService:
             colors.append(self._hsl_to_hex(hsl['h'], hsl['s'], min(100, hsl['l'] + 20)))
             colors.append(self._hsl_to_hex(hsl['h'], hsl['s'], max(0, hsl['l'] - 20)))
         
-        return ColorHarmony(scheme, colors)
+        return colors
     
     def generate_palette(self, base_color: str, count: int = 5) -> List[str]:
         """Generate color palette"""
@@ -237,6 +262,9 @@ class ColorService:
         
         return palette
     
+    @memoize('accessibility', lambda self, foreground, background: (
+        normalize_hex(foreground), normalize_hex(background)
+    ))
     def check_accessibility(self, foreground: str, background: str) -> Dict[str, Any]:
         """Check color accessibility (contrast ratio)"""
         fg = self.conversion.hex_to_rgb(foreground)
@@ -253,17 +281,10 @@ class ColorService:
             'aaa': ratio >= 7  # WCAG AAA
         }
     
-    async def extract_colors_from_image(self, image_url: str, count: int = 5) -> List[str]:
-        """Extract dominant colors from image (simplified implementation)"""
-        # Placeholder implementation
-        # In production, use libraries like Pillow or scikit-image
-        return [
-            '#6F1414',
-            '#3b82f6',
-            '#10b981',
-            '#f59e0b',
-            '#8b5cf6',
-        ][:count]
+    def extract_colors_from_image(self, image_url: str, count: int = 5) -> List[str]:
+        """Extract dominant colors from image"""
+        data = image_palette.read_url(image_url)
+        return [entry['color'] for entry in image_palette.extract(data, count)]
     
     def _rgb_to_hsl(self, rgb: RGBColor) -> Dict[str, float]:
         """Convert RGB to HSL"""
@@ -0,0 +1,17 @@
+"""
+Color Tasks - Background color processing
+"""
+from celery import shared_task
+from django.core.files.storage import default_storage
+from app.colors.image_palette import image_palette
+
+
+@shared_task
+def extract_image_palette(path: str, count: int = 5):
+    """Extract the palette of an image stored in default storage, then delete it"""
+    try:
+        with default_storage.open(path, 'rb') as f:
+            data = f.read()
+        return image_palette.extract(data, count)
+    finally:
+        default_storage.delete(path)
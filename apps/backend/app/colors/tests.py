@@ -0,0 +1,309 @@
+"""
+Tests for color services.
+"""
+
+import base64
+import io
+import os
+import tempfile
+from unittest import mock
+import numpy as np
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, override_settings
+from PIL import Image, ImageCms
+from app.colors.conversion import (
+    PantoneColor, RGBColor, CMYKColor, ColorConversion, hex_to_rgb_tuple,
+    hex_to_packed, unpack_rgb, rgb_tuple_to_cmyk, cmyk_tuple_to_rgb
+)
+from app.colors.pantone_service import PantoneIndex, PantoneService
+from app.colors.cache import ColorComputationCache, normalize_hex
+from app.colors.services import ColorService
+from app.colors.color_management import ColorManagementService, UnknownProfileError
+from app.colors.image_palette import ImagePaletteExtractor
+from app.colors import vectorized
+
+
+class PantoneSearchTestCase(SimpleTestCase):
+    """Test cases for the indexed Pantone search."""
+
+    def setUp(self):
+        self.service = PantoneService()
+
+    def test_exact_match_ranks_first(self):
+        """An exact code beats prefix and substring matches."""
+        results = self.service.search('pantone 286 c')
+        self.assertEqual(results[0].code, 'PANTONE 286 C')
+
+    def test_word_prefix_match(self):
+        """Typing the number alone finds codes by word prefix."""
+        codes = [p.code for p in self.service.search('18')]
+        self.assertEqual(codes, ['PANTONE 185 C', 'PANTONE 186 C', 'PANTONE 187 C'])
+
+    def test_substring_match(self):
+        """Substring matches are still returned, as before indexing."""
+        codes = [p.code for p in self.service.search('gray 11')]
+        self.assertIn('PANTONE Cool Gray 11 C', codes)
+        self.assertIn('PANTONE Warm Gray 11 C', codes)
+
+    def test_fuzzy_match(self):
+        """Misspelled queries fall back to trigram matches."""
+        codes = [p.code for p in self.service.search('purpel')]
+        self.assertEqual(codes[0], 'PANTONE Purple C')
+        self.assertEqual(self.service.search('purpel', fuzzy=False), [])
+
+    def test_pagination(self):
+        """limit/offset slice the ranked results and report the total."""
+        page = self.service.search_ranked('18', limit=2, offset=1)
+        self.assertEqual(page['total'], 3)
+        self.assertEqual(
+            [p.code for p, _ in page['results']],
+            ['PANTONE 186 C', 'PANTONE 187 C']
+        )
+
+    def test_get_by_code(self):
+        """Lookup is exact first, then case/whitespace insensitive."""
+        self.assertEqual(self.service.get_by_code('PANTONE 186 C').code, 'PANTONE 186 C')
+        self.assertEqual(self.service.get_by_code('pantone  186 c').code, 'PANTONE 186 C')
+        self.assertIsNone(self.service.get_by_code('PANTONE 999 C'))
+
+    def test_large_library(self):
+        """The index scales to thousands of codes."""
+        library = [
+            PantoneColor(f'PANTONE {n} C', RGBColor(0, 0, 0), CMYKColor(0, 0, 0, 100))
+            for n in range(100, 5100)
+        ]
+        index = PantoneIndex(library)
+        ranked = index.search('4321')
+        self.assertEqual(library[ranked[0][2]].code, 'PANTONE 4321 C')
+
+
+class ColorConversionTestCase(SimpleTestCase):
+    """Test cases for the tuple conversion functions and slot color types."""
+
+    def test_tuple_functions_match_wrappers(self):
+        for color in ('#000000', '#ffffff', '#ff8000', '#1A2B3C'):
+            rgb = ColorConversion.hex_to_rgb(color)
+            self.assertEqual(hex_to_rgb_tuple(color), rgb.as_tuple())
+            self.assertEqual(unpack_rgb(hex_to_packed(color)), rgb.as_tuple())
+            cmyk = ColorConversion.rgb_to_cmyk(rgb)
+            self.assertEqual(rgb_tuple_to_cmyk(*rgb.as_tuple()), cmyk.as_tuple())
+            self.assertEqual(
+                cmyk_tuple_to_rgb(*cmyk.as_tuple()),
+                ColorConversion.cmyk_to_rgb(cmyk).as_tuple()
+            )
+
+    def test_invalid_hex_is_rejected(self):
+        for color in ('#fff', '#gggggg', '', '#12345678'):
+            with self.assertRaises(ValueError):
+                hex_to_packed(color)
+
+    def test_color_types_have_no_instance_dict(self):
+        self.assertFalse(hasattr(RGBColor(1, 2, 3), '__dict__'))
+        self.assertFalse(hasattr(CMYKColor(1, 2, 3, 4), '__dict__'))
+
+    def test_closest_match_unchanged(self):
+        """The nearest library color keeps its distance and Delta E."""
+        match = PantoneService().find_closest_match(RGBColor(255, 0, 0))
+        self.assertEqual(match['pantone']['code'], 'PANTONE 185 C')
+        self.assertEqual(match['distance'], 61)
+        self.assertEqual(match['deltaE'], 29.96)
+
+
+class ColorCacheTestCase(SimpleTestCase):
+    """Test cases for the color computation cache."""
+
+    def setUp(self):
+        self.cache = ColorComputationCache(max_size=2)
+
+    def test_normalize_hex(self):
+        self.assertEqual(normalize_hex('#FFAA00'), '#ffaa00')
+        self.assertEqual(normalize_hex(' ffaa00 '), '#ffaa00')
+        self.assertIsNone(normalize_hex('#fff'))
+        self.assertIsNone(normalize_hex(None))
+
+    def test_hits_misses_and_eviction(self):
+        """Entries are counted per operation and evicted least recently used."""
+        calls = []
+
+        def compute(value):
+            calls.append(value)
+            return {'value': value}
+
+        self.cache.get_or_compute('convert', ('#000000',), lambda: compute(1))
+        self.cache.get_or_compute('convert', ('#000000',), lambda: compute(2))
+        self.cache.get_or_compute('validate', ('#111111',), lambda: compute(3))
+        self.cache.get_or_compute('validate', ('#222222',), lambda: compute(4))
+        self.cache.get_or_compute('convert', ('#000000',), lambda: compute(5))
+
+        self.assertEqual(calls, [1, 3, 4, 5])
+        stats = self.cache.stats()
+        self.assertEqual(stats['operations']['convert']['hits'], 1)
+        self.assertEqual(stats['operations']['convert']['misses'], 2)
+        self.assertEqual(stats['operations']['validate']['misses'], 2)
+        self.assertEqual(stats['size'], 2)
+
+    def test_cached_values_are_copies(self):
+        result = self.cache.get_or_compute('convert', ('#000000',), lambda: {'r': 0})
+        result['r'] = 255
+        cached = self.cache.get_or_compute('convert', ('#000000',), lambda: {'r': 1})
+        self.assertEqual(cached, {'r': 0})
+
+    def test_service_results_unchanged(self):
+        """Memoized service methods return the same results for any hex casing."""
+        service = ColorService()
+        self.assertEqual(
+            service.convert('#FF0000', 'rgb', 'cmyk'),
+            service.convert('#ff0000', 'rgb', 'cmyk')
+        )
+        harmony = service.generate_harmony('#FF0000', 'complementary')
+        self.assertEqual(harmony.colors[0], '#FF0000')
+        self.assertEqual(
+            service.generate_harmony('#ff0000', 'complementary').colors[1:],
+            harmony.colors[1:]
+        )
+
+
+class ColorManagementTestCase(SimpleTestCase):
+    """Test cases for ICC profile management."""
+
+    def setUp(self):
+        self.profile_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.profile_dir.cleanup)
+        srgb = ImageCms.ImageCmsProfile(ImageCms.createProfile('sRGB'))
+        with open(os.path.join(self.profile_dir.name, 'Display_RGB.icc'), 'wb') as f:
+            f.write(srgb.tobytes())
+        self.service = ColorManagementService(profile_dir=self.profile_dir.name)
+
+    def test_without_profile_uses_naive_conversion(self):
+        rgb = np.array([[255, 0, 0], [12, 34, 56], [0, 0, 0]])
+        np.testing.assert_array_equal(
+            self.service.rgb_to_cmyk(rgb), vectorized.rgb_to_cmyk(rgb)
+        )
+
+    def test_profiles_are_discovered(self):
+        profiles = {p['name']: p for p in self.service.list_profiles()}
+        self.assertEqual(set(profiles), {'srgb', 'display_rgb'})
+        self.assertEqual(profiles['display_rgb']['colorSpace'], 'RGB')
+
+    def test_output_profile_must_be_cmyk(self):
+        self.assertIsNone(self.service.resolve_profile_name(None))
+        with self.assertRaises(UnknownProfileError):
+            self.service.resolve_profile_name('missing')
+        with self.assertRaises(UnknownProfileError):
+            self.service.resolve_profile_name('Display_RGB.icc')
+        with self.assertRaises(UnknownProfileError):
+            self.service.resolve_intent('sideways')
+
+    def test_transforms_are_cached(self):
+        transform = self.service.get_transform('srgb', 'display_rgb')
+        self.assertIs(self.service.get_transform('SRGB', 'Display_RGB.icc'), transform)
+        self.assertIsNot(self.service.get_transform('srgb', 'display_rgb', 'perceptual'), transform)
+        self.assertEqual(self.service.stats()['transforms'], 2)
+
+        pixels = np.array([[255, 0, 0], [12, 34, 56]], dtype=np.uint8)
+        result = self.service.transform_pixels(pixels, 'srgb', 'display_rgb')
+        self.assertLessEqual(np.abs(result.astype(int) - pixels).max(), 1)
+
+    def test_unknown_profile_is_rejected_by_endpoint(self):
+        response = self.client.post(
+            '/api/colors/convert/',
+            {'color': '#ff0000', 'from': 'rgb', 'to': 'cmyk', 'profile': 'missing'},
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+def encode_image(pixels, image_format='PNG'):
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, image_format)
+    return buffer.getvalue()
+
+
+class ImagePaletteTestCase(SimpleTestCase):
+    """Test cases for image palette extraction."""
+
+    def setUp(self):
+        pixels = np.zeros((60, 100, 3), dtype=np.uint8)
+        pixels[:, :60] = (200, 30, 30)
+        pixels[:, 60:90] = (20, 60, 220)
+        pixels[:, 90:] = (250, 250, 250)
+        self.data = encode_image(pixels)
+        self.extractor = ImagePaletteExtractor()
+
+    def test_dominant_colors_by_population(self):
+        palette = self.extractor.extract(self.data, 5)
+        self.assertEqual(
+            [entry['color'] for entry in palette],
+            ['#c81e1e', '#143cdc', '#fafafa']
+        )
+        self.assertEqual([entry['population'] for entry in palette], [0.6, 0.3, 0.1])
+
+    def test_transparent_pixels_are_ignored(self):
+        pixels = np.zeros((10, 10, 4), dtype=np.uint8)
+        pixels[:5] = (0, 128, 0, 255)
+        palette = self.extractor.extract(encode_image(pixels), 3)
+        self.assertEqual([entry['color'] for entry in palette], ['#008000'])
+
+    def test_results_are_cached_by_content(self):
+        self.assertIsNone(self.extractor.get_cached(self.data, 4))
+        palette = self.extractor.extract(self.data, 4)
+        self.assertEqual(self.extractor.get_cached(self.data, 4), palette)
+
+    def test_large_images_are_downsampled(self):
+        pixels = np.random.default_rng(0).integers(0, 256, (1000, 1200, 3), dtype=np.uint8)
+        self.assertLessEqual(
+            len(self.extractor.load_pixels(encode_image(pixels, 'JPEG'))),
+            self.extractor.MAX_PIXELS
+        )
+
+    def test_endpoint_accepts_upload_and_data_url(self):
+        response = self.client.post('/api/colors/palette/from-image/', {
+            'image': SimpleUploadedFile('swatch.png', self.data, content_type='image/png'),
+            'count': 3,
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['colors'], ['#c81e1e', '#143cdc', '#fafafa'])
+
+        data_url = 'data:image/png;base64,' + base64.b64encode(self.data).decode()
+        response = self.client.post(
+            '/api/colors/palette/from-image/',
+            {'imageUrl': data_url, 'count': 3},
+            content_type='application/json'
+        )
+        self.assertEqual(response.json()['colors'], ['#c81e1e', '#143cdc', '#fafafa'])
+
+        response = self.client.post(
+            '/api/colors/palette/from-image/',
+            {'imageUrl': 'data:image/png;base64,' + base64.b64encode(b'nope').decode()},
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_image_url_is_never_fetched(self):
+        for url in ('http://169.254.169.254/latest/meta-data/', 'https://example.com/a.png', 'file:///etc/passwd'):
+            response = self.client.post(
+                '/api/colors/palette/from-image/',
+                {'imageUrl': url},
+                content_type='application/json'
+            )
+            self.assertEqual(response.status_code, 400, url)
+
+    def test_image_url_reads_uploaded_files(self):
+        with tempfile.TemporaryDirectory() as root, override_settings(MEDIA_ROOT=root):
+            name = default_storage.save('uploads/swatch.png', ContentFile(self.data))
+            response = self.client.post(
+                '/api/colors/palette/from-image/',
+                {'imageUrl': default_storage.url(name), 'count': 3},
+                content_type='application/json'
+            )
+            self.assertEqual(response.json()['colors'], ['#c81e1e', '#143cdc', '#fafafa'])
+            self.assertIsNone(self.extractor.storage_name('/media/../settings.py'))
+
+    def test_decompression_bombs_are_rejected(self):
+        with mock.patch.object(Image, 'MAX_IMAGE_PIXELS', 1000):
+            response = self.client.post('/api/colors/palette/from-image/', {
+                'image': SimpleUploadedFile('bomb.png', self.data, content_type='image/png'),
+            })
+        self.assertEqual(response.status_code, 400)
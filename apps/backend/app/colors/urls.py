@@ -5,6 +5,7 @@ urlpatterns = [
     path('api/colors/convert/', ColorViewSet.as_view({'post': 'convert'}), name='color-convert'),
     path('api/colors/validate/', ColorViewSet.as_view({'post': 'validate'}), name='color-validate'),
     path('api/colors/validate/batch/', ColorViewSet.as_view({'post': 'validate_batch'}), name='color-validate-batch'),
+    path('api/colors/profiles/', ColorViewSet.as_view({'get': 'profiles'}), name='color-profiles'),
     path('api/colors/pantone/search/', ColorViewSet.as_view({'get': 'pantone_search'}), name='pantone-search'),
     path('api/colors/pantone/', ColorViewSet.as_view({'get': 'pantone_list'}), name='pantone-list'),
     path('api/colors/pantone/<str:pk>/', ColorViewSet.as_view({'get': 'pantone_detail'}), name='pantone-detail'),
@@ -14,6 +15,7 @@ urlpatterns = [
     path('api/colors/harmony/', ColorViewSet.as_view({'post': 'harmony'}), name='color-harmony'),
     path('api/colors/palette/generate/', ColorViewSet.as_view({'post': 'palette_generate'}), name='palette-generate'),
     path('api/colors/palette/from-image/', ColorViewSet.as_view({'post': 'palette_from_image'}), name='palette-from-image'),
+    path('api/colors/palette/from-image/<str:task_id>/', ColorViewSet.as_view({'get': 'palette_from_image_status'}), name='palette-from-image-status'),
     path('api/colors/accessibility/', ColorViewSet.as_view({'post': 'accessibility'}), name='color-accessibility'),
     path('api/colors/interpolate/', ColorViewSet.as_view({'post': 'interpolate'}), name='color-interpolate'),
 ]
@@ -2,8 +2,14 @@
 Color Validation - Validate colors for print readiness
 Converted from TypeScript ColorValidation.ts
 """
-from typing import List, Dict, Any, Union
-from app.colors.conversion import ColorConversion, RGBColor, CMYKColor
+from typing import List, Dict, Any, Optional, Union
+import numpy as np
+from app.colors.conversion import (
+    ColorConversion, RGBColor, CMYKColor, hex_to_rgb_tuple, rgb_tuple_to_cmyk,
+    cmyk_tuple_to_rgb, rgb_tuple_to_lab, delta_e_lab
+)
+from app.colors.color_management import color_management
+from app.colors import vectorized
 
 
 class ColorValidationResult:
@@ -40,20 +46,31 @@ class ColorValidation:
     MAX_INK_COVERAGE = 300.0  # Standard limit is 300%
     MIN_RICH_BLACK_INK = 200.0
     
-    def validate_for_print(self, color: Union[str, RGBColor]) -> ColorValidationResult:
-        """Validate color for print"""
+    def validate_for_print(
+        self,
+        color: Union[str, RGBColor],
+        profile: Optional[str] = None,
+        intent: Optional[str] = None
+    ) -> ColorValidationResult:
+        """Validate color for print, optionally against an ICC output profile"""
+        if profile:
+            if not isinstance(color, str):
+                color = ColorConversion.rgb_to_hex(color)
+            return self.validate_many([color], profile, intent)[0]
+        
+        # Plain tuples throughout; no intermediate color objects
         if isinstance(color, str):
-            rgb = ColorConversion.hex_to_rgb(color)
+            r, g, b = hex_to_rgb_tuple(color)
         else:
-            rgb = color
+            r, g, b = color.r, color.g, color.b
         
-        cmyk = ColorConversion.rgb_to_cmyk(rgb)
+        c, m, y, k = rgb_tuple_to_cmyk(r, g, b)
         
         warnings = []
         errors = []
         
         # Calculate total ink coverage
-        ink_coverage = cmyk.c + cmyk.m + cmyk.y + cmyk.k
+        ink_coverage = c + m + y + k
         
         # Check ink coverage
         if ink_coverage > self.MAX_INK_COVERAGE:
@@ -66,27 +83,29 @@ class ColorValidation:
             )
         
         # Check for rich black
-        is_rich_black = self.is_rich_black(cmyk)
+        is_rich_black = k >= 80 and ink_coverage >= self.MIN_RICH_BLACK_INK
         if is_rich_black:
             warnings.append(
                 'This is a rich black. Ensure proper registration for best results.'
             )
         
         # Check if it's true black (K only)
-        if cmyk.c == 0 and cmyk.m == 0 and cmyk.y == 0 and cmyk.k == 100:
+        if c == 0 and m == 0 and y == 0 and k == 100:
             warnings.append(
                 'Using 100% K only. Consider using rich black (C60 M40 Y40 K100) for deeper black.'
             )
         
         # Check for very light colors
-        if cmyk.c < 5 and cmyk.m < 5 and cmyk.y < 5 and cmyk.k < 5:
+        if c < 5 and m < 5 and y < 5 and k < 5:
             warnings.append(
                 'Very light color. May appear almost white when printed.'
             )
         
         # Check for out-of-gamut colors
-        rgb_check = ColorConversion.cmyk_to_rgb(cmyk)
-        delta_e = ColorConversion.calculate_delta_e(rgb, rgb_check)
+        delta_e = delta_e_lab(
+            rgb_tuple_to_lab(r, g, b),
+            rgb_tuple_to_lab(*cmyk_tuple_to_rgb(c, m, y, k))
+        )
         
         if delta_e > 10:
             warnings.append(
@@ -113,9 +132,91 @@ class ColorValidation:
         """Calculate total ink coverage"""
         return cmyk.c + cmyk.m + cmyk.y + cmyk.k
     
-    def batch_validate(self, colors: List[str]) -> List[ColorValidationResult]:
+    def batch_validate(
+        self,
+        colors: List[str],
+        profile: Optional[str] = None,
+        intent: Optional[str] = None
+    ) -> List[ColorValidationResult]:
         """Batch validate colors"""
-        return [self.validate_for_print(color) for color in colors]
+        return self.validate_many(colors, profile, intent)
+    
+    def validate_many(
+        self,
+        colors: List[str],
+        profile: Optional[str] = None,
+        intent: Optional[str] = None
+    ) -> List[ColorValidationResult]:
+        """
+        Vectorized validate_for_print over many hex colors.
+        
+        Each distinct color is converted and checked once with NumPy; without
+        a profile the results match validate_for_print exactly. With an ICC
+        output profile, ink coverage and the round trip use that profile.
+        """
+        rgb = vectorized.parse_hex_colors(colors)
+        if not len(rgb):
+            return []
+        
+        packed = (rgb[:, 0].astype(np.int64) << 16) | (rgb[:, 1].astype(np.int64) << 8) | rgb[:, 2]
+        unique_packed, first_index, inverse = np.unique(packed, return_index=True, return_inverse=True)
+        unique_rgb = rgb[first_index]
+        
+        cmyk = color_management.rgb_to_cmyk(unique_rgb, profile, intent)
+        ink = cmyk.sum(axis=1)
+        delta_e = vectorized.delta_e(
+            vectorized.rgb_to_lab(unique_rgb),
+            vectorized.rgb_to_lab(color_management.cmyk_to_rgb(cmyk, profile, intent))
+        )
+        
+        c, m, y, k = (cmyk[:, i] for i in range(4))
+        over_limit = ink > self.MAX_INK_COVERAGE
+        high = ~over_limit & (ink > self.MAX_INK_COVERAGE * 0.9)
+        rich_black = (k >= 80) & (ink >= self.MIN_RICH_BLACK_INK)
+        k_only = (c == 0) & (m == 0) & (y == 0) & (k == 100)
+        very_light = (c < 5) & (m < 5) & (y < 5) & (k < 5)
+        shifts = delta_e > 10
+        
+        unique_results = []
+        for i in range(len(unique_packed)):
+            ink_coverage = int(ink[i])
+            warnings = []
+            errors = []
+            if over_limit[i]:
+                errors.append(
+                    f'Ink coverage ({ink_coverage}%) exceeds maximum ({self.MAX_INK_COVERAGE}%). May cause drying issues.'
+                )
+            elif high[i]:
+                warnings.append(
+                    f'Ink coverage ({ink_coverage}%) is high. Consider reducing for better print quality.'
+                )
+            if rich_black[i]:
+                warnings.append(
+                    'This is a rich black. Ensure proper registration for best results.'
+                )
+            if k_only[i]:
+                warnings.append(
+                    'Using 100% K only. Consider using rich black (C60 M40 Y40 K100) for deeper black.'
+                )
+            if very_light[i]:
+                warnings.append(
+                    'Very light color. May appear almost white when printed.'
+                )
+            if shifts[i]:
+                warnings.append(
+                    'Color may shift significantly when converted to CMYK. Preview in CMYK mode.'
+                )
+            is_print_safe = len(errors) == 0
+            unique_results.append(ColorValidationResult(
+                is_print_safe,
+                warnings,
+                errors,
+                ink_coverage,
+                bool(rich_black[i]),
+                is_print_safe
+            ))
+        
+        return [unique_results[i] for i in inverse.ravel()]
 
 
 color_validation = ColorValidation()
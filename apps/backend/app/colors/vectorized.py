@@ -0,0 +1,118 @@
+"""
+Vectorized Color Conversion - NumPy counterparts of ColorConversion
+Each function works on arrays of colors (one color per row) and reproduces
+the scalar formulas and rounding of ColorConversion exactly.
+"""
+from typing import Iterable, List
+import numpy as np
+
+
+# sRGB (D65) to XYZ matrix, rows are X, Y, Z
+RGB_TO_XYZ = np.array([
+    [0.4124564, 0.3575761, 0.1804375],
+    [0.2126729, 0.7151522, 0.072175],
+    [0.0193339, 0.119192, 0.9503041],
+])
+
+D65_WHITE = np.array([95.047, 100.0, 108.883])
+
+LAB_DELTA = 6 / 29
+
+
+def parse_hex_colors(colors: Iterable[str]) -> np.ndarray:
+    """
+    Parse '#rrggbb' strings into an (N, 3) uint8 array.
+    
+    Follows ColorConversion.hex_to_rgb and raises ValueError for anything
+    that is not a 6-digit hex color.
+    """
+    digits: List[str] = []
+    for color in colors:
+        value = color.lstrip('#')
+        if len(value) != 6:
+            raise ValueError('Invalid hex color')
+        digits.append(value)
+    if not digits:
+        return np.zeros((0, 3), dtype=np.uint8)
+    return np.frombuffer(bytes.fromhex(''.join(digits)), dtype=np.uint8).reshape(-1, 3)
+
+
+def rgb_to_hex(rgb: np.ndarray) -> List[str]:
+    """Format an (N, 3) RGB array as lowercase '#rrggbb' strings"""
+    data = np.clip(np.rint(rgb), 0, 255).astype(np.uint8)
+    return [f'#{bytes(row).hex()}' for row in data]
+
+
+def rgb_to_cmyk(rgb: np.ndarray) -> np.ndarray:
+    """Convert (N, 3) RGB in 0-255 to rounded (N, 4) CMYK in 0-100"""
+    rgb = np.asarray(rgb, dtype=np.float64) / 255.0
+    k = 1.0 - rgb.max(axis=-1)
+    black = k == 1.0
+    # Avoid dividing by zero for pure black; those rows are overwritten below
+    scale = np.where(black, 1.0, 1.0 - k)
+    cmy = ((1.0 - rgb - k[..., None]) / scale[..., None]) * 100
+    cmyk = np.concatenate([np.rint(cmy), np.rint(k * 100)[..., None]], axis=-1)
+    cmyk[black] = (0, 0, 0, 100)
+    return cmyk
+
+
+def cmyk_to_rgb(cmyk: np.ndarray) -> np.ndarray:
+    """Convert (N, 4) CMYK in 0-100 to rounded (N, 3) RGB"""
+    cmyk = np.asarray(cmyk, dtype=np.float64) / 100.0
+    k = cmyk[..., 3:4]
+    return np.rint(255 * (1.0 - cmyk[..., :3]) * (1.0 - k))
+
+
+def _lab_f(t: np.ndarray) -> np.ndarray:
+    return np.where(
+        t > LAB_DELTA ** 3,
+        np.power(t, 1 / 3),
+        t / (3 * LAB_DELTA ** 2) + 4 / 29
+    )
+
+
+def rgb_to_lab(rgb: np.ndarray, rounded: bool = True) -> np.ndarray:
+    """
+    Convert (N, 3) RGB in 0-255 to (N, 3) LAB (D65).
+    
+    With rounded=True values are rounded to two decimals like
+    ColorConversion.rgb_to_lab.
+    """
+    rgb = np.asarray(rgb, dtype=np.float64) / 255.0
+    linear = np.where(rgb > 0.04045, ((rgb + 0.055) / 1.055) ** 2.4, rgb / 12.92)
+    # Summed term by term (not as a matmul) to match the scalar float results
+    r, g, b = linear[..., 0], linear[..., 1], linear[..., 2]
+    xyz = np.stack([
+        (r * m[0] + g * m[1] + b * m[2]) * 100 for m in RGB_TO_XYZ
+    ], axis=-1)
+    f = _lab_f(xyz / D65_WHITE)
+    lab = np.stack([
+        116 * f[..., 1] - 16,
+        500 * (f[..., 0] - f[..., 1]),
+        200 * (f[..., 1] - f[..., 2]),
+    ], axis=-1)
+    if rounded:
+        lab = np.rint(lab * 100) / 100
+    return lab
+
+
+def delta_e(lab1: np.ndarray, lab2: np.ndarray) -> np.ndarray:
+    """CIE76 Delta E between matching rows of two LAB arrays"""
+    return np.sqrt(((np.asarray(lab1) - np.asarray(lab2)) ** 2).sum(axis=-1))
+
+
+def delta_e_matrix(lab: np.ndarray, dtype=np.float32) -> np.ndarray:
+    """
+    Pairwise CIE76 Delta E between all rows of an (N, 3) LAB array.
+    
+    Uses |a - b|^2 = |a|^2 + |b|^2 - 2ab so the (N, N) result is built with
+    one matrix product instead of an (N, N, 3) difference array. Values are
+    centered on the mean first to keep float32 cancellation error small.
+    """
+    lab = np.asarray(lab, dtype=np.float64)
+    points = (lab - lab.mean(axis=0)).astype(dtype) if len(lab) else lab.astype(dtype)
+    norms = (points * points).sum(axis=1)
+    squared = norms[:, None] + norms[None, :] - 2 * (points @ points.T)
+    np.maximum(squared, 0, out=squared)
+    np.fill_diagonal(squared, 0)
+    return np.sqrt(squared, out=squared)
@@ -1,3 +1,7 @@
+from celery.result import AsyncResult
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
@@ -6,6 +10,34 @@ from app.colors.services import color_service, Gradient, GradientStop
 from app.colors.validation import color_validation
 from app.colors.pantone_service import pantone_service
 from app.colors.conversion import ColorConversion
+from app.colors.color_management import color_management, UnknownProfileError
+from app.colors.image_palette import image_palette
+from app.colors.tasks import extract_image_palette
+from app.celery import app as celery_app
+
+
+def resolve_request_profile(params):
+    """
+    Resolve the CMYK output profile for a request.
+    
+    An explicit `profile` wins, then the profile of `designId`, then the
+    configured default. Returns (profile name or None, intent).
+    """
+    from app.designs.models import Design
+    from app.collaboration.services import get_actual_design_id
+    
+    profile = params.get('profile')
+    design_id = params.get('designId')
+    if not profile and design_id:
+        actual_design_id = get_actual_design_id(str(design_id))
+        if actual_design_id is None:
+            raise UnknownProfileError(f'Design not found: {design_id}')
+        profile = Design.objects.filter(id=actual_design_id).values_list(
+            'color_profile', flat=True
+        ).first()
+    intent = params.get('intent')
+    color_management.resolve_intent(intent)
+    return color_management.resolve_profile_name(profile), intent
 
 
 class ColorViewSet(viewsets.ViewSet):
@@ -31,8 +63,11 @@ class ColorViewSet(viewsets.ViewSet):
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            result = color_service.convert(color, from_format, to_format)
-            return Response({'result': result})
+            profile, intent = resolve_request_profile(request.data)
+            result = color_service.convert(color, from_format, to_format, profile, intent)
+            return Response({'result': result, 'profile': profile})
+        except UnknownProfileError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response(
                 {'error': str(e)},
@@ -54,8 +89,11 @@ class ColorViewSet(viewsets.ViewSet):
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            validation = color_service.validate(color)
+            profile, intent = resolve_request_profile(request.data)
+            validation = color_service.validate(color, profile, intent)
             return Response(validation)
+        except UnknownProfileError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response(
                 {'error': str(e)},
@@ -77,9 +115,30 @@ class ColorViewSet(viewsets.ViewSet):
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            results = color_validation.batch_validate(colors)
+            profile, intent = resolve_request_profile(request.data)
+            results = color_validation.batch_validate(colors, profile, intent)
             return Response({
-                'results': [r.to_dict() for r in results]
+                'results': [r.to_dict() for r in results],
+                'profile': profile
+            })
+        except UnknownProfileError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+    
+    @action(detail=False, methods=['get'], url_path='profiles')
+    def profiles(self, request):
+        """
+        List available ICC color profiles.
+        GET /api/colors/profiles
+        """
+        try:
+            return Response({
+                'profiles': color_management.list_profiles(),
+                'enabled': color_management.enabled
             })
         except Exception as e:
             return Response(
@@ -91,7 +150,7 @@ class ColorViewSet(viewsets.ViewSet):
     def pantone_search(self, request):
         """
         Search Pantone colors.
-        GET /api/colors/pantone/search?q=query
+        GET /api/colors/pantone/search?q=query&limit=20&offset=0&fuzzy=true
         """
         try:
             query = request.query_params.get('q')
@@ -102,9 +161,25 @@ class ColorViewSet(viewsets.ViewSet):
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            results = pantone_service.search(query)
+            try:
+                limit = request.query_params.get('limit')
+                limit = max(0, int(limit)) if limit is not None else None
+                offset = max(0, int(request.query_params.get('offset', 0)))
+            except ValueError:
+                return Response(
+                    {'error': 'limit and offset must be integers'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            fuzzy = request.query_params.get('fuzzy', 'true').lower() != 'false'
+            
+            page = pantone_service.search_ranked(query, limit, offset, fuzzy)
             return Response({
-                'results': [p.to_dict() for p in results]
+                'results': [
+                    {**p.to_dict(), **match} for p, match in page['results']
+                ],
+                'total': page['total'],
+                'limit': limit,
+                'offset': offset
             })
         except Exception as e:
             return Response(
@@ -322,20 +397,80 @@ class ColorViewSet(viewsets.ViewSet):
         """
         Extract colors from image.
         POST /api/colors/palette/from-image
+        
+        Accepts a multipart `image` upload or an `imageUrl` (a data: URL or
+        the URL of an uploaded file). Large images are processed in the background and
+        answered with 202 and a taskId.
         """
         try:
+            upload = request.FILES.get('image')
             image_url = request.data.get('imageUrl')
-            count = request.data.get('count', 5)
             
-            if not image_url:
+            if not upload and not image_url:
                 return Response(
-                    {'error': 'Missing required parameter: imageUrl'},
+                    {'error': 'Missing required parameter: image or imageUrl'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            import asyncio
-            colors = asyncio.run(color_service.extract_colors_from_image(image_url, count))
-            return Response({'colors': colors})
+            try:
+                count = max(1, min(int(request.data.get('count', 5)), image_palette.MAX_COLORS))
+                if upload:
+                    if upload.size > image_palette.MAX_IMAGE_BYTES:
+                        raise ValueError('Image is too large')
+                    data = upload.read()
+                else:
+                    data = image_palette.read_url(image_url)
+                
+                palette = image_palette.get_cached(data, count)
+                if palette is None and image_palette.needs_background(data):
+                    path = default_storage.save(
+                        f'palette-uploads/{image_palette.content_hash(data)}',
+                        ContentFile(data)
+                    )
+                    task = extract_image_palette.delay(path, count)
+                    return Response(
+                        {'taskId': task.id, 'status': 'pending'},
+                        status=status.HTTP_202_ACCEPTED
+                    )
+                if palette is None:
+                    palette = image_palette.extract(data, count)
+            except (ValueError, OSError, Image.DecompressionBombError) as e:
+                # UnidentifiedImageError is an OSError
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            
+            return Response({
+                'colors': [entry['color'] for entry in palette],
+                'palette': palette
+            })
+        except Exception as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+    
+    @action(detail=False, methods=['get'], url_path=r'palette/from-image/(?P<task_id>[^/.]+)')
+    def palette_from_image_status(self, request, task_id=None):
+        """
+        Get the result of a background palette extraction.
+        GET /api/colors/palette/from-image/:taskId
+        """
+        try:
+            result = AsyncResult(task_id, app=celery_app)
+            if result.successful():
+                palette = result.result
+                return Response({
+                    'taskId': task_id,
+                    'status': 'completed',
+                    'colors': [entry['color'] for entry in palette],
+                    'palette': palette
+                })
+            if result.failed():
+                return Response({
+                    'taskId': task_id,
+                    'status': 'failed',
+                    'error': str(result.result)
+                })
+            return Response({'taskId': task_id, 'status': result.state.lower()})
         except Exception as e:
             return Response(
                 {'error': str(e)},
@@ -0,0 +1,168 @@
+"""
+Color Consolidation Service - Merge near-identical colors into shared inks
+"""
+from typing import Any, Dict, List, Optional, Sequence
+import numpy as np
+from django.db import transaction
+from django.utils import timezone
+from app.designs.models import Design, DesignObject
+from app.designs.color_usage_service import (
+    color_usage_service, iter_property_colors, parse_hex_color
+)
+from app.colors import vectorized
+from app.collaboration.leases import edit_leases
+from app.collaboration.operations import operation_service
+
+
+class ColorConsolidationService:
+    """
+    Group a design's colors by Delta E and rewrite objects to one color per group.
+    
+    Colors are visited from most to least used; each unassigned color starts
+    a group and absorbs every unassigned color within the threshold of it, so
+    every replacement is within the threshold of the color it replaces.
+    """
+    
+    DEFAULT_THRESHOLD = 3.0  # CIE76 Delta E; ~2.3 is a just noticeable difference
+    
+    def delta_e_matrix(self, colors: Sequence[str]) -> np.ndarray:
+        """Pairwise Delta E between '#rrggbb' colors"""
+        return vectorized.delta_e_matrix(
+            vectorized.rgb_to_lab(vectorized.parse_hex_colors(colors))
+        )
+    
+    def cluster(
+        self,
+        colors: Sequence[str],
+        counts: Sequence[int],
+        threshold: float
+    ) -> List[Dict[str, Any]]:
+        """
+        Group colors; colors must be ordered by descending count.
+        
+        Returns [{'color', 'count', 'members': [{'color', 'count', 'deltaE'}]}]
+        where members excludes the group's own color.
+        """
+        if not colors:
+            return []
+        distances = self.delta_e_matrix(colors)
+        unassigned = np.ones(len(colors), dtype=bool)
+        groups = []
+        for leader in range(len(colors)):
+            if not unassigned[leader]:
+                continue
+            row = distances[leader]
+            members = np.flatnonzero(unassigned & (row <= threshold))
+            unassigned[members] = False
+            groups.append({
+                'color': colors[leader],
+                'count': int(sum(counts[i] for i in members)),
+                'members': [
+                    {
+                        'color': colors[i],
+                        'count': int(counts[i]),
+                        'deltaE': round(float(row[i]), 2)
+                    }
+                    for i in members if i != leader
+                ]
+            })
+        return groups
+    
+    def propose(self, design_id: str, threshold: Optional[float] = None) -> Dict[str, Any]:
+        """Consolidated palette for a design, without changing it"""
+        threshold = self.DEFAULT_THRESHOLD if threshold is None else float(threshold)
+        usages = color_usage_service.collect(design_id)['usages']
+        
+        # Most used first, ties broken by color for stable output
+        colors = sorted(usages, key=lambda c: (-len(usages[c]), c))
+        groups = self.cluster(colors, [len(usages[c]) for c in colors], threshold)
+        mapping = {
+            member['color']: group['color']
+            for group in groups
+            for member in group['members']
+        }
+        return {
+            'designId': str(design_id),
+            'threshold': threshold,
+            'uniqueColors': len(colors),
+            'consolidatedColors': len(groups),
+            'groups': [group for group in groups if group['members']],
+            'mapping': mapping,
+        }
+    
+    def apply(
+        self,
+        design_id: str,
+        threshold: Optional[float] = None,
+        mapping: Optional[Dict[str, str]] = None,
+        user_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Rewrite object properties so each mapped color uses its replacement.
+        
+        mapping is {from: to} (as returned by propose); without it a fresh
+        proposal at threshold is applied. All objects are updated in one
+        transaction with a single bulk_update, and each rewrite is logged
+        as an applied patch. Nothing is changed, and LeaseConflict is raised,
+        if another user holds the edit lease on any object to be rewritten.
+        """
+        if mapping is None:
+            mapping = self.propose(design_id, threshold)['mapping']
+        normalized = {}
+        for source, target in mapping.items():
+            source_hex = parse_hex_color(str(source))
+            target_hex = parse_hex_color(str(target))
+            if not source_hex or not target_hex:
+                raise ValueError(f'Invalid color mapping: {source} -> {target}')
+            if source_hex != target_hex:
+                normalized[source_hex] = target_hex
+        
+        updated = []
+        replaced = 0
+        with transaction.atomic():
+            design = Design.objects.select_for_update().get(id=design_id)
+            now = timezone.now()
+            for obj in DesignObject.objects.filter(design=design).only('id', 'properties'):
+                count = replace_colors(obj.properties, normalized)
+                if count:
+                    obj.updated_at = now
+                    updated.append(obj)
+                    replaced += count
+            if updated:
+                edit_leases.check(design.id, [obj.id for obj in updated], user_id)
+                DesignObject.objects.bulk_update(updated, ['properties', 'updated_at'], batch_size=500)
+                design.save(update_fields=['updated_at'])
+                operation_service.log_applied(
+                    design.id, user_id, 'patch', [(obj.id, {'properties': obj.properties}) for obj in updated]
+                )
+        
+        return {
+            'designId': str(design_id),
+            'mapping': normalized,
+            'updatedObjects': len(updated),
+            'replacedUsages': replaced,
+        }
+
+
+def replace_colors(properties: Any, mapping: Dict[str, str]) -> int:
+    """
+    Replace mapped colors in a properties tree in place.
+    An 8-digit color keeps its alpha. Returns the number of replacements.
+    """
+    if not mapping or not properties:
+        return 0
+    replacements = []
+    for path, value in iter_property_colors(properties):
+        target = mapping.get(parse_hex_color(value) or '')
+        if target:
+            digits = value.strip().lstrip('#')
+            replacements.append((path, target + digits[6:] if len(digits) == 8 else target))
+    for path, value in replacements:
+        node = properties
+        for part in path[:-1]:
+            node = node[part]
+        node[path[-1]] = value
+    return len(replacements)
+
+
+color_consolidation_service = ColorConsolidationService()
@@ -0,0 +1,168 @@
+"""
+Color Usage Service - Find and validate every color a design uses
+"""
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from app.designs.models import DesignObject
+from app.colors.validation import color_validation
+
+
+# Keys whose string values are colors, in addition to any key ending in "color"
+COLOR_KEYS = {'fill', 'stroke', 'textFill', 'textStroke', 'backgroundColor'}
+
+# Values that are valid "no color" markers rather than unsupported colors
+EMPTY_COLOR_VALUES = {'', 'none', 'transparent'}
+
+HEX_DIGITS = frozenset('0123456789abcdef')
+
+Path = Tuple[Any, ...]
+
+
+def parse_hex_color(value: str) -> Optional[str]:
+    """
+    Normalize #rgb, #rrggbb and #rrggbbaa to lowercase '#rrggbb'.
+    Returns None for anything else.
+    """
+    digits = value.strip().lstrip('#').lower()
+    if not HEX_DIGITS.issuperset(digits):
+        return None
+    if len(digits) == 3:
+        digits = ''.join(ch * 2 for ch in digits)
+    elif len(digits) == 8:
+        digits = digits[:6]
+    elif len(digits) != 6:
+        return None
+    return f'#{digits}'
+
+
+def is_color_key(key: Any) -> bool:
+    return isinstance(key, str) and (key in COLOR_KEYS or key.lower().endswith('color'))
+
+
+def iter_property_colors(node: Any, path: Path = ()) -> Iterator[Tuple[Path, str]]:
+    """
+    Yield (path, value) for every color string in a properties tree.
+    Covers solid fills, strokes, gradient stops, text and effect colors.
+    """
+    if isinstance(node, dict):
+        items = node.items()
+    elif isinstance(node, list):
+        items = enumerate(node)
+    else:
+        return
+    for key, value in items:
+        if isinstance(value, str):
+            if is_color_key(key):
+                yield path + (key,), value
+        elif isinstance(value, (dict, list)):
+            yield from iter_property_colors(value, path + (key,))
+
+
+def format_path(path: Path) -> str:
+    """Render a properties path as 'fill.gradient.stops[1].color'"""
+    out = ''
+    for part in path:
+        if isinstance(part, int):
+            out += f'[{part}]'
+        else:
+            out += f'.{part}' if out else part
+    return out
+
+
+def color_role(path: Path, object_type: str) -> str:
+    """Classify a color usage for reporting"""
+    parts = [p.lower() for p in path if isinstance(p, str)]
+    if 'stops' in parts:
+        return 'gradient'
+    if any('stroke' in p or 'border' in p for p in parts):
+        return 'stroke'
+    if 'effects' in parts:
+        return 'effect'
+    if 'fill' in parts:
+        return 'fill'
+    if object_type == 'text':
+        return 'text'
+    return 'other'
+
+
+class ColorUsageService:
+    """Extract, deduplicate and validate the colors used by a design"""
+    
+    def collect(self, design_id: str) -> Dict[str, Any]:
+        """
+        Walk every object of a design once and group color usages.
+        
+        Returns {'objectCount', 'usages': {hex: [usage, ...]}, 'unsupported': [...]}
+        where usage is a dict referencing the object and the property path.
+        """
+        usages: Dict[str, List[Dict[str, Any]]] = {}
+        unsupported: List[Dict[str, Any]] = []
+        object_count = 0
+        
+        objects = DesignObject.objects.filter(design_id=design_id).values_list(
+            'id', 'type', 'name', 'properties'
+        )
+        for object_id, object_type, name, properties in objects.iterator():
+            object_count += 1
+            for path, value in iter_property_colors(properties or {}):
+                ref = {
+                    'objectId': str(object_id),
+                    'objectType': object_type,
+                    'objectName': name,
+                    'path': format_path(path),
+                    'role': color_role(path, object_type),
+                }
+                color = parse_hex_color(value)
+                if color:
+                    usages.setdefault(color, []).append(ref)
+                elif value.strip().lower() not in EMPTY_COLOR_VALUES:
+                    unsupported.append({**ref, 'value': value})
+        
+        return {
+            'objectCount': object_count,
+            'usages': usages,
+            'unsupported': unsupported,
+        }
+    
+    def audit(self, design_id: str) -> Dict[str, Any]:
+        """Color audit: unique colors with usage counts, references and print validation"""
+        collected = self.collect(design_id)
+        usages = collected['usages']
+        
+        # Most used first, ties broken by color for stable output
+        colors = sorted(usages, key=lambda c: (-len(usages[c]), c))
+        validations = color_validation.validate_many(colors)
+        
+        report = []
+        summary = {'printSafe': 0, 'withWarnings': 0, 'withErrors': 0}
+        for color, validation in zip(colors, validations):
+            refs = usages[color]
+            roles: Dict[str, int] = {}
+            for ref in refs:
+                roles[ref['role']] = roles.get(ref['role'], 0) + 1
+            report.append({
+                'color': color,
+                'count': len(refs),
+                'objectCount': len({ref['objectId'] for ref in refs}),
+                'roles': roles,
+                'usages': refs,
+                'validation': validation.to_dict(),
+            })
+            if validation.errors:
+                summary['withErrors'] += 1
+            else:
+                summary['printSafe'] += 1
+            if validation.warnings:
+                summary['withWarnings'] += 1
+        
+        return {
+            'designId': str(design_id),
+            'objectCount': collected['objectCount'],
+            'uniqueColors': len(report),
+            'totalUsages': sum(entry['count'] for entry in report),
+            'summary': summary,
+            'colors': report,
+            'unsupported': collected['unsupported'],
+        }
+
+
+color_usage_service = ColorUsageService()
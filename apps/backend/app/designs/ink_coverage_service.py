@@ -0,0 +1,382 @@
+"""
+Ink Coverage Service - Total area coverage (TAC) analysis of rendered designs
+"""
+import math
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import numpy as np
+from app.designs.models import Design, DesignObject
+from app.designs.color_usage_service import parse_hex_color
+from app.colors.color_management import color_management
+from app.colors.validation import ColorValidation
+
+
+def parse_rgba(value: Any) -> Optional[Tuple[np.ndarray, float]]:
+    """Parse a hex color into (rgb array, alpha); None for anything else"""
+    if not isinstance(value, str):
+        return None
+    color = parse_hex_color(value)
+    if color is None:
+        return None
+    digits = value.strip().lstrip('#')
+    alpha = int(digits[6:8], 16) / 255.0 if len(digits) == 8 else 1.0
+    rgb = np.frombuffer(bytes.fromhex(color[1:]), dtype=np.uint8).astype(np.float64)
+    return rgb, alpha
+
+
+class DesignRasterizer:
+    """
+    Low-resolution ink rasterizer for coverage analysis.
+    
+    Draws object fills in z-order on blank paper, keeping C, M, Y and K
+    coverage (0-100) per pixel the way separations stack: a fill knocks
+    out the inks below it, an overprinting fill (properties.overprint)
+    replaces only the inks it uses, and a multiply blend
+    (properties.blendMode) adds its inks to those below. Opacity blends in
+    ink space, like a CMYK transparency blending space.
+    
+    Handles rectangles, ellipses, linear/radial gradients, rotation and
+    opacity. Glyphs and paths are not rasterized; text and paths cover
+    their whole box, which overstates ink rather than hiding it. Images
+    cannot be analyzed and are reported.
+    """
+    
+    ELLIPSE_SHAPES = {'circle', 'ellipse'}
+    STROKE_ONLY_SHAPES = {'line', 'arrow'}
+    
+    def __init__(
+        self,
+        width: float,
+        height: float,
+        dpi: float,
+        origin: float = 0.0,
+        to_cmyk: Optional[Callable[[np.ndarray], np.ndarray]] = None
+    ):
+        self.dpi = dpi
+        self.origin = origin
+        # (N, 3) sRGB 0-255 to (N, 4) CMYK 0-100
+        self.to_cmyk = to_cmyk or color_management.rgb_to_cmyk
+        self._inks: Dict[bytes, np.ndarray] = {}
+        self.shape = (max(1, int(math.ceil(height * dpi))), max(1, int(math.ceil(width * dpi))))
+        self.ink = np.zeros(self.shape + (4,))
+        # Index (into the drawn objects) of the top-most object at each pixel
+        self.owner = np.full(self.shape, -1, dtype=np.int32)
+    
+    @property
+    def coverage(self) -> np.ndarray:
+        """Total area coverage, C+M+Y+K, of each pixel"""
+        return self.ink.sum(axis=-1)
+    
+    def draw(self, index: int, obj: Dict[str, Any]) -> bool:
+        """Composite one object; returns False when it cannot be rasterized"""
+        props = obj['properties'] or {}
+        object_type = obj['type']
+        if object_type == 'image':
+            return False
+        if object_type == 'shape' and props.get('shape') in self.STROKE_ONLY_SHAPES:
+            return True
+        
+        window = self._window(obj)
+        if window is None:
+            return True
+        rows, cols, u, v = window
+        ellipse = object_type == 'shape' and props.get('shape') in self.ELLIPSE_SHAPES
+        inside = ((u - 0.5) ** 2 + (v - 0.5) ** 2 <= 0.25) if ellipse else (
+            (u >= 0) & (u <= 1) & (v >= 0) & (v <= 1)
+        )
+        if not inside.any():
+            return True
+        
+        opacity = float(obj['opacity'])
+        mode = 'overprint' if props.get('overprint') else props.get('blendMode')
+        target = self.ink[rows, cols]
+        owner = self.owner[rows, cols]
+        for paint in self._paints(object_type, props):
+            color, alpha = self._shade(paint, u, v)
+            if color is None:
+                continue
+            result = self._stack(target, color, mode)
+            if np.isscalar(alpha):
+                alpha *= opacity
+                if alpha >= 1:
+                    # Opaque fill: plain assignment
+                    target[inside] = np.broadcast_to(result, target.shape)[inside]
+                    owner[inside] = index
+                    continue
+                alpha = np.where(inside, alpha, 0.0)
+            else:
+                alpha = alpha * opacity * inside
+            target += (result - target) * alpha[..., None]
+            owner[alpha > 0] = index
+        return True
+    
+    @staticmethod
+    def _stack(below: np.ndarray, paint: np.ndarray, mode: Optional[str]) -> np.ndarray:
+        """Inks where an opaque paint lands on `below`"""
+        if mode == 'overprint':
+            # Inks the paint does not use are not knocked out
+            return np.where(paint > 0, paint, below)
+        if mode == 'multiply':
+            return below + paint - below * paint / 100
+        return paint
+    
+    def _cmyk(self, rgb: np.ndarray) -> np.ndarray:
+        """Inks of one sRGB color, converted once per rasterizer"""
+        key = rgb.tobytes()
+        ink = self._inks.get(key)
+        if ink is None:
+            ink = self._inks[key] = np.asarray(self.to_cmyk(rgb[None, :]), dtype=np.float64)[0]
+        return ink
+    
+    def _paints(self, object_type: str, props: Dict[str, Any]) -> List[Any]:
+        """Fills to composite for an object, bottom first"""
+        if object_type == 'text':
+            return [props.get('backgroundColor'), props.get('textFill') or props.get('color')]
+        return [props.get('fill')]
+    
+    def _window(self, obj: Dict[str, Any]):
+        """
+        Pixel window covering the (rotated) object and each pixel's position
+        in the object's unit square.
+        """
+        x = float(obj['x']) - self.origin
+        y = float(obj['y']) - self.origin
+        width = float(obj['width'])
+        height = float(obj['height'])
+        if width <= 0 or height <= 0:
+            return None
+        
+        angle = math.radians(float(obj['rotation'] or 0))
+        cos, sin = math.cos(angle), math.sin(angle)
+        cx, cy = x + width / 2, y + height / 2
+        half_w = (abs(width * cos) + abs(height * sin)) / 2
+        half_h = (abs(width * sin) + abs(height * cos)) / 2
+        
+        top = max(0, int(math.floor((cy - half_h) * self.dpi)))
+        bottom = min(self.shape[0], int(math.ceil((cy + half_h) * self.dpi)))
+        left = max(0, int(math.floor((cx - half_w) * self.dpi)))
+        right = min(self.shape[1], int(math.ceil((cx + half_w) * self.dpi)))
+        if top >= bottom or left >= right:
+            return None
+        
+        # Pixel centers, rotated back into the object's frame
+        py = (np.arange(top, bottom) + 0.5)[:, None] / self.dpi - cy
+        px = (np.arange(left, right) + 0.5)[None, :] / self.dpi - cx
+        local_x = px * cos + py * sin
+        local_y = -px * sin + py * cos
+        u = local_x / width + 0.5
+        v = local_y / height + 0.5
+        return slice(top, bottom), slice(left, right), u, v
+    
+    def _shade(self, paint: Any, u: np.ndarray, v: np.ndarray):
+        """
+        Color and alpha of a paint over the window: per-pixel arrays for
+        gradients, a single color and scalar alpha for solids, (None, None)
+        when there is nothing to paint.
+        """
+        if isinstance(paint, dict):
+            gradient = paint.get('gradient')
+            if paint.get('type') == 'gradient' and isinstance(gradient, dict):
+                return self._gradient(gradient, u, v)
+            paint = paint.get('color')
+        parsed = parse_rgba(paint)
+        if parsed is None:
+            return None, None
+        rgb, alpha = parsed
+        return self._cmyk(rgb), alpha
+    
+    def _gradient(self, gradient: Dict[str, Any], u: np.ndarray, v: np.ndarray):
+        stops = []
+        for stop in gradient.get('stops') or []:
+            parsed = parse_rgba(stop.get('color')) if isinstance(stop, dict) else None
+            if parsed is not None:
+                rgb, alpha = parsed
+                opacity = stop.get('opacity')
+                stops.append((float(stop.get('position', 0)), self._cmyk(rgb), alpha * (1.0 if opacity is None else float(opacity))))
+        if not stops:
+            return None, None
+        stops.sort(key=lambda s: s[0])
+        
+        if gradient.get('type') == 'radial':
+            cx = float(gradient.get('centerX', 0.5))
+            cy = float(gradient.get('centerY', 0.5))
+            t = np.sqrt((u - cx) ** 2 + (v - cy) ** 2) / math.sqrt(0.5)
+        else:
+            # CSS angles: 0deg points up, 90deg points right
+            angle = math.radians(float(gradient.get('angle') or 0))
+            dx, dy = math.sin(angle), -math.cos(angle)
+            extent = abs(dx) + abs(dy)
+            t = ((u - 0.5) * dx + (v - 0.5) * dy) / extent + 0.5
+        
+        # Stops are interpolated in ink space, as in a CMYK document
+        positions = [s[0] for s in stops]
+        color = np.stack([
+            np.interp(t, positions, [s[1][channel] for s in stops]) for channel in range(4)
+        ], axis=-1)
+        alpha = np.interp(t, positions, [s[2] for s in stops])
+        return color, alpha
+
+
+def connected_regions(mask: np.ndarray) -> List[Dict[str, Any]]:
+    """
+    4-connected regions of a boolean mask via run-length union-find.
+    Returns [{'top', 'left', 'bottom', 'right', 'pixels', 'labels'}] with
+    labels a per-pixel boolean mask cropped to the region's bounds.
+    """
+    parent: List[int] = []
+    
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+    
+    runs = []  # (row, start, end, id)
+    previous: List[Tuple[int, int, int]] = []
+    for row in range(mask.shape[0]):
+        line = np.concatenate(([False], mask[row], [False])).astype(np.int8)
+        edges = np.flatnonzero(np.diff(line))
+        current = []
+        for start, end in zip(edges[::2].tolist(), edges[1::2].tolist()):
+            run_id = len(parent)
+            parent.append(run_id)
+            for prev_start, prev_end, prev_id in previous:
+                if prev_start < end and start < prev_end:
+                    a, b = find(run_id), find(prev_id)
+                    if a != b:
+                        parent[max(a, b)] = min(a, b)
+            current.append((start, end, run_id))
+            runs.append((row, start, end, run_id))
+        previous = current
+    
+    regions: Dict[int, Dict[str, Any]] = {}
+    for row, start, end, run_id in runs:
+        root = find(run_id)
+        region = regions.get(root)
+        if region is None:
+            region = regions[root] = {'top': row, 'bottom': row + 1, 'left': start, 'right': end, 'runs': []}
+        region['bottom'] = row + 1
+        region['left'] = min(region['left'], start)
+        region['right'] = max(region['right'], end)
+        region['runs'].append((row, start, end))
+    
+    result = []
+    for region in regions.values():
+        labels = np.zeros((region['bottom'] - region['top'], region['right'] - region['left']), dtype=bool)
+        for row, start, end in region.pop('runs'):
+            labels[row - region['top'], start - region['left']:end - region['left']] = True
+        region['labels'] = labels
+        region['pixels'] = int(labels.sum())
+        result.append(region)
+    return result
+
+
+class InkCoverageService:
+    """Render a design at low resolution and report total ink coverage"""
+    
+    DEFAULT_DPI = 36
+    MAX_PIXELS = 1_000_000
+    HEATMAP_SIZE = 64  # Longest side of the returned heatmap, in cells
+    MAX_REGIONS = 50
+    
+    def analyze(
+        self,
+        design_id: str,
+        dpi: Optional[float] = None,
+        profile: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Coverage heatmap and the regions exceeding MAX_INK_COVERAGE.
+        
+        The page includes the bleed. Colors are separated with profile,
+        which defaults to the design's color profile; the naive conversion
+        is used without one. A single separated color stays within the
+        limit, so regions come from inks stacked by overlapping objects.
+        """
+        design = Design.objects.get(id=design_id)
+        bleed = float(design.bleed or 0)
+        width = float(design.width) + 2 * bleed
+        height = float(design.height) + 2 * bleed
+        
+        dpi = float(dpi or self.DEFAULT_DPI)
+        dpi = min(dpi, math.sqrt(self.MAX_PIXELS / (width * height)))
+        profile = color_management.resolve_profile_name(profile or design.color_profile)
+        
+        objects = list(
+            DesignObject.objects.filter(design=design, visible=True)
+            .order_by('z_index')
+            .values('id', 'type', 'x', 'y', 'width', 'height', 'rotation', 'opacity', 'properties')
+        )
+        rasterizer = DesignRasterizer(
+            width, height, dpi, origin=-bleed,
+            to_cmyk=lambda rgb: color_management.rgb_to_cmyk(rgb, profile)
+        )
+        unrendered = []
+        for index, obj in enumerate(objects):
+            if not rasterizer.draw(index, obj):
+                unrendered.append({'objectId': str(obj['id']), 'type': obj['type']})
+        
+        coverage = rasterizer.coverage
+        limit = ColorValidation.MAX_INK_COVERAGE
+        over = coverage > limit
+        
+        return {
+            'designId': str(design.id),
+            'dpi': round(dpi, 2),
+            'profile': profile,
+            'limit': limit,
+            'maxCoverage': int(round(coverage.max())),
+            'meanCoverage': round(float(coverage.mean()), 1),
+            'pixelsOverLimit': int(over.sum()),
+            'percentOverLimit': round(float(over.mean()) * 100, 2),
+            'heatmap': self.heatmap(coverage),
+            'regions': self.regions(coverage, over, rasterizer, objects, dpi, bleed),
+            'unrendered': unrendered,
+        }
+    
+    def heatmap(self, coverage: np.ndarray) -> Dict[str, Any]:
+        """Max-pooled coverage grid, so hotspots survive downsampling"""
+        height, width = coverage.shape
+        cell = max(1, int(math.ceil(max(height, width) / self.HEATMAP_SIZE)))
+        rows, cols = -(-height // cell), -(-width // cell)
+        padded = np.zeros((rows * cell, cols * cell))
+        padded[:height, :width] = coverage
+        pooled = padded.reshape(rows, cell, cols, cell).max(axis=(1, 3))
+        return {
+            'rows': rows,
+            'cols': cols,
+            'cellSize': cell,
+            'values': pooled.astype(int).tolist(),
+        }
+    
+    def regions(
+        self,
+        coverage: np.ndarray,
+        over: np.ndarray,
+        rasterizer: DesignRasterizer,
+        objects: List[Dict[str, Any]],
+        dpi: float,
+        bleed: float
+    ) -> List[Dict[str, Any]]:
+        """Connected areas over the limit, largest first, in document units"""
+        result = []
+        for region in connected_regions(over):
+            rows = slice(region['top'], region['bottom'])
+            cols = slice(region['left'], region['right'])
+            labels = region['labels']
+            values = coverage[rows, cols][labels]
+            owners = np.unique(rasterizer.owner[rows, cols][labels])
+            result.append({
+                'x': round(region['left'] / dpi - bleed, 4),
+                'y': round(region['top'] / dpi - bleed, 4),
+                'width': round((region['right'] - region['left']) / dpi, 4),
+                'height': round((region['bottom'] - region['top']) / dpi, 4),
+                'area': round(region['pixels'] / dpi ** 2, 4),
+                'maxCoverage': int(round(values.max())),
+                'meanCoverage': round(float(values.mean()), 1),
+                'objectIds': [str(objects[i]['id']) for i in owners if i >= 0],
+            })
+        result.sort(key=lambda r: -r['area'])
+        return result[:self.MAX_REGIONS]
+
+
+ink_coverage_service = InkCoverageService()
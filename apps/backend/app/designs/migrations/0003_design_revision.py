@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('designs', '0002_design_color_profile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='design',
+            name='revision',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('designs', '0003_design_revision'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='design',
+            index=models.Index(fields=['name', '-created_at'], name='designs_name_9f0e84_idx'),
+        ),
+    ]
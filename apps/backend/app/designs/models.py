@@ -12,7 +12,10 @@ class Design(models.Model):
     dpi = models.IntegerField(default=300)
     bleed = models.DecimalField(max_digits=10, decimal_places=2, default=0.125)
     color_mode = models.CharField(max_length=10, default='rgb')
+    color_profile = models.CharField(max_length=100, null=True, blank=True)
     last_edited_by = models.CharField(max_length=255, null=True, blank=True)
+    # Sequence number of the last operation in the design's operation log
+    revision = models.BigIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -22,6 +25,8 @@ class Design(models.Model):
         indexes = [
             models.Index(fields=['user_id']),
             models.Index(fields=['updated_at']),
+            # Alias lookups resolve a name to its newest design
+            models.Index(fields=['name', '-created_at']),
         ]
 
 
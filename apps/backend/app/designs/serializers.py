@@ -1,5 +1,16 @@
 from rest_framework import serializers
 from app.designs.models import Design, DesignObject
+from app.colors.color_management import color_management, UnknownProfileError
+
+
+def validate_color_profile(value):
+    """Normalize a CMYK output profile name and reject unknown ones."""
+    if not value:
+        return None
+    try:
+        return color_management.resolve_profile_name(value)
+    except UnknownProfileError as e:
+        raise serializers.ValidationError(str(e))
 
 
 class DesignObjectSerializer(serializers.ModelSerializer):
@@ -19,9 +30,10 @@ class DesignSerializer(serializers.ModelSerializer):
         model = Design
         fields = [
             'id', 'user_id', 'name', 'width', 'height', 'unit', 'dpi', 'bleed',
-            'color_mode', 'last_edited_by', 'created_at', 'updated_at', 'objects'
+            'color_mode', 'color_profile', 'last_edited_by', 'revision', 'created_at', 'updated_at',
+            'objects'
         ]
-        read_only_fields = ['id', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'revision', 'created_at', 'updated_at']
     
     def get_objects(self, obj):
         """Get design objects using the new related_name."""
@@ -33,16 +45,22 @@ class DesignCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Design
         fields = [
-            'name', 'width', 'height', 'unit', 'dpi', 'bleed', 'color_mode'
+            'name', 'width', 'height', 'unit', 'dpi', 'bleed', 'color_mode', 'color_profile'
         ]
+    
+    def validate_color_profile(self, value):
+        return validate_color_profile(value)
 
 
 class DesignUpdateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Design
         fields = [
-            'name', 'width', 'height', 'unit', 'dpi', 'bleed', 'color_mode'
+            'name', 'width', 'height', 'unit', 'dpi', 'bleed', 'color_mode', 'color_profile'
         ]
+    
+    def validate_color_profile(self, value):
+        return validate_color_profile(value)
 
 
 class DesignObjectCreateSerializer(serializers.ModelSerializer):
@@ -0,0 +1,184 @@
+"""
+Tests for design endpoints and services.
+"""
+
+import numpy as np
+from django.test import TestCase
+from app.designs.models import Design, DesignObject
+from app.designs.ink_coverage_service import ink_coverage_service
+from app.colors.validation import ColorValidation
+from app.collaboration.change_log import change_log
+
+
+class DesignTestMixin:
+    """Helpers for building designs in tests."""
+
+    def create_design(self, **kwargs):
+        # Write change log entries queued by the test while its database exists
+        self.addCleanup(change_log.flush)
+        defaults = {'user_id': 'owner', 'name': 'Test design', 'width': 8.5, 'height': 11}
+        defaults.update(kwargs)
+        return Design.objects.create(**defaults)
+
+    def create_object(self, design, z_index=0, properties=None, **kwargs):
+        defaults = {'type': 'shape', 'x': 0, 'y': 0, 'width': 10, 'height': 10}
+        defaults.update(kwargs)
+        return DesignObject.objects.create(
+            design=design,
+            z_index=z_index,
+            properties=properties if properties is not None else {},
+            **defaults
+        )
+
+
+class DesignColorAuditTestCase(DesignTestMixin, TestCase):
+    """Test cases for GET /api/designs/:id/colors/."""
+
+    def test_colors_are_extracted_and_deduplicated(self):
+        design = self.create_design()
+        shape = self.create_object(design, properties={
+            'fill': {'type': 'solid', 'color': '#FF0000'},
+            'stroke': {'width': 1, 'color': '#000'},
+        })
+        self.create_object(design, z_index=1, properties={
+            'fill': {'type': 'gradient', 'gradient': {'stops': [
+                {'position': 0, 'color': '#ff0000'},
+                {'position': 1, 'color': '#0000ff'},
+            ]}},
+        })
+        self.create_object(design, z_index=2, type='text', properties={
+            'text': 'Hello', 'color': '#0000FF', 'backgroundColor': 'transparent',
+            'textFill': 'rgb(1, 2, 3)',
+        })
+
+        response = self.client.get(f'/api/designs/{design.id}/colors/')
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['objectCount'], 3)
+        self.assertEqual(data['uniqueColors'], 3)
+        self.assertEqual(data['totalUsages'], 5)
+
+        by_color = {entry['color']: entry for entry in data['colors']}
+        self.assertEqual(by_color['#ff0000']['count'], 2)
+        self.assertEqual(by_color['#ff0000']['roles'], {'fill': 1, 'gradient': 1})
+        self.assertEqual(by_color['#0000ff']['roles'], {'gradient': 1, 'text': 1})
+        self.assertEqual(by_color['#000000']['usages'][0], {
+            'objectId': str(shape.id),
+            'objectType': 'shape',
+            'objectName': None,
+            'path': 'stroke.color',
+            'role': 'stroke',
+        })
+        self.assertIn('isPrintSafe', by_color['#000000']['validation'])
+        self.assertEqual([u['value'] for u in data['unsupported']], ['rgb(1, 2, 3)'])
+
+
+class DesignColorConsolidationTestCase(DesignTestMixin, TestCase):
+    """Test cases for /api/designs/:id/colors/consolidate/."""
+
+    def setUp(self):
+        self.design = self.create_design()
+        self.red = self.create_object(self.design, properties={
+            'fill': {'type': 'solid', 'color': '#ff0000'},
+        })
+        self.near_red = self.create_object(self.design, z_index=1, properties={
+            'fill': {'type': 'gradient', 'gradient': {'stops': [
+                {'position': 0, 'color': '#FE0101'},
+                {'position': 1, 'color': '#0000ff'},
+            ]}},
+            'stroke': {'color': '#ff0000'},
+        })
+        self.create_object(self.design, z_index=2, properties={
+            'fill': {'type': 'solid', 'color': '#fd000280'},
+        })
+
+    def test_propose_groups_near_identical_colors(self):
+        url = f'/api/designs/{self.design.id}/colors/consolidate/'
+        data = self.client.get(url).json()
+
+        self.assertEqual(data['uniqueColors'], 4)
+        self.assertEqual(data['consolidatedColors'], 2)
+        self.assertEqual(data['mapping'], {'#fe0101': '#ff0000', '#fd0002': '#ff0000'})
+        self.assertEqual(data['groups'][0]['count'], 4)
+
+        strict = self.client.get(url, {'threshold': 0}).json()
+        self.assertEqual(strict['mapping'], {})
+
+    def test_apply_rewrites_properties(self):
+        response = self.client.post(
+            f'/api/designs/{self.design.id}/colors/consolidate/',
+            {},
+            content_type='application/json'
+        )
+        self.assertEqual(response.json()['updatedObjects'], 2)
+        self.assertEqual(response.json()['replacedUsages'], 2)
+
+        self.near_red.refresh_from_db()
+        stops = self.near_red.properties['fill']['gradient']['stops']
+        self.assertEqual([stop['color'] for stop in stops], ['#ff0000', '#0000ff'])
+        self.assertEqual(
+            DesignObject.objects.get(design=self.design, z_index=2).properties['fill']['color'],
+            '#ff000080'
+        )
+
+    def test_apply_rejects_invalid_mapping(self):
+        response = self.client.post(
+            f'/api/designs/{self.design.id}/colors/consolidate/',
+            {'mapping': {'#fe0101': 'red'}},
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_five_thousand_colors(self):
+        from app.designs.color_consolidation_service import color_consolidation_service
+        rgb = np.random.default_rng(0).integers(0, 256, (5000, 3), dtype=np.uint8)
+        colors = sorted({f'#{bytes(row).hex()}' for row in rgb})
+        groups = color_consolidation_service.cluster(colors, [1] * len(colors), 5.0)
+        self.assertEqual(sum(1 + len(g['members']) for g in groups), len(colors))
+        for group in groups:
+            for member in group['members']:
+                self.assertLessEqual(member['deltaE'], 5.0)
+
+
+class DesignInkCoverageTestCase(DesignTestMixin, TestCase):
+    """Test cases for GET /api/designs/:id/preflight/ink-coverage/."""
+
+    def create_stack(self, overprint):
+        design = self.create_design(width=4, height=4, bleed=0)
+        # Blue (C100 M100 = 200%) under dark red (M100 Y100 K77 = 277%)
+        self.create_object(design, x=0, y=0, width=2, height=2, properties={
+            'shape': 'rectangle', 'fill': {'type': 'solid', 'color': '#0000ff'},
+        })
+        top = self.create_object(design, z_index=1, x=1, y=1, width=2, height=2, properties={
+            'shape': 'ellipse', 'fill': {'type': 'solid', 'color': '#3a0000'}, 'overprint': overprint,
+        })
+        self.create_object(design, z_index=2, type='image', x=3, y=3, width=1, height=1, properties={
+            'src': 'https://example.com/a.png',
+        })
+        return design, top
+
+    def test_knockout_stays_within_limit(self):
+        design, _ = self.create_stack(overprint=False)
+
+        response = self.client.get(f'/api/designs/{design.id}/preflight/ink-coverage/', {'dpi': 10})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+
+        self.assertEqual(data['maxCoverage'], 277)
+        self.assertEqual(data['heatmap']['rows'], 40)
+        self.assertEqual(data['unrendered'][0]['type'], 'image')
+        self.assertEqual(data['regions'], [])
+
+    def test_overprint_exceeds_limit(self):
+        design, top = self.create_stack(overprint=True)
+
+        data = ink_coverage_service.analyze(str(design.id), dpi=10)
+
+        # The blue's cyan stays under the overprinting red: C100 M100 Y100 K77
+        self.assertEqual(data['maxCoverage'], 377)
+        self.assertGreater(data['maxCoverage'], ColorValidation.MAX_INK_COVERAGE)
+        self.assertEqual(len(data['regions']), 1)
+        self.assertEqual(data['regions'][0]['objectIds'], [str(top.id)])
+        self.assertLess(data['regions'][0]['x'], 2)
+        self.assertGreaterEqual(data['regions'][0]['x'], 1)
@@ -2,6 +2,7 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny
+from django.db import transaction
 from django.shortcuts import get_object_or_404
 from app.designs.models import Design, DesignObject
 from app.designs.serializers import (
@@ -9,6 +10,22 @@ from app.designs.serializers import (
     DesignObjectSerializer, DesignObjectCreateSerializer, DesignObjectUpdateSerializer
 )
 from app.designs.services import TransformService
+from app.designs.color_usage_service import color_usage_service
+from app.designs.color_consolidation_service import color_consolidation_service
+from app.designs.ink_coverage_service import ink_coverage_service
+from app.colors.color_management import UnknownProfileError
+from app.collaboration.change_log import change_log
+from app.collaboration.leases import LeaseConflict, edit_leases
+from app.collaboration.operations import operation_service, patch_payload
+from app.collaboration.write_behind import write_behind_buffer
+
+
+def log_moves(design, user_id, objects):
+    """Log the new positions of aligned or distributed objects as applied patches"""
+    moved = DesignObject.objects.filter(design=design, id__in=[obj['id'] for obj in objects])
+    operation_service.log_applied(
+        design.id, user_id, 'patch', [(obj.id, patch_payload(obj, ['x', 'y'])) for obj in moved]
+    )
 
 
 class DesignViewSet(viewsets.ModelViewSet):
@@ -36,6 +53,23 @@ class DesignViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(user_id=user_id)
         return queryset.order_by('-updated_at')
     
+    def get_object(self):
+        """
+        The design, with its buffered real-time edits written first so
+        reads see them and writes apply on top of them.
+        """
+        design = super().get_object()
+        write_behind_buffer.settle(design.id)
+        return design
+    
+    def list(self, request, *args, **kwargs):
+        """
+        List designs with their objects.
+        """
+        if write_behind_buffer.pending():
+            write_behind_buffer.flush()
+        return super().list(request, *args, **kwargs)
+    
     def create(self, request, *args, **kwargs):
         """
         Create a new design.
@@ -51,6 +85,7 @@ class DesignViewSet(viewsets.ModelViewSet):
             user_id=user_id,
             **serializer.validated_data
         )
+        change_log.record(design.id, 'design_created', user_id=user_id)
         
         response_serializer = DesignSerializer(design)
         return Response(response_serializer.data, status=status.HTTP_201_CREATED)
@@ -76,6 +111,10 @@ class DesignViewSet(viewsets.ModelViewSet):
         design.last_edited_by = user_id
         
         serializer.save()
+        change_log.record(
+            design.id, 'design_updated', user_id=user_id,
+            description=', '.join(sorted(serializer.validated_data))
+        )
         response_serializer = DesignSerializer(design)
         return Response(response_serializer.data)
     
@@ -90,12 +129,17 @@ class DesignViewSet(viewsets.ModelViewSet):
         serializer = DesignObjectCreateSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         
-        obj = DesignObject.objects.create(
-            design=design,
-            **serializer.validated_data
-        )
+        with transaction.atomic():
+            obj = DesignObject.objects.create(
+                design=design,
+                **serializer.validated_data
+            )
+            response_serializer = DesignObjectSerializer(obj)
+            operation_service.log_applied(
+                design.id, request.data.get('user_id'), 'create', [(obj.id, dict(response_serializer.data))]
+            )
+        change_log.record(design.id, 'object_created', obj.id, request.data.get('user_id'))
         
-        response_serializer = DesignObjectSerializer(obj)
         return Response(response_serializer.data, status=status.HTTP_201_CREATED)
     
     @action(detail=True, methods=['put'], url_path='objects/(?P<object_id>[^/.]+)')
@@ -103,26 +147,56 @@ class DesignViewSet(viewsets.ModelViewSet):
         """
         Update an object in the design.
         PUT /api/designs/:id/objects/:objectId/
+        Refused with 409 while another user holds the object's edit lease.
         """
         design = self.get_object()
         obj = get_object_or_404(DesignObject, id=object_id, design=design)
+        lease = edit_leases.conflict(design.id, obj.id, request.data.get('user_id', 'default-user'))
+        if lease is not None:
+            return Response(
+                {'error': f"Object is being edited by {lease['userId']}", 'lease': lease},
+                status=status.HTTP_409_CONFLICT
+            )
         
         serializer = DesignObjectUpdateSerializer(obj, data=request.data, partial=True)
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        with transaction.atomic():
+            serializer.save()
+            if serializer.validated_data:
+                operation_service.log_applied(
+                    design.id, request.data.get('user_id'), 'patch',
+                    [(obj.id, patch_payload(obj, serializer.validated_data))]
+                )
+        change_log.record(
+            design.id, 'object_updated', obj.id, request.data.get('user_id'),
+            description=', '.join(sorted(serializer.validated_data))
+        )
         
         response_serializer = DesignObjectSerializer(obj)
         return Response(response_serializer.data)
     
-    @action(detail=True, methods=['delete'], url_path='objects/(?P<object_id>[^/.]+)')
+    # Same URL as update_object; two actions with one url_path would shadow each other
+    @update_object.mapping.delete
     def delete_object(self, request, pk=None, object_id=None):
         """
         Delete an object from the design.
         DELETE /api/designs/:id/objects/:objectId/
+        Refused with 409 while another user holds the object's edit lease.
+        The user goes in the body: ?user_id filters which designs are found.
         """
         design = self.get_object()
         obj = get_object_or_404(DesignObject, id=object_id, design=design)
-        obj.delete()
+        lease = edit_leases.conflict(design.id, obj.id, request.data.get('user_id', 'default-user'))
+        if lease is not None:
+            return Response(
+                {'error': f"Object is being edited by {lease['userId']}", 'lease': lease},
+                status=status.HTTP_409_CONFLICT
+            )
+        deleted_id = obj.id
+        with transaction.atomic():
+            obj.delete()
+            operation_service.log_applied(design.id, request.data.get('user_id'), 'delete', [(deleted_id, {})])
+        change_log.record(design.id, 'object_deleted', deleted_id, request.data.get('user_id'))
         return Response({'success': True}, status=status.HTTP_200_OK)
     
     @action(detail=True, methods=['post'], url_path='transform/align')
@@ -130,6 +204,7 @@ class DesignViewSet(viewsets.ModelViewSet):
         """
         Align objects.
         POST /api/designs/:id/transform/align
+        Refused with 409 while another user holds an affected object's edit lease.
         """
         design = self.get_object()
         object_ids = request.data.get('objectIds', [])
@@ -141,7 +216,16 @@ class DesignViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        objects = TransformService.align_objects(str(design.id), object_ids, alignment)
+        try:
+            edit_leases.check(design.id, object_ids, request.data.get('user_id', 'default-user'))
+        except LeaseConflict as e:
+            return Response({'error': str(e), 'lease': e.lease}, status=status.HTTP_409_CONFLICT)
+        
+        with transaction.atomic():
+            objects = TransformService.align_objects(str(design.id), object_ids, alignment)
+            log_moves(design, request.data.get('user_id'), objects)
+        for obj in objects:
+            change_log.record(design.id, 'object_aligned', obj['id'], request.data.get('user_id'), alignment)
         return Response(objects, status=status.HTTP_200_OK)
     
     @action(detail=True, methods=['post'], url_path='transform/distribute')
@@ -149,6 +233,7 @@ class DesignViewSet(viewsets.ModelViewSet):
         """
         Distribute objects.
         POST /api/designs/:id/transform/distribute
+        Refused with 409 while another user holds an affected object's edit lease.
         """
         design = self.get_object()
         object_ids = request.data.get('objectIds', [])
@@ -160,7 +245,16 @@ class DesignViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        objects = TransformService.distribute_objects(str(design.id), object_ids, direction)
+        try:
+            edit_leases.check(design.id, object_ids, request.data.get('user_id', 'default-user'))
+        except LeaseConflict as e:
+            return Response({'error': str(e), 'lease': e.lease}, status=status.HTTP_409_CONFLICT)
+        
+        with transaction.atomic():
+            objects = TransformService.distribute_objects(str(design.id), object_ids, direction)
+            log_moves(design, request.data.get('user_id'), objects)
+        for obj in objects:
+            change_log.record(design.id, 'object_distributed', obj['id'], request.data.get('user_id'), direction)
         return Response(objects, status=status.HTTP_200_OK)
     
     @action(detail=True, methods=['post'], url_path='transform/align-to-canvas')
@@ -168,6 +262,7 @@ class DesignViewSet(viewsets.ModelViewSet):
         """
         Align objects to canvas.
         POST /api/designs/:id/transform/align-to-canvas
+        Refused with 409 while another user holds an affected object's edit lease.
         """
         design = self.get_object()
         object_ids = request.data.get('objectIds', [])
@@ -179,5 +274,98 @@ class DesignViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        objects = TransformService.align_to_canvas(str(design.id), object_ids, alignment)
+        try:
+            edit_leases.check(design.id, object_ids, request.data.get('user_id', 'default-user'))
+        except LeaseConflict as e:
+            return Response({'error': str(e), 'lease': e.lease}, status=status.HTTP_409_CONFLICT)
+        
+        with transaction.atomic():
+            objects = TransformService.align_to_canvas(str(design.id), object_ids, alignment)
+            log_moves(design, request.data.get('user_id'), objects)
+        for obj in objects:
+            change_log.record(design.id, 'object_aligned', obj['id'], request.data.get('user_id'), f'canvas {alignment}')
         return Response(objects, status=status.HTTP_200_OK)
+    
+    @action(detail=True, methods=['get'])
+    def colors(self, request, pk=None):
+        """
+        Audit every color used by the design.
+        GET /api/designs/:id/colors/
+        """
+        design = self.get_object()
+        audit = color_usage_service.audit(str(design.id))
+        return Response(audit, status=status.HTTP_200_OK)
+    
+    @action(detail=True, methods=['get'], url_path='colors/consolidate')
+    def consolidate_colors(self, request, pk=None):
+        """
+        Propose a consolidated palette merging near-identical colors.
+        GET /api/designs/:id/colors/consolidate/?threshold=3
+        """
+        design = self.get_object()
+        try:
+            threshold = float(request.query_params.get('threshold', color_consolidation_service.DEFAULT_THRESHOLD))
+        except ValueError:
+            return Response(
+                {'error': 'threshold must be a number'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        proposal = color_consolidation_service.propose(str(design.id), threshold)
+        return Response(proposal, status=status.HTTP_200_OK)
+    
+    @consolidate_colors.mapping.post
+    def apply_color_consolidation(self, request, pk=None):
+        """
+        Apply a consolidation, either an explicit mapping or a threshold.
+        POST /api/designs/:id/colors/consolidate/
+        Refused with 409 while another user holds an affected object's edit lease.
+        """
+        design = self.get_object()
+        mapping = request.data.get('mapping')
+        threshold = request.data.get('threshold')
+        
+        if mapping is not None and not isinstance(mapping, dict):
+            return Response(
+                {'error': 'mapping must be an object of {from: to} colors'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            result = color_consolidation_service.apply(
+                str(design.id),
+                threshold=float(threshold) if threshold is not None else None,
+                mapping=mapping,
+                user_id=request.data.get('user_id')
+            )
+        except LeaseConflict as e:
+            return Response({'error': str(e), 'lease': e.lease}, status=status.HTTP_409_CONFLICT)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        change_log.record(design.id, 'colors_consolidated', user_id=request.data.get('user_id'))
+        return Response(result, status=status.HTTP_200_OK)
+    
+    @action(detail=True, methods=['get'], url_path='preflight/ink-coverage')
+    def ink_coverage(self, request, pk=None):
+        """
+        Total area coverage heatmap and regions over the ink limit.
+        GET /api/designs/:id/preflight/ink-coverage/?dpi=36&profile=name
+        """
+        design = self.get_object()
+        try:
+            dpi = request.query_params.get('dpi')
+            dpi = float(dpi) if dpi is not None else None
+            if dpi is not None and dpi <= 0:
+                raise ValueError
+        except ValueError:
+            return Response(
+                {'error': 'dpi must be a positive number'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            result = ink_coverage_service.analyze(
+                str(design.id), dpi, request.query_params.get('profile')
+            )
+        except UnknownProfileError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result, status=status.HTTP_200_OK)
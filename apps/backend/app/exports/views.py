@@ -7,6 +7,24 @@ from app.exports.models import ExportJob
 from app.exports.serializers import ExportJobSerializer, ExportJobCreateSerializer
 from app.designs.models import Design
 from app.collaboration.services import get_actual_design_id, ensure_design_exists
+from app.colors.color_management import color_management, UnknownProfileError
+
+
+def with_color_profile(options, design):
+    """
+    Record the CMYK output profile an export renders with.
+    
+    The profile comes from options.colorProfile, then the design, then the
+    configured default; raises UnknownProfileError for unknown names.
+    """
+    options = dict(options or {})
+    profile = color_management.resolve_profile_name(
+        options.get('colorProfile') or design.color_profile
+    )
+    color_management.resolve_intent(options.get('renderingIntent'))
+    if profile:
+        options['colorProfile'] = profile
+    return options or None
 
 
 class ExportJobViewSet(viewsets.ModelViewSet):
@@ -39,13 +57,21 @@ class ExportJobViewSet(viewsets.ModelViewSet):
         actual_design_id = ensure_design_exists(design_id, user_id)
         design = Design.objects.get(id=actual_design_id)
         
+        try:
+            options = with_color_profile(serializer.validated_data.get('options'), design)
+        except UnknownProfileError as e:
+            return Response(
+                {'success': False, 'error': str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
         # Create export job
         export_job = ExportJob.objects.create(
             design=design,
             user_id=user_id,
             format=serializer.validated_data['format'],
             quality=serializer.validated_data['quality'],
-            options=serializer.validated_data.get('options'),
+            options=options,
             status='pending',
         )
         
@@ -84,6 +110,7 @@ class ExportJobViewSet(viewsets.ModelViewSet):
         """
         Batch export.
         POST /api/exports/batch
+        A design whose color profile is unknown gets a failed job.
         """
         design_ids = request.data.get('design_ids', [])
         format_type = request.data.get('format', 'png')
@@ -101,13 +128,20 @@ class ExportJobViewSet(viewsets.ModelViewSet):
             actual_design_id = ensure_design_exists(design_id, user_id)
             design = Design.objects.get(id=actual_design_id)
             
-            job = ExportJob.objects.create(
+            job = ExportJob(
                 design=design,
                 user_id=user_id,
                 format=format_type,
                 quality=quality,
                 status='pending'
             )
+            try:
+                job.options = with_color_profile(None, design)
+            except UnknownProfileError as e:
+                # Only this design's export fails; the rest still run
+                job.status = 'failed'
+                job.error_message = str(e)
+            job.save()
             jobs.append(job)
         
         serializer = ExportJobSerializer(jobs, many=True)
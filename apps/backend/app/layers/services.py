@@ -5,63 +5,88 @@ Converted from TypeScript LayerService.ts
 from django.db import transaction, models
 from app.designs.models import DesignObject
 from app.collaboration.services import get_actual_design_id
+from app.collaboration.change_log import change_log
+from app.collaboration.leases import edit_leases
+from app.collaboration.operations import operation_service, patch_payload
+from app.collaboration.write_behind import write_behind_buffer
 
 
 class LayerService:
-    """Service for layer operations"""
+    """
+    Service for layer operations
     
-    @transaction.atomic
-    def reorder_layer(self, design_id: str, object_id: str, new_z_index: int) -> None:
-        """Reorder layer (change z-index)"""
+    Writes are logged as applied object operations, after the design's
+    buffered real-time edits have been flushed. Writes to objects another
+    user holds the edit lease on raise LeaseConflict.
+    """
+    
+    def resolve_design(self, design_id: str) -> str:
+        """The actual design id, with the design's buffered edits flushed"""
         actual_design_id = get_actual_design_id(design_id)
         if not actual_design_id:
             raise ValueError('Design not found')
+        write_behind_buffer.settle(actual_design_id)
+        return actual_design_id
+    
+    def reorder_layer(self, design_id: str, object_id: str, new_z_index: int, user_id: str = None) -> None:
+        """Reorder layer (change z-index)"""
+        actual_design_id = self.resolve_design(design_id)
+        edit_leases.check(actual_design_id, [object_id], user_id)
         
-        try:
-            obj = DesignObject.objects.get(id=object_id, design_id=actual_design_id)
-        except DesignObject.DoesNotExist:
-            raise ValueError('Object not found')
-        
-        current_z_index = obj.z_index
-        
-        # Shift other objects
-        if new_z_index > current_z_index:
-            # Moving up - shift down objects in between
-            DesignObject.objects.filter(
-                design_id=actual_design_id,
-                z_index__gt=current_z_index,
-                z_index__lte=new_z_index
-            ).update(z_index=models.F('z_index') - 1)
-        elif new_z_index < current_z_index:
-            # Moving down - shift up objects in between
-            DesignObject.objects.filter(
-                design_id=actual_design_id,
-                z_index__gte=new_z_index,
-                z_index__lt=current_z_index
-            ).update(z_index=models.F('z_index') + 1)
-        
-        # Update object's z-index
-        obj.z_index = new_z_index
-        obj.save()
+        with transaction.atomic():
+            try:
+                obj = DesignObject.objects.get(id=object_id, design_id=actual_design_id)
+            except DesignObject.DoesNotExist:
+                raise ValueError('Object not found')
+            
+            current_z_index = obj.z_index
+            
+            # Shift other objects
+            shifted = DesignObject.objects.none()
+            shift = 0
+            if new_z_index > current_z_index:
+                # Moving up - shift down objects in between
+                shifted = DesignObject.objects.filter(
+                    design_id=actual_design_id,
+                    z_index__gt=current_z_index,
+                    z_index__lte=new_z_index
+                )
+                shift = -1
+            elif new_z_index < current_z_index:
+                # Moving down - shift up objects in between
+                shifted = DesignObject.objects.filter(
+                    design_id=actual_design_id,
+                    z_index__gte=new_z_index,
+                    z_index__lt=current_z_index
+                )
+                shift = 1
+            z_indexes = {str(i): z + shift for i, z in shifted.values_list('id', 'z_index')}
+            if z_indexes:
+                shifted.update(z_index=models.F('z_index') + shift)
+            
+            # Update object's z-index
+            obj.z_index = new_z_index
+            obj.save()
+            z_indexes[str(obj.id)] = new_z_index
+            operation_service.log_applied(actual_design_id, user_id, 'reorder', [
+                (None, {'objectIds': list(z_indexes), 'zIndex': z_indexes})
+            ])
+            change_log.record(actual_design_id, 'layer_reordered', obj.id, user_id, f'z-index {current_z_index} -> {new_z_index}')
     
-    def bring_forward(self, design_id: str, object_id: str) -> None:
+    def bring_forward(self, design_id: str, object_id: str, user_id: str = None) -> None:
         """Bring object forward (increase z-index by 1)"""
-        actual_design_id = get_actual_design_id(design_id)
-        if not actual_design_id:
-            raise ValueError('Design not found')
+        actual_design_id = self.resolve_design(design_id)
         
         try:
             obj = DesignObject.objects.get(id=object_id, design_id=actual_design_id)
         except DesignObject.DoesNotExist:
             raise ValueError('Object not found')
         
-        self.reorder_layer(design_id, object_id, obj.z_index + 1)
+        self.reorder_layer(design_id, object_id, obj.z_index + 1, user_id)
     
-    def send_backward(self, design_id: str, object_id: str) -> None:
+    def send_backward(self, design_id: str, object_id: str, user_id: str = None) -> None:
         """Send object backward (decrease z-index by 1)"""
-        actual_design_id = get_actual_design_id(design_id)
-        if not actual_design_id:
-            raise ValueError('Design not found')
+        actual_design_id = self.resolve_design(design_id)
         
         try:
             obj = DesignObject.objects.get(id=object_id, design_id=actual_design_id)
@@ -69,165 +94,172 @@ class LayerService:
             raise ValueError('Object not found')
         
         if obj.z_index > 0:
-            self.reorder_layer(design_id, object_id, obj.z_index - 1)
+            self.reorder_layer(design_id, object_id, obj.z_index - 1, user_id)
     
-    def bring_to_front(self, design_id: str, object_id: str) -> None:
+    def bring_to_front(self, design_id: str, object_id: str, user_id: str = None) -> None:
         """Bring to front (set to highest z-index)"""
-        actual_design_id = get_actual_design_id(design_id)
-        if not actual_design_id:
-            raise ValueError('Design not found')
+        actual_design_id = self.resolve_design(design_id)
         
         max_z = DesignObject.objects.filter(
             design_id=actual_design_id
         ).aggregate(max_z=models.Max('z_index'))['max_z'] or 0
         
-        self.reorder_layer(design_id, object_id, max_z)
+        self.reorder_layer(design_id, object_id, max_z, user_id)
     
-    def send_to_back(self, design_id: str, object_id: str) -> None:
+    def send_to_back(self, design_id: str, object_id: str, user_id: str = None) -> None:
         """Send to back (set to lowest z-index)"""
-        self.reorder_layer(design_id, object_id, 0)
+        self.reorder_layer(design_id, object_id, 0, user_id)
     
-    @transaction.atomic
-    def create_group(self, design_id: str, object_ids: list, group_name: str = None) -> dict:
+    def create_group(self, design_id: str, object_ids: list, group_name: str = None, user_id: str = None) -> dict:
         """Create layer group"""
         from django.utils import timezone
         import uuid
         
-        actual_design_id = get_actual_design_id(design_id)
-        if not actual_design_id:
-            raise ValueError('Design not found')
-        
-        # Create group ID
-        group_id = f"group-{uuid.uuid4().hex[:12]}"
+        actual_design_id = self.resolve_design(design_id)
+        edit_leases.check(actual_design_id, object_ids, user_id)
         
-        # Update objects with group ID
-        objects = DesignObject.objects.filter(
-            design_id=actual_design_id,
-            id__in=object_ids
-        )
-        
-        for obj in objects:
-            properties = obj.properties or {}
-            properties['groupId'] = group_id
-            obj.properties = properties
-            obj.save()
-        
-        # Get average z-index for group
-        avg_z = objects.aggregate(avg_z=models.Avg('z_index'))['avg_z'] or 0
-        
-        return {
-            'id': group_id,
-            'designId': actual_design_id,
-            'name': group_name or f'Group {group_id[-8:]}',
-            'objectIds': object_ids,
-            'zIndex': int(avg_z),
-            'locked': False,
-            'visible': True,
-            'createdAt': timezone.now().isoformat()
-        }
+        with transaction.atomic():
+            # Create group ID
+            group_id = f"group-{uuid.uuid4().hex[:12]}"
+            
+            # Update objects with group ID
+            objects = DesignObject.objects.filter(
+                design_id=actual_design_id,
+                id__in=object_ids
+            )
+            
+            changes = []
+            for obj in objects:
+                properties = obj.properties or {}
+                properties['groupId'] = group_id
+                obj.properties = properties
+                obj.save()
+                changes.append((obj.id, patch_payload(obj, ['properties'])))
+                change_log.record(actual_design_id, 'layer_grouped', obj.id, user_id, group_id)
+            operation_service.log_applied(actual_design_id, user_id, 'patch', changes)
+            
+            # Get average z-index for group
+            avg_z = objects.aggregate(avg_z=models.Avg('z_index'))['avg_z'] or 0
+            
+            return {
+                'id': group_id,
+                'designId': actual_design_id,
+                'name': group_name or f'Group {group_id[-8:]}',
+                'objectIds': object_ids,
+                'zIndex': int(avg_z),
+                'locked': False,
+                'visible': True,
+                'createdAt': timezone.now().isoformat()
+            }
     
-    @transaction.atomic
-    def ungroup(self, design_id: str, group_id: str) -> None:
+    def ungroup(self, design_id: str, group_id: str, user_id: str = None) -> None:
         """Ungroup layers"""
-        actual_design_id = get_actual_design_id(design_id)
-        if not actual_design_id:
-            raise ValueError('Design not found')
+        actual_design_id = self.resolve_design(design_id)
         
-        # Remove group ID from objects
-        objects = DesignObject.objects.filter(
-            design_id=actual_design_id
-        )
-        
-        for obj in objects:
-            properties = obj.properties or {}
-            if properties.get('groupId') == group_id:
-                properties.pop('groupId', None)
-                obj.properties = properties
+        with transaction.atomic():
+            objects = [
+                obj for obj in DesignObject.objects.filter(design_id=actual_design_id)
+                if (obj.properties or {}).get('groupId') == group_id
+            ]
+            edit_leases.check(actual_design_id, [obj.id for obj in objects], user_id)
+            
+            # Remove group ID from objects
+            changes = []
+            for obj in objects:
+                obj.properties.pop('groupId', None)
                 obj.save()
+                changes.append((obj.id, patch_payload(obj, ['properties'])))
+                change_log.record(actual_design_id, 'layer_ungrouped', obj.id, user_id, group_id)
+            operation_service.log_applied(actual_design_id, user_id, 'patch', changes)
     
-    def lock_layer(self, design_id: str, object_id: str) -> None:
+    def lock_layer(self, design_id: str, object_id: str, user_id: str = None) -> None:
         """Lock layer"""
-        actual_design_id = get_actual_design_id(design_id)
-        if not actual_design_id:
-            raise ValueError('Design not found')
+        actual_design_id = self.resolve_design(design_id)
+        edit_leases.check(actual_design_id, [object_id], user_id)
         
-        try:
-            obj = DesignObject.objects.get(id=object_id, design_id=actual_design_id)
-            obj.locked = True
-            obj.save()
-        except DesignObject.DoesNotExist:
-            raise ValueError('Object not found')
+        with transaction.atomic():
+            try:
+                obj = DesignObject.objects.get(id=object_id, design_id=actual_design_id)
+                obj.locked = True
+                obj.save()
+                operation_service.log_applied(actual_design_id, user_id, 'patch', [(obj.id, patch_payload(obj, ['locked']))])
+                change_log.record(actual_design_id, 'layer_locked', obj.id, user_id)
+            except DesignObject.DoesNotExist:
+                raise ValueError('Object not found')
     
-    def unlock_layer(self, design_id: str, object_id: str) -> None:
+    def unlock_layer(self, design_id: str, object_id: str, user_id: str = None) -> None:
         """Unlock layer"""
-        actual_design_id = get_actual_design_id(design_id)
-        if not actual_design_id:
-            raise ValueError('Design not found')
+        actual_design_id = self.resolve_design(design_id)
+        edit_leases.check(actual_design_id, [object_id], user_id)
         
-        try:
-            obj = DesignObject.objects.get(id=object_id, design_id=actual_design_id)
-            obj.locked = False
-            obj.save()
-        except DesignObject.DoesNotExist:
-            raise ValueError('Object not found')
+        with transaction.atomic():
+            try:
+                obj = DesignObject.objects.get(id=object_id, design_id=actual_design_id)
+                obj.locked = False
+                obj.save()
+                operation_service.log_applied(actual_design_id, user_id, 'patch', [(obj.id, patch_payload(obj, ['locked']))])
+                change_log.record(actual_design_id, 'layer_unlocked', obj.id, user_id)
+            except DesignObject.DoesNotExist:
+                raise ValueError('Object not found')
     
-    def toggle_visibility(self, design_id: str, object_id: str) -> bool:
+    def toggle_visibility(self, design_id: str, object_id: str, user_id: str = None) -> bool:
         """Toggle layer visibility"""
-        actual_design_id = get_actual_design_id(design_id)
-        if not actual_design_id:
-            raise ValueError('Design not found')
+        actual_design_id = self.resolve_design(design_id)
+        edit_leases.check(actual_design_id, [object_id], user_id)
         
-        try:
-            obj = DesignObject.objects.get(id=object_id, design_id=actual_design_id)
-            obj.visible = not obj.visible
-            obj.save()
-            return obj.visible
-        except DesignObject.DoesNotExist:
-            raise ValueError('Object not found')
+        with transaction.atomic():
+            try:
+                obj = DesignObject.objects.get(id=object_id, design_id=actual_design_id)
+                obj.visible = not obj.visible
+                obj.save()
+                operation_service.log_applied(actual_design_id, user_id, 'patch', [(obj.id, patch_payload(obj, ['visible']))])
+                change_log.record(actual_design_id, 'layer_shown' if obj.visible else 'layer_hidden', obj.id, user_id)
+                return obj.visible
+            except DesignObject.DoesNotExist:
+                raise ValueError('Object not found')
     
-    def duplicate_layer(self, design_id: str, object_id: str) -> dict:
+    def duplicate_layer(self, design_id: str, object_id: str, user_id: str = None) -> dict:
         """Duplicate layer"""
         from app.designs.serializers import DesignObjectSerializer
         
-        actual_design_id = get_actual_design_id(design_id)
-        if not actual_design_id:
-            raise ValueError('Design not found')
+        actual_design_id = self.resolve_design(design_id)
         
-        try:
-            obj = DesignObject.objects.get(id=object_id, design_id=actual_design_id)
-        except DesignObject.DoesNotExist:
-            raise ValueError('Object not found')
-        
-        # Get max z-index
-        max_z = DesignObject.objects.filter(
-            design_id=actual_design_id
-        ).aggregate(max_z=models.Max('z_index'))['max_z'] or 0
-        
-        # Create duplicate
-        new_obj = DesignObject.objects.create(
-            design_id=actual_design_id,
-            type=obj.type,
-            x=obj.x + 10,
-            y=obj.y + 10,
-            width=obj.width,
-            height=obj.height,
-            rotation=obj.rotation,
-            opacity=obj.opacity,
-            z_index=max_z + 1,
-            locked=obj.locked,
-            visible=obj.visible,
-            name=f"{obj.name} (Copy)" if obj.name else "Copy",
-            properties=obj.properties
-        )
-        
-        serializer = DesignObjectSerializer(new_obj)
-        return serializer.data
+        with transaction.atomic():
+            try:
+                obj = DesignObject.objects.get(id=object_id, design_id=actual_design_id)
+            except DesignObject.DoesNotExist:
+                raise ValueError('Object not found')
+            
+            # Get max z-index
+            max_z = DesignObject.objects.filter(
+                design_id=actual_design_id
+            ).aggregate(max_z=models.Max('z_index'))['max_z'] or 0
+            
+            # Create duplicate
+            new_obj = DesignObject.objects.create(
+                design_id=actual_design_id,
+                type=obj.type,
+                x=obj.x + 10,
+                y=obj.y + 10,
+                width=obj.width,
+                height=obj.height,
+                rotation=obj.rotation,
+                opacity=obj.opacity,
+                z_index=max_z + 1,
+                locked=obj.locked,
+                visible=obj.visible,
+                name=f"{obj.name} (Copy)" if obj.name else "Copy",
+                properties=obj.properties
+            )
+            change_log.record(actual_design_id, 'layer_duplicated', new_obj.id, user_id, f'Copy of {obj.id}')
+            
+            serializer = DesignObjectSerializer(new_obj)
+            operation_service.log_applied(actual_design_id, user_id, 'create', [(new_obj.id, dict(serializer.data))])
+            return serializer.data
     
     def get_layer_hierarchy(self, design_id: str) -> list:
         """Get layer hierarchy"""
-        actual_design_id = get_actual_design_id(design_id)
-        if not actual_design_id:
-            raise ValueError('Design not found')
+        actual_design_id = self.resolve_design(design_id)
         
         objects = DesignObject.objects.filter(
             design_id=actual_design_id
@@ -5,6 +5,7 @@ from rest_framework.permissions import AllowAny
 from app.layers.services import layer_service
 from app.layers.blending_service import blending_service
 from app.designs.models import DesignObject
+from app.collaboration.leases import LeaseConflict
 from app.collaboration.services import get_actual_design_id
 
 
@@ -30,8 +31,13 @@ class LayerViewSet(viewsets.ViewSet):
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            layer_service.reorder_layer(design_id, object_id, new_z_index)
+            layer_service.reorder_layer(design_id, object_id, new_z_index, request.data.get('user_id'))
             return Response({'success': True})
+        except LeaseConflict as e:
+            return Response(
+                {'error': str(e), 'lease': e.lease},
+                status=status.HTTP_409_CONFLICT
+            )
         except ValueError as e:
             return Response(
                 {'error': str(e)},
@@ -50,8 +56,13 @@ class LayerViewSet(viewsets.ViewSet):
         POST /api/designs/:designId/layers/:objectId/forward
         """
         try:
-            layer_service.bring_forward(design_id, object_id)
+            layer_service.bring_forward(design_id, object_id, request.data.get('user_id'))
             return Response({'success': True})
+        except LeaseConflict as e:
+            return Response(
+                {'error': str(e), 'lease': e.lease},
+                status=status.HTTP_409_CONFLICT
+            )
         except ValueError as e:
             return Response(
                 {'error': str(e)},
@@ -70,8 +81,13 @@ class LayerViewSet(viewsets.ViewSet):
         POST /api/designs/:designId/layers/:objectId/backward
         """
         try:
-            layer_service.send_backward(design_id, object_id)
+            layer_service.send_backward(design_id, object_id, request.data.get('user_id'))
             return Response({'success': True})
+        except LeaseConflict as e:
+            return Response(
+                {'error': str(e), 'lease': e.lease},
+                status=status.HTTP_409_CONFLICT
+            )
         except ValueError as e:
             return Response(
                 {'error': str(e)},
@@ -90,8 +106,13 @@ class LayerViewSet(viewsets.ViewSet):
         POST /api/designs/:designId/layers/:objectId/front
         """
         try:
-            layer_service.bring_to_front(design_id, object_id)
+            layer_service.bring_to_front(design_id, object_id, request.data.get('user_id'))
             return Response({'success': True})
+        except LeaseConflict as e:
+            return Response(
+                {'error': str(e), 'lease': e.lease},
+                status=status.HTTP_409_CONFLICT
+            )
         except ValueError as e:
             return Response(
                 {'error': str(e)},
@@ -110,8 +131,13 @@ class LayerViewSet(viewsets.ViewSet):
         POST /api/designs/:designId/layers/:objectId/back
         """
         try:
-            layer_service.send_to_back(design_id, object_id)
+            layer_service.send_to_back(design_id, object_id, request.data.get('user_id'))
             return Response({'success': True})
+        except LeaseConflict as e:
+            return Response(
+                {'error': str(e), 'lease': e.lease},
+                status=status.HTTP_409_CONFLICT
+            )
         except ValueError as e:
             return Response(
                 {'error': str(e)},
@@ -139,8 +165,13 @@ class LayerViewSet(viewsets.ViewSet):
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            group = layer_service.create_group(design_id, object_ids, group_name)
+            group = layer_service.create_group(design_id, object_ids, group_name, request.data.get('user_id'))
             return Response({'group': group})
+        except LeaseConflict as e:
+            return Response(
+                {'error': str(e), 'lease': e.lease},
+                status=status.HTTP_409_CONFLICT
+            )
         except ValueError as e:
             return Response(
                 {'error': str(e)},
@@ -167,8 +198,13 @@ class LayerViewSet(viewsets.ViewSet):
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            layer_service.ungroup(design_id, group_id)
+            layer_service.ungroup(design_id, group_id, request.data.get('user_id'))
             return Response({'success': True})
+        except LeaseConflict as e:
+            return Response(
+                {'error': str(e), 'lease': e.lease},
+                status=status.HTTP_409_CONFLICT
+            )
         except ValueError as e:
             return Response(
                 {'error': str(e)},
@@ -187,8 +223,13 @@ class LayerViewSet(viewsets.ViewSet):
         POST /api/designs/:designId/layers/:objectId/lock
         """
         try:
-            layer_service.lock_layer(design_id, object_id)
+            layer_service.lock_layer(design_id, object_id, request.data.get('user_id'))
             return Response({'success': True})
+        except LeaseConflict as e:
+            return Response(
+                {'error': str(e), 'lease': e.lease},
+                status=status.HTTP_409_CONFLICT
+            )
         except ValueError as e:
             return Response(
                 {'error': str(e)},
@@ -207,8 +248,13 @@ class LayerViewSet(viewsets.ViewSet):
         POST /api/designs/:designId/layers/:objectId/unlock
         """
         try:
-            layer_service.unlock_layer(design_id, object_id)
+            layer_service.unlock_layer(design_id, object_id, request.data.get('user_id'))
             return Response({'success': True})
+        except LeaseConflict as e:
+            return Response(
+                {'error': str(e), 'lease': e.lease},
+                status=status.HTTP_409_CONFLICT
+            )
         except ValueError as e:
             return Response(
                 {'error': str(e)},
@@ -227,8 +273,13 @@ class LayerViewSet(viewsets.ViewSet):
         POST /api/designs/:designId/layers/:objectId/toggle-visibility
         """
         try:
-            visible = layer_service.toggle_visibility(design_id, object_id)
+            visible = layer_service.toggle_visibility(design_id, object_id, request.data.get('user_id'))
             return Response({'visible': visible})
+        except LeaseConflict as e:
+            return Response(
+                {'error': str(e), 'lease': e.lease},
+                status=status.HTTP_409_CONFLICT
+            )
         except ValueError as e:
             return Response(
                 {'error': str(e)},
@@ -247,7 +298,7 @@ class LayerViewSet(viewsets.ViewSet):
         POST /api/designs/:designId/layers/:objectId/duplicate
         """
         try:
-            obj = layer_service.duplicate_layer(design_id, object_id)
+            obj = layer_service.duplicate_layer(design_id, object_id, request.data.get('user_id'))
             return Response({'object': obj})
         except ValueError as e:
             return Response(
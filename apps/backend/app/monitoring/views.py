@@ -4,6 +4,8 @@ from rest_framework.response import Response
 from rest_framework.permissions import AllowAny
 import psutil
 import time
+from app.colors.cache import color_cache
+from app.collaboration.send_queue import send_queue_stats
 
 
 class MetricsViewSet(viewsets.ViewSet):
@@ -19,10 +21,26 @@ class MetricsViewSet(viewsets.ViewSet):
         GET /api/metrics
         """
         # Simplified metrics endpoint
+        queues = send_queue_stats.snapshot()
         metrics = [
             '# HELP http_requests_total Total number of HTTP requests',
             '# TYPE http_requests_total counter',
             'http_requests_total 0',
+            '# HELP websocket_connections Open design room connections in this process',
+            '# TYPE websocket_connections gauge',
+            f"websocket_connections {queues['connections']}",
+            '# HELP websocket_send_queue_depth Frames waiting to be written, over all connections',
+            '# TYPE websocket_send_queue_depth gauge',
+            f"websocket_send_queue_depth {queues['depth']}",
+            '# HELP websocket_send_queue_deepest Frames waiting on the most backed up connection',
+            '# TYPE websocket_send_queue_deepest gauge',
+            f"websocket_send_queue_deepest {queues['deepest']}",
+            '# HELP websocket_frames_dropped_total Droppable frames shed from slow connections',
+            '# TYPE websocket_frames_dropped_total counter',
+            f"websocket_frames_dropped_total {queues['dropped']}",
+            '# HELP websocket_lagging_disconnects_total Connections closed for falling behind',
+            '# TYPE websocket_lagging_disconnects_total counter',
+            f"websocket_lagging_disconnects_total {queues['lagging']}",
         ]
         return Response('\n'.join(metrics), content_type='text/plain')
     
@@ -78,11 +96,14 @@ class MetricsViewSet(viewsets.ViewSet):
         Cache metrics.
         GET /api/monitoring/cache
         """
-        # Simplified cache metrics
+        colors = color_cache.stats()
         return Response({
-            'hits': 0,
-            'misses': 0,
-            'hitRate': 0.0
+            'hits': colors['hits'],
+            'misses': colors['misses'],
+            'hitRate': colors['hitRate'],
+            'caches': {
+                'colors': colors
+            }
         })
 
 
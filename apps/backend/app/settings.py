@@ -62,6 +62,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'app.collaboration.middleware.DesignIdCacheMiddleware',
 ]
 
 ROOT_URLCONF = 'app.urls'
@@ -173,6 +174,73 @@ CHANNEL_LAYERS = {
     },
 }
 
+# Real-time collaboration
+# Cursor movements are coalesced per design room and broadcast as one
+# cursor:batch frame CURSOR_FLUSH_HZ times a second. Room presence lives in
+# PRESENCE_BACKEND ('memory' is per process, 'redis' is shared by all
+# workers); connections that miss heartbeats for PRESENCE_TTL seconds expire.
+# Object patches sent over the socket are logged at once but written to
+# design_objects every WRITE_BEHIND_INTERVAL seconds (0 writes immediately)
+# or as soon as WRITE_BEHIND_MAX_PENDING objects are dirty. Comment events
+# are sent after commit, batched per design every BROADCAST_TICK seconds.
+# Design ids and aliases resolve through a per-request cache and a process
+# LRU of DESIGN_ID_CACHE_SIZE entries kept for DESIGN_ID_CACHE_TTL seconds.
+# Users' roles on designs are cached for ROLE_CACHE_TTL seconds; with
+# AUTHORIZE_OPERATIONS on, socket operations need the editor role.
+# Change log entries are buffered and bulk written every
+# CHANGE_LOG_FLUSH_INTERVAL seconds (0 writes immediately) or once
+# CHANGE_LOG_BATCH_SIZE are queued, and kept for CHANGE_LOG_RETENTION_DAYS.
+# The last REPLAY_BUFFER_SIZE operations of each design are kept in
+# REPLAY_BACKEND ('memory' or a 'redis' stream) so reconnecting clients can
+# catch up from their lastSeq instead of reloading the design. Each socket
+# queues up to SEND_QUEUE_MAX outgoing frames; beyond that cursors are shed
+# and clients still behind are disconnected with a resync hint. Edit leases
+# on objects last LEASE_TTL seconds unless renewed and live in LEASE_BACKEND
+# ('memory' is per process, 'redis' is shared by all workers).
+COLLABORATION = {
+    'CURSOR_FLUSH_HZ': float(os.getenv('CURSOR_FLUSH_HZ', '20')),
+    'PRESENCE_BACKEND': os.getenv('PRESENCE_BACKEND', 'redis'),
+    'PRESENCE_TTL': float(os.getenv('PRESENCE_TTL', '60')),
+    'PRESENCE_REDIS_URL': f"redis://{os.getenv('REDIS_HOST', 'localhost')}:{os.getenv('REDIS_PORT', '6379')}/0",
+    'WRITE_BEHIND_INTERVAL': float(os.getenv('WRITE_BEHIND_INTERVAL', '0.5')),
+    'WRITE_BEHIND_MAX_PENDING': int(os.getenv('WRITE_BEHIND_MAX_PENDING', '500')),
+    'BROADCAST_TICK': float(os.getenv('BROADCAST_TICK', '0.05')),
+    'DESIGN_ID_CACHE_SIZE': int(os.getenv('DESIGN_ID_CACHE_SIZE', '1024')),
+    'DESIGN_ID_CACHE_TTL': float(os.getenv('DESIGN_ID_CACHE_TTL', '60')),
+    'ROLE_CACHE_SIZE': int(os.getenv('ROLE_CACHE_SIZE', '4096')),
+    'ROLE_CACHE_TTL': float(os.getenv('ROLE_CACHE_TTL', '30')),
+    'AUTHORIZE_OPERATIONS': os.getenv('AUTHORIZE_OPERATIONS', 'False').lower() == 'true',
+    'CHANGE_LOG_FLUSH_INTERVAL': float(os.getenv('CHANGE_LOG_FLUSH_INTERVAL', '1.0')),
+    'CHANGE_LOG_BATCH_SIZE': int(os.getenv('CHANGE_LOG_BATCH_SIZE', '500')),
+    'CHANGE_LOG_RETENTION_DAYS': int(os.getenv('CHANGE_LOG_RETENTION_DAYS', '90')),
+    'REPLAY_BACKEND': os.getenv('REPLAY_BACKEND', 'redis'),
+    'REPLAY_BUFFER_SIZE': int(os.getenv('REPLAY_BUFFER_SIZE', '256')),
+    'REPLAY_REDIS_URL': f"redis://{os.getenv('REDIS_HOST', 'localhost')}:{os.getenv('REDIS_PORT', '6379')}/0",
+    'SEND_QUEUE_MAX': int(os.getenv('SEND_QUEUE_MAX', '256')),
+    'LEASE_TTL': float(os.getenv('LEASE_TTL', '10')),
+    'LEASE_BACKEND': os.getenv('LEASE_BACKEND', 'redis'),
+    'LEASE_REDIS_URL': f"redis://{os.getenv('REDIS_HOST', 'localhost')}:{os.getenv('REDIS_PORT', '6379')}/0",
+}
+
+# Color computation cache
+# BACKEND names a Django cache alias shared across processes; leave unset for
+# an in-process LRU only.
+COLOR_CACHE = {
+    'MAX_SIZE': int(os.getenv('COLOR_CACHE_MAX_SIZE', '4096')),
+    'BACKEND': os.getenv('COLOR_CACHE_BACKEND') or None,
+    'TIMEOUT': int(os.getenv('COLOR_CACHE_TIMEOUT', '3600')),
+}
+
+# ICC color management
+# Every .icc/.icm file in PROFILE_DIR is available by its lowercased file name
+# (e.g. "coated_fogra39"); sRGB is built in. Without a default CMYK profile,
+# conversions use the naive formula unless a design selects a profile.
+COLOR_MANAGEMENT = {
+    'PROFILE_DIR': os.getenv('ICC_PROFILE_DIR', str(BASE_DIR / 'color_profiles')),
+    'DEFAULT_CMYK_PROFILE': os.getenv('ICC_DEFAULT_CMYK_PROFILE') or None,
+    'RENDERING_INTENT': os.getenv('ICC_RENDERING_INTENT', 'relative'),
+}
+
 # Celery Configuration
 CELERY_BROKER_URL = f"redis://{os.getenv('REDIS_HOST', 'localhost')}:{os.getenv('REDIS_PORT', '6379')}/0"
 CELERY_RESULT_BACKEND = f"redis://{os.getenv('REDIS_HOST', 'localhost')}:{os.getenv('REDIS_PORT', '6379')}/0"
@@ -180,6 +248,18 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
+CELERY_BEAT_SCHEDULE = {
+    # Re-apply buffered object edits a crashed worker logged but never flushed
+    'replay-pending-operations': {
+        'task': 'app.collaboration.tasks.replay_pending_operations',
+        'schedule': 60.0,
+    },
+    # Drop change log entries past CHANGE_LOG_RETENTION_DAYS
+    'prune-change-log': {
+        'task': 'app.collaboration.tasks.prune_change_log',
+        'schedule': 3600.0,
+    },
+}
 
 # Storage settings (MinIO/S3)
 AWS_ACCESS_KEY_ID = os.getenv('AWS_ACCESS_KEY_ID', 'minioadmin')
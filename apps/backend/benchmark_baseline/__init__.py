@@ -0,0 +1,5 @@
+"""
+The color conversion, validation and Pantone modules as they were before
+the slot and tuple-based rewrites, for benchmark_colors.py to compare
+against. Unchanged apart from their imports of each other.
+"""
@@ -0,0 +1,88 @@
+"""
+Benchmark color conversion paths: object-based vs tuple-based.
+
+Compares validate_for_print and find_closest_match against the previous
+object-per-step implementations (copied unchanged into benchmark_baseline)
+for speed and peak transient memory per call, and the instance size of the
+color types.
+
+Run from apps/backend: python benchmark_colors.py
+"""
+import os
+import random
+import statistics
+import sys
+import timeit
+import tracemalloc
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
+
+from app.colors.conversion import ColorConversion, RGBColor, CMYKColor  # noqa: E402
+from app.colors.validation import ColorValidation  # noqa: E402
+from app.colors.pantone_service import PantoneService  # noqa: E402
+from benchmark_baseline import conversion as baseline_conversion  # noqa: E402
+from benchmark_baseline.pantone_service import PantoneService as BaselinePantoneService  # noqa: E402
+from benchmark_baseline.validation import ColorValidation as BaselineColorValidation  # noqa: E402
+
+
+def peak_bytes(func, args_list):
+    """Median transient allocation peak of a single call"""
+    peaks = []
+    tracemalloc.start()
+    for args in args_list:
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        func(*args)
+        _, peak = tracemalloc.get_traced_memory()
+        peaks.append(peak - before)
+    tracemalloc.stop()
+    return int(statistics.median(peaks))
+
+
+def report(name, legacy, current, legacy_args, current_args, number):
+    # Best of five runs to keep scheduler noise out of the numbers
+    legacy_time = min(timeit.repeat(lambda: [legacy(*a) for a in legacy_args], number=number, repeat=5))
+    current_time = min(timeit.repeat(lambda: [current(*a) for a in current_args], number=number, repeat=5))
+    calls = number * len(current_args)
+    legacy_peak = peak_bytes(legacy, legacy_args)
+    current_peak = peak_bytes(current, current_args)
+    print(f'{name}')
+    print(f'  legacy:  {legacy_time / calls * 1e6:7.2f} us/call  peak {legacy_peak:6d} B/call')
+    print(f'  current: {current_time / calls * 1e6:7.2f} us/call  peak {current_peak:6d} B/call')
+
+
+def main(number=20):
+    random.seed(0)
+    colors = ['#%06x' % random.randrange(1 << 24) for _ in range(500)]
+    rgbs = [ColorConversion.hex_to_rgb(c) for c in colors]
+    legacy_rgbs = [baseline_conversion.ColorConversion.hex_to_rgb(c) for c in colors]
+    validation = ColorValidation()
+    pantone = PantoneService()
+
+    print('Instance size (bytes, including __dict__):')
+    legacy = baseline_conversion.RGBColor(1, 2, 3)
+    print(f'  RGBColor with __dict__: {sys.getsizeof(legacy) + sys.getsizeof(legacy.__dict__)}')
+    print(f'  RGBColor with __slots__: {sys.getsizeof(RGBColor(1, 2, 3))}')
+    print(f'  CMYKColor with __slots__: {sys.getsizeof(CMYKColor(1, 2, 3, 4))}')
+    print()
+
+    report(
+        'validate_for_print',
+        BaselineColorValidation().validate_for_print,
+        validation.validate_for_print,
+        [(c,) for c in colors],
+        [(c,) for c in colors],
+        number
+    )
+    report(
+        'find_closest_match',
+        BaselinePantoneService().find_closest_match,
+        pantone.find_closest_match,
+        [(rgb,) for rgb in legacy_rgbs],
+        [(rgb,) for rgb in rgbs],
+        number
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+Benchmark collaboration wire encodings: JSON text vs MessagePack frames.
+
+Reports bytes on the wire and encode/decode CPU time per message for the
+message types that dominate design room traffic.
+
+Run from apps/backend: python benchmark_protocol.py
+"""
+import os
+import timeit
+import uuid
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
+
+from app.collaboration.protocol import JsonCodec, MsgpackCodec  # noqa: E402
+
+
+def sample_messages():
+    cursor_batch = {
+        'type': 'cursor:batch',
+        'cursors': [
+            {'userId': f'user-{i}', 'x': 3.25 + i * 0.1, 'y': 7.5 - i * 0.05}
+            for i in range(20)
+        ]
+    }
+    cursor_single = {'type': 'cursor:move', 'userId': 'user-1', 'x': 3.25, 'y': 7.5}
+    object_update = {
+        'type': 'object:update',
+        'objectId': str(uuid.uuid4()),
+        'changes': {
+            'x': 1.125, 'y': 2.5, 'width': 3.0, 'height': 1.75, 'rotation': 15,
+            'properties': {
+                'shape': 'rect',
+                'fill': {'type': 'solid', 'color': '#ff8800'},
+                'stroke': {'color': '#000000', 'width': 0.02},
+                'opacity': 0.9
+            }
+        }
+    }
+    comment = {
+        'type': 'comment:created',
+        'comment': {
+            'id': str(uuid.uuid4()),
+            'userId': 'user-7',
+            'content': 'Can we move the logo a bit further from the bleed edge?',
+            'x': '4.2500', 'y': '0.3750', 'resolved': False,
+            'createdAt': '2026-01-01T12:00:00Z'
+        }
+    }
+    return {
+        'cursor:move': cursor_single,
+        'cursor:batch (20)': cursor_batch,
+        'object:update': object_update,
+        'comment:created': comment,
+    }
+
+
+def measure(codec, message, number):
+    text_data, bytes_data = codec.encode(message)
+    size = len(bytes_data) if bytes_data is not None else len(text_data.encode())
+    encode = min(timeit.repeat(lambda: codec.encode(message), number=number, repeat=5)) / number
+    decode = min(timeit.repeat(lambda: codec.decode(text_data, bytes_data), number=number, repeat=5)) / number
+    return size, encode * 1e6, decode * 1e6
+
+
+def main(number=20000):
+    codecs = {'json': JsonCodec(), 'msgpack': MsgpackCodec()}
+    print(f"{'message':<20} {'codec':<8} {'bytes':>6} {'encode us':>10} {'decode us':>10}")
+    for name, message in sample_messages().items():
+        for codec_name, codec in codecs.items():
+            size, encode, decode = measure(codec, message, number)
+            print(f'{name:<20} {codec_name:<8} {size:>6} {encode:>10.2f} {decode:>10.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,309 @@
+"""
+Load test design room WebSockets with thousands of simulated editors.
+
+Clients are spread over --rooms design rooms. Each one joins its room and
+moves its cursor --cursor-hz times a second and sends an edit --edit-hz
+times a second. Edits are object:transform frames, which take the same
+group fan-out as applied operations but skip the database, so the run
+measures the ASGI and channel layer stack rather than Postgres.
+
+Every frame carries the time it was sent: edits in sentAt, cursors in x.
+Receivers record the end-to-end fan-out latency, and the run reports
+percentiles, throughput and the share of expected edit deliveries that
+arrived.
+
+By default the ASGI application runs in this process on the in-memory
+channel layer with in-memory presence, so neither Redis nor a server is
+needed. The clients share the event loop with the server, so in-process
+numbers are a lower bound, and the CPU time reported covers both. With
+--url the clients connect to a running server instead, which needs
+pip install websockets.
+
+Run from apps/backend:
+    python load_test_websocket.py --rooms 100 --clients-per-room 20
+    python load_test_websocket.py --url ws://localhost:8000 --rooms 10
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import time
+import uuid
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
+
+
+class LatencyHistogram:
+    """Log-bucketed latencies (5% wide buckets), so millions of samples cost no memory"""
+
+    RATIO = 1.05
+    MIN = 1e-5
+
+    def __init__(self):
+        self.counts = {}
+        self.total = 0
+        self.max = 0.0
+
+    def record(self, seconds):
+        bucket = int(math.log(max(seconds, self.MIN) / self.MIN, self.RATIO))
+        self.counts[bucket] = self.counts.get(bucket, 0) + 1
+        self.total += 1
+        self.max = max(self.max, seconds)
+
+    def percentile(self, p):
+        if not self.total:
+            return 0.0
+        rank = p / 100 * self.total
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= rank:
+                return min(self.MIN * self.RATIO ** (bucket + 1), self.max)
+        return self.max
+
+
+class Stats:
+    def __init__(self):
+        self.cursor_latency = LatencyHistogram()
+        self.edit_latency = LatencyHistogram()
+        self.sent = {'cursor:move': 0, 'object:transform': 0}
+        # Edits sent into each room, times the room's size, is what should arrive
+        self.expected_edits = 0
+        self.received_frames = 0
+        self.connect_errors = 0
+        self.closed_early = 0
+
+
+class InProcessClient:
+    """A socket on the ASGI application running in this process"""
+
+    def __init__(self, application, room):
+        from asgiref.testing import ApplicationCommunicator
+        self.communicator = ApplicationCommunicator(application, {
+            'type': 'websocket',
+            'path': f'/ws/designs/{room}/',
+            'headers': [],
+            'subprotocols': [],
+        })
+
+    async def connect(self):
+        await self.communicator.send_input({'type': 'websocket.connect'})
+        accepted = await self.communicator.receive_output(10)
+        if accepted['type'] != 'websocket.accept':
+            raise ConnectionError(f"Connection refused: {accepted['type']}")
+
+    async def send(self, message):
+        await self.communicator.send_input({'type': 'websocket.receive', 'text': json.dumps(message)})
+
+    async def receive(self):
+        output = await self.communicator.output_queue.get()
+        if output['type'] == 'websocket.close':
+            return None
+        return json.loads(output['text'])
+
+    async def close(self):
+        await self.communicator.send_input({'type': 'websocket.disconnect', 'code': 1000})
+        await self.communicator.wait(5)
+
+
+class NetworkClient:
+    """A socket on a running server"""
+
+    def __init__(self, url, room):
+        self.uri = f"{url.rstrip('/')}/ws/designs/{room}/"
+        self.websocket = None
+
+    async def connect(self):
+        import websockets
+        self.websocket = await websockets.connect(self.uri, max_queue=None)
+
+    async def send(self, message):
+        await self.websocket.send(json.dumps(message))
+
+    async def receive(self):
+        import websockets
+        try:
+            return json.loads(await self.websocket.recv())
+        except websockets.exceptions.ConnectionClosed:
+            return None
+
+    async def close(self):
+        await self.websocket.close()
+
+
+async def read_frames(client, stats):
+    while True:
+        frame = await client.receive()
+        if frame is None:
+            stats.closed_early += 1
+            return
+        now = time.perf_counter()
+        stats.received_frames += 1
+        if frame.get('type') == 'object:transform':
+            stats.edit_latency.record(now - frame['sentAt'])
+        elif frame.get('type') == 'cursor:batch':
+            for cursor in frame['cursors']:
+                stats.cursor_latency.record(now - cursor['x'])
+
+
+async def send_every(hz, build, client, stats, room_size, phase):
+    if hz <= 0:
+        return
+    interval = 1.0 / hz
+    # Spread clients over the interval instead of sending in lockstep
+    await asyncio.sleep(random.uniform(0, interval))
+    while not phase.is_set():
+        message = build()
+        await client.send(message)
+        stats.sent[message['type']] += 1
+        if message['type'] == 'object:transform':
+            stats.expected_edits += room_size
+        await asyncio.sleep(interval)
+
+
+async def run_client(make_client, room, user_id, args, stats, connected, phase):
+    client = make_client(room)
+    try:
+        await client.connect()
+    except Exception:
+        stats.connect_errors += 1
+        connected.release()
+        return
+    reader = asyncio.ensure_future(read_frames(client, stats))
+    await client.send({'type': 'design:join', 'userId': user_id})
+    connected.release()
+    await phase.wait_started()
+
+    def cursor():
+        return {'type': 'cursor:move', 'userId': user_id, 'x': time.perf_counter(), 'y': random.random()}
+
+    def edit():
+        return {
+            'type': 'object:transform',
+            'userId': user_id,
+            'objectId': str(uuid.uuid4()),
+            'transform': {'x': random.random(), 'y': random.random()},
+            'sentAt': time.perf_counter(),
+        }
+
+    await asyncio.gather(
+        send_every(args.cursor_hz, cursor, client, stats, args.clients_per_room, phase),
+        send_every(args.edit_hz, edit, client, stats, args.clients_per_room, phase),
+    )
+    # Let the last frames arrive before leaving
+    await asyncio.sleep(args.drain)
+    reader.cancel()
+    await client.close()
+
+
+class Phase:
+    """Every client connects, then all start sending together, then stop together"""
+
+    def __init__(self):
+        self.started = asyncio.Event()
+        self.stopped = asyncio.Event()
+
+    async def wait_started(self):
+        await self.started.wait()
+
+    def is_set(self):
+        return self.stopped.is_set()
+
+
+def setup_in_process(args):
+    import django
+    django.setup()
+    from django.conf import settings
+    settings.CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels.layers.InMemoryChannelLayer',
+            'CONFIG': {'capacity': args.capacity},
+        },
+    }
+    settings.COLLABORATION = {
+        **getattr(settings, 'COLLABORATION', {}),
+        'PRESENCE_BACKEND': 'memory',
+        'REPLAY_BACKEND': 'memory',
+        'CURSOR_FLUSH_HZ': args.cursor_flush_hz,
+    }
+    from channels.routing import URLRouter
+    from app.collaboration.routing import websocket_urlpatterns
+    application = URLRouter(websocket_urlpatterns)
+    return lambda room: InProcessClient(application, room)
+
+
+def report(args, stats, clients, elapsed, cpu):
+    print(f'rooms {args.rooms} x {args.clients_per_room} clients = {clients} connected '
+          f'({stats.connect_errors} failed, {stats.closed_early} closed by the server)')
+    print(f'sent        {stats.sent["cursor:move"]} cursor moves, {stats.sent["object:transform"]} edits '
+          f'in {elapsed:.1f}s ({sum(stats.sent.values()) / elapsed:,.0f} msg/s)')
+    print(f'received    {stats.received_frames} frames ({stats.received_frames / elapsed:,.0f} frames/s)')
+    if stats.expected_edits:
+        print(f'delivered   {stats.edit_latency.total / stats.expected_edits:.1%} of expected edit frames')
+    print(f"{'latency ms':<12} {'p50':>8} {'p90':>8} {'p99':>8} {'max':>8} {'samples':>10}")
+    for name, histogram in (('edits', stats.edit_latency), ('cursors', stats.cursor_latency)):
+        print(f'{name:<12} ' + ' '.join(
+            f'{histogram.percentile(p) * 1000:>8.1f}' for p in (50, 90, 99)
+        ) + f' {histogram.max * 1000:>8.1f} {histogram.total:>10}')
+    if cpu is not None:
+        print(f'cpu         {cpu:.1f}s ({cpu / elapsed:.0%} of one core)')
+        from app.collaboration.send_queue import send_queue_stats
+        queues = send_queue_stats.snapshot()
+        print(f"send queues deepest {queues['maxDepth']}, {queues['dropped']} frames shed, "
+              f"{queues['lagging']} lagging disconnects")
+
+
+async def main(args):
+    make_client = (
+        (lambda room: NetworkClient(args.url, room)) if args.url else setup_in_process(args)
+    )
+    stats = Stats()
+    phase = Phase()
+    run_id = uuid.uuid4().hex[:8]
+    clients = args.rooms * args.clients_per_room
+    # Bounds how many connections are being opened at once
+    connected = asyncio.Semaphore(args.connect_concurrency)
+
+    tasks = []
+    for index in range(clients):
+        await connected.acquire()
+        room = f'load-{run_id}-{index % args.rooms}'
+        tasks.append(asyncio.ensure_future(
+            run_client(make_client, room, f'user-{index}', args, stats, connected, phase)
+        ))
+    for _ in range(args.connect_concurrency):
+        await connected.acquire()
+    print(f'{clients - stats.connect_errors} clients connected; sending for {args.duration}s')
+
+    started, cpu_started = time.perf_counter(), time.process_time()
+    phase.started.set()
+    await asyncio.sleep(args.duration)
+    phase.stopped.set()
+    elapsed = time.perf_counter() - started
+    await asyncio.gather(*tasks, return_exceptions=True)
+    cpu = None if args.url else time.process_time() - cpu_started
+
+    report(args, stats, clients, elapsed, cpu)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rooms', type=int, default=50)
+    parser.add_argument('--clients-per-room', type=int, default=20)
+    parser.add_argument('--cursor-hz', type=float, default=10, help='cursor moves per client per second')
+    parser.add_argument('--edit-hz', type=float, default=1, help='edits per client per second')
+    parser.add_argument('--duration', type=float, default=30, help='seconds of sending')
+    parser.add_argument('--drain', type=float, default=2, help='seconds to wait for late frames')
+    parser.add_argument('--connect-concurrency', type=int, default=200)
+    parser.add_argument('--url', help='ws:// base URL of a running server; in-process if omitted')
+    parser.add_argument('--capacity', type=int, default=1000,
+                        help='in-memory channel layer capacity per channel')
+    parser.add_argument('--cursor-flush-hz', type=float, default=20,
+                        help='CURSOR_FLUSH_HZ for the in-process server')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    asyncio.run(main(parse_args()))
@@ -408,7 +408,7 @@ export function CollaborationPanel({ designId }: CollaborationPanelProps) {
     setError(null);
     try {
       // Remove and re-add with new role (backend doesn't have update endpoint)
-      await removeCollaborator(designId, userId);
+      await removeCollaborator(designId, userId, getUserId());
       await addCollaborator(designId, {
         user_id: userId,
         role: permission,
@@ -144,9 +144,10 @@ export async function addCollaborator(
   return response.collaborator;
 }
 
-export async function removeCollaborator(designId: string, userId: string): Promise<void> {
+export async function removeCollaborator(designId: string, userId: string, removedBy?: string): Promise<void> {
+  const query = removedBy ? `?removed_by=${encodeURIComponent(removedBy)}` : '';
   await apiRequest<{ success: boolean }>(
-    `/api/designs/${encodeURIComponent(designId)}/collaborators/${encodeURIComponent(userId)}/`,
+    `/api/designs/${encodeURIComponent(designId)}/collaborators/${encodeURIComponent(userId)}/${query}`,
     {
       method: 'DELETE',
     }